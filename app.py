@@ -1,22 +1,35 @@
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file,make_response
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file,make_response, abort
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_mail import Mail
 from flask_wtf.csrf import CSRFProtect, generate_csrf, validate_csrf
 from flask_migrate import Migrate
 from config import config
-from models import db, User, UserRole, create_tables, create_sample_data, Teacher, Student, Course, CourseRegistration, Subject, Class, Score, Notification,ClassCourse,auto_register_students_to_class_courses, StudentSkill, StudentCertificate,StudentCourseCart,RegistrationPeriod
-from decorators import admin_required, teacher_required, student_required, handle_exceptions, log_activity
+from models import db, User, UserRole, ExportJob, create_tables, create_sample_data, Teacher, Student, Course, CourseRegistration, Subject, Class, Score, Notification,ClassCourse,auto_register_students_to_class_courses, StudentSkill, StudentCertificate,StudentCourseCart,RegistrationPeriod, SystemSync, ScheduleConflictEngine, PrerequisiteGraph, ReferenceData, UserIdentity, CourseScoreStats, StudentTimetable, student_class
+from commands import register_commands
+from utils import schedule as schedule_utils
+from utils.pagination import page_args, keyset_paginate
+from utils.cache import cache
+from utils.fragments import fragments
+from utils.pdf_styles import pdf_styles
+from utils.pdf_render import pdf_renderer
+from utils.loader import loader
+from utils import templates as template_utils
+from utils.export_stream import iter_partitions, stream_xlsx, stream_csv, stream_ndjson
+from utils.export_datasets import DATASETS as EXPORT_DATASETS, FORMATS as EXPORT_FORMATS
+from utils.export_jobs import export_jobs, ExportJobLimitError
+from utils import export_reports  # đăng ký các task export PDF với export_jobs
+from utils import export_transcripts  # đăng ký task xuất bảng điểm cả lớp / khoa / khóa (ZIP)
+from utils.pdf_generator import PDFGenerator
+from markupsafe import Markup
+from sqlalchemy import func, or_
+from decorators import admin_required, teacher_required, student_required, handle_exceptions, log_activity, conditional_get
 import os
 from datetime import datetime, date, timedelta,timezone  # THÊM timedelta
 from werkzeug.exceptions import BadRequest
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from flask_socketio import SocketIO
 from notifications.websocket_handler import socketio, NotificationManager, start_notification_scheduler
 from notifications import websocket_handler
 import logging
@@ -27,29 +40,6 @@ import pandas as pd
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-socketio = SocketIO()
-
-
-# app.py (Thêm hàm hỗ trợ)
-
-def update_class_student_count(class_id, change):
-    """
-    Cập nhật trường 'current_students' của một lớp học.
-    :param class_id: ID của Class cần cập nhật.
-    :param change: +1 để tăng, -1 để giảm.
-    """
-    if class_id:
-        # Dùng .get() để tìm Class theo ID
-        class_obj = db.session.get(Class, class_id)
-        if class_obj:
-            # Đảm bảo số sinh viên không âm
-            if class_obj.current_students + change >= 0:
-                class_obj.current_students += change
-            else:
-                class_obj.current_students = 0 # Hoặc log lỗi
-            
-            # Không cần commit ở đây, commit sẽ do hàm gọi thực hiện
-            db.session.add(class_obj)
 
 
 # ======== SYSTEM SYNCHRONIZATION SERVICE ========
@@ -58,52 +48,20 @@ class SystemSynchronizer:
     
     @staticmethod
     def sync_all_data():
-        """Đồng bộ tất cả dữ liệu hệ thống"""
-        try:
-            
-            # 1. Đồng bộ số lượng đăng ký khóa học
-            Course.batch_update_registration_counts()
-            
-            # 2. Đồng bộ GPA sinh viên
-            students = Student.query.all()
-            for student in students:
-                student.update_gpa()
-            
-            # 3. Đồng bộ số lượng môn học của giáo viên
-            teachers = Teacher.query.all()
-            for teacher in teachers:
-                teacher.update_subject_count()
-            
-            # 4. Đồng bộ số lượng sinh viên trong lớp
-            classes = Class.query.all()
-            for class_obj in classes:
-                actual_count = Student.query.filter_by(class_id=class_obj.id).count()
-                if class_obj.current_students != actual_count:
-                    class_obj.current_students = actual_count
-                    db.session.add(class_obj)
-            
-            # 5. Đồng bộ số lượng giáo viên dạy môn học
-            subjects = Subject.query.all()
-            for subject in subjects:
-                subject.update_teacher_count()
-            
-            db.session.commit()
-            return True
-            
-        except Exception as e:
-            logger.error(f"System sync error: {str(e)}")
-            db.session.rollback()
-            return False
+        """Đồng bộ tất cả dữ liệu hệ thống - trả về báo cáo số dòng thay đổi (None nếu lỗi)"""
+        return SystemSync.run()
     
     @staticmethod
-    def validate_course_creation(subject_id, teacher_id, class_ids):
+    def validate_course_creation(subject_id, teacher_id, class_ids, schedule=None, room=None,
+                                 semester=None, year=None, course_id=None):
         """Validate trước khi tạo khóa học mới"""
         try:
             errors = []
+            student_conflicts = {}
             
             # Kiểm tra giáo viên có được phân công môn học không
-            teacher = Teacher.query.get(teacher_id)
-            subject = Subject.query.get(subject_id)
+            teacher = loader.get(Teacher, teacher_id)
+            subject = loader.get(Subject, subject_id)
             
             if teacher and subject and subject not in teacher.assigned_subjects:
                 errors.append(f"Giáo viên {teacher.full_name} chưa được phân công môn {subject.subject_name}")
@@ -114,9 +72,34 @@ class SystemSynchronizer:
                 if conflicts:
                     errors.extend(conflicts)
             
+            # Kiểm tra trùng lịch của sinh viên trong lớp và trùng phòng (phép toán bit trên slot mask)
+            if schedule and semester and year:
+                mask = schedule_utils.parse_schedule(schedule)
+                if not mask:
+                    errors.append(f"Không đọc được lịch học: {schedule}")
+                
+                if mask and class_ids:
+                    student_ids = [row[0] for row in db.session.query(student_class.c.student_id).filter(
+                        student_class.c.class_id.in_(class_ids)
+                    ).distinct()]
+                    student_conflicts = ScheduleConflictEngine.check_students(
+                        student_ids, mask, semester, year, course_id
+                    )
+                    if student_conflicts:
+                        errors.append(f"{len(student_conflicts)} sinh viên bị trùng lịch học")
+                
+                if mask and room:
+                    overlap = mask & Course.room_occupancy(room, semester, year, course_id)
+                    if overlap:
+                        errors.append(f"Phòng {room} đã có lớp vào {schedule_utils.format_mask(overlap)}")
+            
             return {
                 'valid': len(errors) == 0,
-                'errors': errors
+                'errors': errors,
+                'student_conflicts': [
+                    {'student_id': student_id, 'courses': codes}
+                    for student_id, codes in student_conflicts.items()
+                ]
             }
             
         except Exception as e:
@@ -131,11 +114,13 @@ class SystemSynchronizer:
         # Implementation chi tiết cho kiểm tra lịch học
         conflicts = []
         try:
-            subject = Subject.query.get(subject_id)
+            subject = loader.get(Subject, subject_id)
             
-            # Lấy tất cả khóa học hiện có của các lớp được chọn
-            for class_id in class_ids:
-                class_obj = Class.query.get(class_id)
+            # Lấy tất cả khóa học hiện có của các lớp được chọn (1 truy vấn cho mọi lớp)
+            classes = loader.get_many(Class, class_ids, options=[
+                db.selectinload(Class.class_courses).joinedload(ClassCourse.course)
+            ])
+            for class_obj in classes.values():
                 for class_course in class_obj.class_courses:
                     existing_course = class_course.course
                     # Kiểm tra nếu môn học đã tồn tại trong lớp
@@ -157,6 +142,12 @@ def create_app(config_name='default'):
     
     # Initialize extensions
     db.init_app(app)
+    cache.init_app(app)
+    fragments.init_app(app)
+    pdf_styles.init_app(app)
+    pdf_renderer.init_app(app)
+    template_utils.init_app(app)
+    export_jobs.init_app(app)
     
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -169,6 +160,7 @@ def create_app(config_name='default'):
     socketio.init_app(app, cors_allowed_origins="*", async_mode='eventlet')
     migrate = Migrate(app, db)
     app.extensions['socketio'] = socketio
+    register_commands(app)
 
 
     with app.app_context():
@@ -187,7 +179,8 @@ def create_app(config_name='default'):
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, int(user_id))
+        # Snapshot trong cache (TTL ngắn) thay cho SELECT users + hồ sơ ở mỗi request / sự kiện socket
+        return UserIdentity.load(user_id)
 
     
     @app.after_request
@@ -205,21 +198,39 @@ def create_app(config_name='default'):
     def sync_class_student_counts():
         """Đồng bộ số lượng sinh viên trong tất cả các lớp"""
         try:
-            classes = Class.query.all()
-            for class_obj in classes:
-                actual_count = len(class_obj.students)
-                if class_obj.current_students != actual_count:
-                    class_obj.current_students = actual_count
-                    db.session.add(class_obj)
-                    logger.info(f"Updated class {class_obj.class_name}: {class_obj.current_students} -> {actual_count}")
+            changed = SystemSync.sync_class_counts()
             db.session.commit()
-            logger.info("Class student counts synchronized successfully")
+            logger.info(f"Class student counts synchronized successfully ({changed} classes updated)")
             return True
         except Exception as e:
             db.session.rollback()
             logger.error(f"Error syncing class student counts: {str(e)}")
             return False
 
+    def export_response(kind, params):
+        """POST: đưa vào hàng đợi export nền, trả về mã job ngay (202). GET: xuất và tải trực tiếp."""
+        try:
+            if request.method == 'POST':
+                try:
+                    job = export_jobs.submit(kind, current_user.id, params)
+                except ExportJobLimitError as e:
+                    return jsonify({'success': False, 'message': str(e)}), 429
+                return jsonify({
+                    'success': True,
+                    'job': job.to_dict(export_jobs.download_url(job.id)),
+                    'status_url': url_for('export_job_status', job_id=job.id)
+                }), 202
+
+            result = export_jobs.run(kind, params)
+            response = make_response(result.data)
+            response.headers['Content-Type'] = result.mimetype
+            response.headers['Content-Disposition'] = f'attachment; filename={result.filename}'
+            return response
+
+        except Exception as e:
+            logger.error(f"Error exporting {kind}: {str(e)}")
+            return jsonify({'success': False, 'message': f'Lỗi khi xuất file: {str(e)}'}), 500
+
     # Routes
     @app.route('/')
     def index():
@@ -415,10 +426,12 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     def api_system_sync():
         """API đồng bộ toàn bộ hệ thống"""
         try:
-            if SystemSynchronizer.sync_all_data():
+            report = SystemSynchronizer.sync_all_data()
+            if report:
                 return jsonify({
                 'success': True,
-                'message': 'Đồng bộ hệ thống thành công!'
+                'message': 'Đồng bộ hệ thống thành công!',
+                'report': report
             })
             else:
                return jsonify({
@@ -443,11 +456,22 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
             subject_id = data.get('subject_id')
             teacher_id = data.get('teacher_id')
             class_ids = data.get('class_ids', [])
+            semester = int(data['semester']) if data.get('semester') else None
+            year = data.get('year')
         
             validation_result = SystemSynchronizer.validate_course_creation(
-            subject_id, teacher_id, class_ids
+            subject_id, teacher_id, class_ids,
+            schedule=data.get('schedule'),
+            room=data.get('room'),
+            semester=semester,
+            year=year,
+            course_id=data.get('course_id')
         )
         
+        # Ma trận trùng lịch course x course của cả học kỳ (cho admin xếp lịch)
+            if data.get('include_matrix') and semester and year:
+                validation_result['conflict_matrix'] = ScheduleConflictEngine.conflict_pairs(semester, year)
+        
             return jsonify(validation_result)
         
         except Exception as e:
@@ -461,46 +485,378 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @admin_required
     def admin_dashboard():
+        widgets = fragments.get('admin_dashboard', 'all',
+                                ('students', 'teachers', 'classes', 'subjects'), _admin_dashboard_widgets)
+        
+        recent_activities = []  
+        
+        return render_template('admin/admin_dashboard.html', 
+                             stats=widgets['stats'], 
+                             widgets=widgets,
+                             recent_activities=recent_activities)
+    
+    # ======== WIDGET DASHBOARD (FRAGMENT CACHE) ========
+    # Mỗi hàm trả về {'stats': dict, <widget>: Markup}, được lưu bởi utils.fragments theo người dùng
+    # và phiên bản dữ liệu. Có thể chạy ở luồng nền -> chỉ dùng id truyền vào, không dùng current_user.
+
+    def _admin_dashboard_widgets():
         stats = {
             'total_students': Student.query.count(),
             'total_teachers': Teacher.query.count(),
             'total_classes': Class.query.count(),
             'total_subjects': Subject.query.count()
         }
+        return {
+            'stats': stats,
+            'stats_cards': Markup(render_template('admin/partials/_dashboard_stats.html', stats=stats))
+        }
+
+    def _teacher_dashboard_widgets(teacher_id):
+        course_ids = [course_id for (course_id,) in
+                      db.session.query(Course.id).filter(Course.teacher_id == teacher_id)]
         
-        recent_activities = []  
+        # Số sinh viên (không trùng) đã được duyệt trong các khóa học: 1 truy vấn thay vì 1 truy vấn / khóa
+        total_students = db.session.query(
+            func.count(func.distinct(CourseRegistration.student_id))
+        ).filter(
+            CourseRegistration.course_id.in_(course_ids),
+            CourseRegistration.status == 'approved'
+        ).scalar() if course_ids else 0
         
-        return render_template('admin/admin_dashboard.html', 
-                             stats=stats, 
-                             recent_activities=recent_activities)
+        stats = {
+            'total_courses': len(course_ids),
+            'total_students': total_students,
+            'pending_grading': Score.query.filter(
+                Score.course_id.in_(course_ids),
+                Score.status == 'draft'
+            ).count() if course_ids else 0,
+            'upcoming_classes': 0  # Would be calculated
+        }
+        return {
+            'stats': stats,
+            'stats_cards': Markup(render_template('teacher/partials/_dashboard_stats.html', stats=stats))
+        }
+
+    def _student_dashboard_widgets(student_id):
+        student = db.session.get(Student, student_id)
+        current_courses = CourseRegistration.query.filter_by(
+            student_id=student_id,
+            status='approved'
+        ).all()
+        
+        stats = {
+            'current_courses': len(current_courses),
+            'current_gpa': student.gpa,
+            'attendance_rate': 95,  # Would be calculated
+            'upcoming_deadlines': 3,  # Would be calculated
+            'overall_progress': 75,   # Would be calculated
+            'completed_credits': student.completed_credits,
+            'total_credits': student.total_credits,
+            'completed_courses': 15,  # Would be calculated
+            'upcoming_courses': 5     # Would be calculated
+        }
+        return {
+            'stats': stats,
+            'stats_cards': Markup(render_template('student/partials/_dashboard_stats.html', stats=stats)),
+            'current_courses': Markup(render_template('student/partials/_dashboard_courses.html',
+                                                      current_courses=current_courses))
+        }
+
+    def _student_notification_widget(user_id):
+        recent_notifications = Notification.query.filter_by(
+            user_id=user_id
+        ).order_by(
+            Notification.created_at.desc()
+        ).limit(5).all()
+        return Markup(render_template('student/partials/_dashboard_notifications.html',
+                                      recent_notifications=recent_notifications))
     
 
     
+    # ======== KEYSET LIST APIs (TRANG QUẢN LÝ) ========
+    # Mỗi danh sách có 1 hàm dựng query (lọc + eager load) dùng chung cho trang HTML (trang đầu)
+    # và API JSON (các trang sau, ?cursor=...). ?render=html trả thêm các dòng <tr> đã render sẵn.
+
+    def _search_pattern(args):
+        q = (args.get('q') or '').strip()
+        return f'%{q}%' if q else None
+
+    def _user_list_query(args):
+        query = User.query
+        pattern = _search_pattern(args)
+        if pattern:
+            query = query.filter(or_(
+                User.username.ilike(pattern), User.full_name.ilike(pattern), User.email.ilike(pattern)
+            ))
+        if args.get('role'):
+            try:
+                query = query.filter(User.role == UserRole(args['role']))
+            except ValueError:
+                pass
+        if args.get('status') in ('active', 'inactive'):
+            query = query.filter(User.is_active == (args['status'] == 'active'))
+        return query
+
+    USER_SORTS = {
+        'id': User.id,
+        'username': User.username,
+        'full_name': User.full_name,
+        'email': User.email,
+        'created_at': func.coalesce(User.created_at, datetime(1970, 1, 1)),
+    }
+
+    def _user_row(user):
+        return {
+            'id': user.id,
+            'username': user.username,
+            'full_name': user.full_name,
+            'email': user.email,
+            'role': user.role.value,
+            'is_active': user.is_active,
+            'avatar': user.avatar,
+            'created_at': user.created_at.isoformat() if user.created_at else None
+        }
+
+    def _student_list_query(args):
+        query = Student.query.join(Student.user).options(
+            db.contains_eager(Student.user),
+            db.selectinload(Student.classes)
+        )
+        pattern = _search_pattern(args)
+        if pattern:
+            query = query.filter(or_(
+                Student.student_id.ilike(pattern), User.full_name.ilike(pattern), User.email.ilike(pattern)
+            ))
+        if args.get('course'):
+            query = query.filter(Student.course == args['course'])
+        if args.get('status'):
+            query = query.filter(Student.status == args['status'])
+        if args.get('class_name'):
+            query = query.filter(Student.classes.any(Class.class_name == args['class_name']))
+        if args.get('exclude_class_id', type=int):
+            query = query.filter(~Student.classes.any(Class.id == args.get('exclude_class_id', type=int)))
+        if args.get('exclude_course_id', type=int):
+            query = query.filter(~Student.registrations.any(
+                CourseRegistration.course_id == args.get('exclude_course_id', type=int)
+            ))
+        return query
+
+    STUDENT_SORTS = {
+        'id': Student.id,
+        'student_id': Student.student_id,
+        'full_name': User.full_name,
+        'gpa': func.coalesce(Student.gpa, 0.0),
+    }
+
+    def _student_row(student):
+        class_names = [cls.class_name for cls in student.classes]
+        return {
+            'id': student.id,
+            'student_id': student.student_id,
+            'full_name': student.user.full_name,
+            'email': student.user.email,
+            'classes': [{'id': cls.id, 'class_name': cls.class_name} for cls in student.classes],
+            'class_names': class_names,
+            'current_classes': class_names,
+            'class_count': len(class_names),
+            'course': student.course,
+            'gpa': student.gpa,
+            'status': student.status,
+            'phone': student.user.phone,
+            'avatar': student.user.avatar
+        }
+
+    def _teacher_list_query(args):
+        query = Teacher.query.join(Teacher.user).options(
+            db.contains_eager(Teacher.user),
+            db.selectinload(Teacher.assigned_subjects)
+        )
+        pattern = _search_pattern(args)
+        if pattern:
+            query = query.filter(or_(
+                Teacher.teacher_code.ilike(pattern), User.full_name.ilike(pattern), User.email.ilike(pattern)
+            ))
+        if args.get('department'):
+            query = query.filter(Teacher.department == args['department'])
+        if args.get('status'):
+            query = query.filter(Teacher.status == args['status'])
+        return query
+
+    TEACHER_SORTS = {
+        'id': Teacher.id,
+        'teacher_code': Teacher.teacher_code,
+        'full_name': User.full_name,
+        'department': Teacher.department,
+    }
+
+    def _teacher_row(teacher):
+        return {
+            'id': teacher.id,
+            'teacher_code': teacher.teacher_code,
+            'full_name': teacher.full_name,
+            'email': teacher.email,
+            'department': teacher.department,
+            'department_display': teacher.department_display,
+            'status': teacher.status,
+            'subjects': [subject.subject_name for subject in teacher.assigned_subjects],
+            'avatar': teacher.avatar
+        }
+
+    def _registration_list_query(args):
+        query = CourseRegistration.query.join(
+            CourseRegistration.student
+        ).join(Student.user).options(
+            db.contains_eager(CourseRegistration.student).contains_eager(Student.user),
+            db.contains_eager(CourseRegistration.student).selectinload(Student.classes),
+            db.joinedload(CourseRegistration.course).joinedload(Course.subject)
+        )
+        pattern = _search_pattern(args)
+        if pattern:
+            query = query.filter(or_(Student.student_id.ilike(pattern), User.full_name.ilike(pattern)))
+        if args.get('status'):
+            query = query.filter(CourseRegistration.status == args['status'])
+        if args.get('course_id', type=int):
+            query = query.filter(CourseRegistration.course_id == args.get('course_id', type=int))
+        if args.get('class_name'):
+            query = query.filter(Student.classes.any(Class.class_name == args['class_name']))
+        if args.get('date'):
+            try:
+                day = datetime.strptime(args['date'], '%Y-%m-%d')
+                query = query.filter(
+                    CourseRegistration.registration_date >= day,
+                    CourseRegistration.registration_date < day + timedelta(days=1)
+                )
+            except ValueError:
+                pass
+        return query
+
+    REGISTRATION_SORTS = {
+        'id': CourseRegistration.id,
+        'registration_date': func.coalesce(CourseRegistration.registration_date, datetime(1970, 1, 1)),
+        'status': func.coalesce(CourseRegistration.status, ''),
+    }
+
+    def _registration_row(registration):
+        student = registration.student
+        return {
+            'id': registration.id,
+            'student_id': student.id,
+            'student_code': student.student_id,
+            'full_name': student.user.full_name,
+            'classes': [cls.class_name for cls in student.classes],
+            'course_id': registration.course_id,
+            'course_code': registration.course.course_code if registration.course else None,
+            'status': registration.status,
+            'notes': registration.notes,
+            'registration_date': registration.registration_date.isoformat() if registration.registration_date else None
+        }
+
+    def _keyset_page(query, sorts, default_sort, id_column, args):
+        sort, descending, cursor, limit = page_args(args, sorts, default_sort)
+        return keyset_paginate(query, sorts[sort], id_column, cursor=cursor, limit=limit, descending=descending)
+
+    def _keyset_response(page, serialize, partial=None, context_name=None, template_items=None):
+        """JSON chuẩn của các API danh sách; render=html kèm các dòng <tr> để template nối thêm"""
+        result = {
+            'success': True,
+            'items': [serialize(item) for item in page['items']],
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more']
+        }
+        if partial and request.args.get('render') == 'html':
+            items = template_items if template_items is not None else page['items']
+            result['html'] = render_template(
+                partial, **{context_name: items}, row_offset=request.args.get('row_offset', 0, type=int)
+            )
+        return result
+
+    @app.route('/api/admin/users')
+    @login_required
+    @admin_required
+    def api_admin_users():
+        try:
+            page = _keyset_page(_user_list_query(request.args), USER_SORTS, 'id', User.id, request.args)
+            return jsonify(_keyset_response(page, _user_row, 'admin/partials/_user_rows.html', 'users'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+    @app.route('/api/admin/students')
+    @login_required
+    @admin_required
+    def api_admin_students():
+        try:
+            page = _keyset_page(_student_list_query(request.args), STUDENT_SORTS, 'id', Student.id, request.args)
+            return jsonify(_keyset_response(
+                page, _student_row, 'admin/partials/_student_rows.html', 'students',
+                template_items=[_student_row(student) for student in page['items']]
+            ))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+    @app.route('/api/admin/teachers')
+    @login_required
+    @admin_required
+    def api_admin_teachers():
+        try:
+            page = _keyset_page(_teacher_list_query(request.args), TEACHER_SORTS, 'id', Teacher.id, request.args)
+            return jsonify(_keyset_response(page, _teacher_row, 'admin/partials/_teacher_rows.html', 'teachers'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+    @app.route('/api/admin/registrations')
+    @login_required
+    @admin_required
+    def api_admin_registrations():
+        try:
+            page = _keyset_page(_registration_list_query(request.args), REGISTRATION_SORTS, 'id',
+                                CourseRegistration.id, request.args)
+            return jsonify(_keyset_response(
+                page, _registration_row, 'admin/partials/_registration_rows.html', 'registrations'
+            ))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+
+    @app.route('/api/admin/cache/stats', methods=['GET', 'DELETE'])
+    @login_required
+    @admin_required
+    def api_cache_stats():
+        """Hit/miss theo họ khóa của cache dữ liệu tham chiếu; DELETE = xóa cache + đặt lại bộ đếm"""
+        if request.method == 'DELETE':
+            cache.clear()
+            cache.reset_stats()
+        return jsonify({
+            'success': True,
+            'backend': type(cache.backend).__name__,
+            'families': cache.stats()
+        })
+
+
     @app.route('/admin/manage-courses-register')
     @login_required
     @admin_required
     def manage_courses_register():
-    
-    # ✅ SỬA: Thêm eager loading để tránh N+1 query
-        registrations = CourseRegistration.query.options(
-        db.joinedload(CourseRegistration.student).joinedload(Student.user),
-        db.joinedload(CourseRegistration.student).joinedload(Student.classes),
-        db.joinedload(CourseRegistration.course).joinedload(Course.subject)
-    ).all()
+    # Chỉ render trang đầu, các trang sau tải qua /api/admin/registrations (keyset)
+        page = _keyset_page(_registration_list_query(request.args), REGISTRATION_SORTS, 'id',
+                            CourseRegistration.id, request.args)
     
         all_courses = Course.query.options(db.joinedload(Course.subject)).all()
 
+        status_counts = dict(db.session.query(
+            CourseRegistration.status, func.count(CourseRegistration.id)
+        ).group_by(CourseRegistration.status).all())
 
         stats = {
-        'total_registrations': len(registrations),
-        'approved_registrations': len([r for r in registrations if r.status == 'approved']),
-        'pending_registrations': len([r for r in registrations if r.status == 'pending']),
-        'rejected_registrations': len([r for r in registrations if r.status == 'rejected']),
-        'cancelled_registrations': len([r for r in registrations if r.status == 'cancelled'])
+        'total_registrations': sum(status_counts.values()),
+        'approved_registrations': status_counts.get('approved', 0),
+        'pending_registrations': status_counts.get('pending', 0),
+        'rejected_registrations': status_counts.get('rejected', 0),
+        'cancelled_registrations': status_counts.get('cancelled', 0)
     }
     
         return render_template('admin/manage_course_register.html',
-                         registrations=registrations, 
+                         registrations=page['items'], 
+                         next_cursor=page['next_cursor'],
                          courses=all_courses,
                          stats=stats)
 
@@ -509,15 +865,17 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @admin_required
     def manage_users():
-        users = User.query.all()
+        page = _keyset_page(_user_list_query(request.args), USER_SORTS, 'id', User.id, request.args)
         form = AddUserForm()
-        return render_template('admin/manage_users.html', users=users, form = form)
+        return render_template('admin/manage_users.html', users=page['items'], form = form,
+                               next_cursor=page['next_cursor'], total_users=User.query.count())
     
 
     
     @app.route('/delete_user/<int:user_id>', methods=['POST'])
     @login_required
     @admin_required # Sử dụng decorator bạn đã định nghĩa
+    @cache.invalidates('teachers', 'identity')
     def delete_user(user_id):
         user = User.query.get_or_404(user_id)
         if user.id == current_user.id:
@@ -565,6 +923,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/edit_user/<int:user_id>', methods=['POST'])
     @login_required
     @admin_required
+    @cache.invalidates('teachers', 'identity')
     def update_user(user_id):
         user = User.query.get_or_404(user_id)
     
@@ -652,31 +1011,17 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @admin_required
     def manage_students():
-        students = Student.query.all()
-        student_data = []
-        for student in students:
-            class_names = [cls.class_name for cls in student.classes]
-            student_data.append({
-            'id': student.id,
-            'student_id': student.student_id,
-            'full_name': student.user.full_name,  # Lấy từ User
-            'email': student.user.email,  
-            'classes': student.classes,  # 🚨 QUAN TRỌNG: trả về danh sách classes
-            'class_names': class_names,  # Danh sách tên lớp để hiển thị
-            'course': student.course,
-            'gpa': student.gpa,
-            'status': student.status,
-            'phone': student.user.phone,          # Lấy từ User
-            'avatar': student.user.avatar         # Lấy từ User
-        })
+        page = _keyset_page(_student_list_query(request.args), STUDENT_SORTS, 'id', Student.id, request.args)
+        student_data = [_student_row(student) for student in page['items']]
     
         stats = {
-        'total_students': len(students),
-        'active_students': len([s for s in students if s.status == 'active'])
+        'total_students': Student.query.count(),
+        'active_students': Student.query.filter_by(status='active').count()
     }
     
         return render_template('admin/manage_students.html', 
                          students=student_data, 
+                         next_cursor=page['next_cursor'],
                          stats=stats)
 
     
@@ -687,21 +1032,23 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @admin_required
     def manage_teachers():
-        teachers = Teacher.query.all()
+        page = _keyset_page(_teacher_list_query(request.args), TEACHER_SORTS, 'id', Teacher.id, request.args)
         stats = {
-        'total_teachers': len(teachers),
-        'active_teachers': len([t for t in teachers if t.status == 'active']),
+        'total_teachers': Teacher.query.count(),
+        'active_teachers': Teacher.query.filter_by(status='active').count(),
         'total_subjects': Subject.query.count(),
         'total_classes': Class.query.count()
     }
         return render_template('admin/manage_teachers.html', 
-                         teachers=teachers, 
+                         teachers=page['items'], 
+                         next_cursor=page['next_cursor'],
                          stats=stats,
                          all_subjects=Subject.query.all())
     
     @app.route('/admin/add-teacher', methods=['POST'])
     @login_required
     @admin_required
+    @cache.invalidates('teachers', 'departments')
     def add_teacher():
         # Xử lý thêm giáo viên
         try:
@@ -741,6 +1088,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/admin/reset-password/<int:user_id>', methods=['POST'])
     @login_required
     @admin_required
+    @cache.invalidates('identity')
     def reset_password(user_id):
         """Reset mật khẩu user về mặc định"""
         try:
@@ -765,40 +1113,31 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @admin_required
     def export_students_excel():
         try:
-        # Lấy danh sách sinh viên
-            students = Student.query.all()
-         
-        # Tạo DataFrame
-            data = []
-            for student in students:
-                class_names = ', '.join([cls.class_name for cls in student.classes]) if student.classes else 'N/A'
-                data.append({
-                'Mã SV': student.student_id,
-                'Họ tên': student.user.full_name,
-                'Lớp': class_names,
-                'Khóa': student.course,
-                'GPA': student.gpa or 'Chưa có',
-                'Trạng thái': student.status,
-                'Số điện thoại': student.user.phone or 'N/A',
-                'Email': student.user.email
-            })
-        
-            df = pd.DataFrame(data)
-        
-        # Tạo file trong memory
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Danh sách sinh viên', index=False)
-        
-            output.seek(0)
+        # Đọc theo lô (yield_per) và stream file, không nạp toàn bộ sinh viên vào bộ nhớ
+            statement = db.select(
+            Student.id, Student.student_id, User.full_name, Student.class_names_column().label('class_names'),
+            Student.course, Student.gpa, Student.status, User.phone, User.email
+        ).join(User, Student.user_id == User.id).order_by(Student.id)
+        
+            def batches():
+                for rows in iter_partitions(db.session, statement):
+                    yield [[
+                    row.student_id,
+                    row.full_name,
+                    row.class_names or 'N/A',
+                    row.course,
+                    row.gpa or 'Chưa có',
+                    row.status,
+                    row.phone or 'N/A',
+                    row.email
+                ] for row in rows]
         
             filename = f"danh_sach_sinh_vien_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-        
-            return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+            return stream_xlsx(
+            filename, 'Danh sách sinh viên',
+            ['Mã SV', 'Họ tên', 'Lớp', 'Khóa', 'GPA', 'Trạng thái', 'Số điện thoại', 'Email'],
+            batches(),
+            widths=[14, 28, 20, 10, 10, 14, 16, 32]
         )
         
         except Exception as e:
@@ -810,40 +1149,37 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @admin_required
     def export_registrations_excel():
         try:
-        # Lấy danh sách đăng ký
-            registrations = CourseRegistration.query.all()
-        
-        # Tạo DataFrame
-            data = []
-            for idx, reg in enumerate(registrations, 1):
-                student = reg.student
-                class_names = ', '.join([cls.class_name for cls in student.classes]) if student.classes else 'N/A'
-                data.append({
-                'STT': idx,
-                'Mã SV': student.student_id,
-                'Họ tên': student.user.full_name,
-                'Lớp': class_names,
-                'Ngày đăng ký': reg.registration_date.strftime('%d/%m/%Y %H:%M') if reg.registration_date else 'N/A',
-                'Trạng thái': reg.status,
-                'Ghi chú': reg.notes or '--'
-            })
-        
-            df = pd.DataFrame(data)
-        
-        # Tạo file trong memory
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Danh sách đăng ký', index=False)
-        
-            output.seek(0)
+        # Đọc theo lô (yield_per) và stream file
+            statement = db.select(
+            CourseRegistration.registration_date, CourseRegistration.status, CourseRegistration.notes,
+            Student.student_id, User.full_name, Student.class_names_column().label('class_names')
+        ).join(Student, CourseRegistration.student_id == Student.id).join(
+            User, Student.user_id == User.id
+        ).order_by(CourseRegistration.id)
+        
+            def batches():
+                index = 0
+                for rows in iter_partitions(db.session, statement):
+                    batch = []
+                    for row in rows:
+                        index += 1
+                        batch.append([
+                        index,
+                        row.student_id,
+                        row.full_name,
+                        row.class_names or 'N/A',
+                        row.registration_date.strftime('%d/%m/%Y %H:%M') if row.registration_date else 'N/A',
+                        row.status,
+                        row.notes or '--'
+                    ])
+                    yield batch
         
             filename = f"danh_sach_dang_ky_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-        
-            return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+            return stream_xlsx(
+            filename, 'Danh sách đăng ký',
+            ['STT', 'Mã SV', 'Họ tên', 'Lớp', 'Ngày đăng ký', 'Trạng thái', 'Ghi chú'],
+            batches(),
+            widths=[8, 14, 28, 20, 18, 14, 30]
         )
         
         except Exception as e:
@@ -855,47 +1191,34 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @admin_required
     def export_users_excel():
         try:
-        # Lấy danh sách người dùng
-            users = User.query.all()
-        
-        # Tạo DataFrame
-            data = []
-            for idx, user in enumerate(users, 1):
-                role_text = ''
-                if user.role.value == 'admin':
-                    role_text = 'Admin'
-                elif user.role.value == 'teacher':
-                    role_text = 'Giáo viên'
-                elif user.role.value == 'student':
-                    role_text = 'Sinh viên'
-                
-                status_text = 'Đang hoạt động' if user.is_active else 'Không hoạt động'
-            
-                data.append({
-                'STT': idx,
-                'Họ tên': user.full_name,
-                'Email': user.email,
-                'Vai trò': role_text,
-                'Trạng thái': status_text,
-                'Ngày tạo': user.created_at.strftime('%d/%m/%Y')
-            })
-        
-            df = pd.DataFrame(data)
-        
-        # Tạo file trong memory
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Danh sách người dùng', index=False)
-        
-            output.seek(0)
+        # Đọc theo lô (yield_per) và stream file
+            role_names = {'admin': 'Admin', 'teacher': 'Giáo viên', 'student': 'Sinh viên'}
+            statement = db.select(
+            User.full_name, User.email, User.role, User.is_active, User.created_at
+        ).order_by(User.id)
+        
+            def batches():
+                index = 0
+                for rows in iter_partitions(db.session, statement):
+                    batch = []
+                    for row in rows:
+                        index += 1
+                        batch.append([
+                        index,
+                        row.full_name,
+                        row.email,
+                        role_names.get(row.role.value, '') if row.role else '',
+                        'Đang hoạt động' if row.is_active else 'Không hoạt động',
+                        row.created_at.strftime('%d/%m/%Y') if row.created_at else ''
+                    ])
+                    yield batch
         
             filename = f"danh_sach_nguoi_dung_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-        
-            return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+            return stream_xlsx(
+            filename, 'Danh sách người dùng',
+            ['STT', 'Họ tên', 'Email', 'Vai trò', 'Trạng thái', 'Ngày tạo'],
+            batches(),
+            widths=[8, 28, 32, 14, 18, 12]
         )
         
         except Exception as e:
@@ -905,6 +1228,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/admin/add-user', methods=['GET','POST'])
     @login_required
     @admin_required
+    @cache.invalidates('teachers', 'departments')
     def add_user():
         form = AddUserForm()
         if form.validate_on_submit():
@@ -991,6 +1315,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/api/teacher/<int:teacher_id>/assign-subjects', methods=['POST'])
     @login_required
     @admin_required
+    @cache.invalidates('teachers', 'subjects')
     def api_assign_subjects(teacher_id):
         try:
             data = request.get_json()
@@ -1126,6 +1451,8 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/api/teacher/low-scores')
     @login_required 
     @teacher_required
+    @conditional_get(lambda: ('scores', 'courses', 'subjects', 'students', 'classes', 'users', 'memberships',
+                              'notifications'))
     def api_get_low_scores():
         """API lấy danh sách sinh viên điểm kém của giáo viên"""
         try:
@@ -1207,13 +1534,14 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                 'message': 'Không có điểm nào được chọn'
             }), 400
         
+            teacher_id = current_user.teacher_profile.id
+            scores = loader.get_many(Score, score_ids, options=[db.joinedload(Score.course)])
+        
             sent_count = 0
-            for score_id in score_ids:
-                score = Score.query.get(score_id)
-                if score and score.final_score < 5.0:
+            for score in scores.values():
+                if score.final_score is not None and score.final_score < 5.0:
                 # Kiểm tra quyền truy cập
-                    course = Course.query.get(score.course_id)
-                    if course.teacher_id != current_user.teacher_profile.id:
+                    if score.course.teacher_id != teacher_id:
                         continue
                     
                     from notifications.websocket_handler import trigger_low_score_notifications
@@ -1288,10 +1616,11 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                 'message': 'Không có điểm nào được chọn'
             }), 400
         
+            scores = loader.get_many(Score, score_ids)
+        
             sent_count = 0
-            for score_id in score_ids:
-                score = Score.query.get(score_id)
-                if score and score.final_score < 5.0:
+            for score in scores.values():
+                if score.final_score is not None and score.final_score < 5.0:
                     from notifications.websocket_handler import trigger_low_score_notifications
                     trigger_low_score_notifications(score)
                     sent_count += 1
@@ -1328,29 +1657,38 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
         
             reported_count = 0
         
+        # Tải trước sinh viên, khóa học của giáo viên và điểm tương ứng (3 truy vấn cho cả danh sách)
+            students = loader.get_many(Student, [item.get('student_id') for item in selected_students])
+            teacher_courses = {
+                course.course_code: course
+                for course in Course.query.filter_by(teacher_id=teacher_id).options(db.joinedload(Course.subject))
+            }
+            loader.prime(*teacher_courses.values())
+            scores = {
+                (score.student_id, score.course_id): score
+                for score in Score.query.filter(
+                    Score.student_id.in_(list(students)),
+                    Score.course_id.in_([course.id for course in teacher_courses.values()])
+                )
+            } if students and teacher_courses else {}
+        
             for student_data in selected_students:
                 student_id = student_data.get('student_id')
                 course_code = student_data.get('course_code')
             
             # Tìm sinh viên và khóa học
-                student = Student.query.get(student_id)
+                student = loader.get(Student, student_id)
                 if not student:
                     continue
                 
             # Tìm khóa học theo course_code và teacher_id
-                course = Course.query.filter_by(
-                course_code=course_code,
-                teacher_id=teacher_id
-            ).first()
+                course = teacher_courses.get(course_code)
             
                 if not course:
                     continue
             
             # Tìm điểm của sinh viên trong khóa học này
-                score = Score.query.filter_by(
-                student_id=student_id,
-                course_id=course.id
-            ).first()
+                score = scores.get((student.id, course.id))
             
                 if not score:
                     continue
@@ -1622,18 +1960,18 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     def get_available_teachers_for_subject(subject_id):
         """Lấy danh sách giáo viên có thể dạy môn học (cùng department)"""
         try:
-            subject = Subject.query.get_or_404(subject_id)
+            subject = ReferenceData.subject(subject_id)
+            if subject is None:
+                return jsonify({'success': False, 'message': 'Không tìm thấy môn học'}), 404
         
         # Lấy giáo viên cùng department và đã được phân công môn này
-            teachers = Teacher.query.filter_by(department=subject.department).all()
-        
             teacher_data = []
-            for teacher in teachers:
+            for teacher in ReferenceData.teachers_by_department(subject['department']):
                 teacher_data.append({
-                'id': teacher.id,
-                'full_name': teacher.full_name,
-                'department_display': teacher.department_display,
-                'is_assigned': subject in teacher.assigned_subjects
+                'id': teacher['id'],
+                'full_name': teacher['full_name'],
+                'department_display': teacher['department_display'],
+                'is_assigned': subject_id in teacher['subject_ids']
             })
         
             return jsonify({
@@ -1665,300 +2003,31 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                              teachers=teachers)
     
 
-    def register_vietnamese_fonts():
-        """Cách đơn giản nhất - sử dụng font mặc định và encoding UTF-8"""
-        try:
-        # ĐĂNG KÝ FONT TIẾNG VIỆT TỐT NHẤT
-            font_paths = [
-            # Font macOS mới (Apple đã hỗ trợ Unicode rất tốt)
-            '/System/Library/Fonts/Arial.ttf',
-            '/System/Library/Fonts/Helvetica.ttc',
-            '/System/Library/Fonts/SFNS.ttf',  # San Francisco - font hệ thống macOS
-        ]
-        
-            for font_path in font_paths:
-                if os.path.exists(font_path):
-                    try:
-                        pdfmetrics.registerFont(TTFont('VietnameseFont', font_path))
-                        pdfmetrics.registerFont(TTFont('VietnameseFont-Bold', font_path))
-                        print(f"✅ Đã đăng ký font: {os.path.basename(font_path)}")
-                        return True
-                    except:
-                        continue
-        
-        # Nếu không tìm thấy font nào, sử dụng HELVETICA (có sẵn trong ReportLab)
-            print("⚠️  Sử dụng font Helvetica mặc định")
-            return True
-        
-        except Exception as e:
-            print(f"❌ Lỗi đăng ký font: {e}")
-            return True  # VẪN trả về True để tiếp tục với font mặc định
-
-
-
-    @app.route('/admin/teachers/export-pdf')
+    @app.route('/admin/teachers/export-pdf', methods=['GET', 'POST'])
     @login_required
     @admin_required
     def export_teachers_pdf():
-        try:
-
-            register_vietnamese_fonts()
-
         # Lấy tham số bộ lọc
-            search = request.args.get('search', '')
-            department = request.args.get('department', '')
-            status_filter = request.args.get('status', '')
-        
-        # Lọc giáo viên
-            query = Teacher.query
-        
-            if search:
-                query = query.join(User).filter(
-                    db.or_(
-                    User.full_name.ilike(f'%{search}%'),
-                    Teacher.teacher_code.ilike(f'%{search}%'),
-                    User.email.ilike(f'%{search}%')
-                )
-            )
-        
-            if department:
-                query = query.filter(Teacher.department == department)
-            
-            if status_filter:
-                query = query.filter(Teacher.status == status_filter)
-        
-            teachers = query.all()
-        
-        # Tạo PDF
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30,encoding='utf-8')
-            elements = []
-        
-        # Styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1,
-            encoding='utf-8',  # Center
-            textColor=colors.HexColor('#2c3e50')
-        )
-        
-        # Tiêu đề
-            title = Paragraph("DANH SÁCH GIÁO VIÊN", title_style)
-            elements.append(title)
-        
-        # Thông tin xuất
-            info_style = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.gray,
-            alignment=1
-        )
-            export_info = Paragraph(
-            f"Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')} | "
-            f"Tổng số: {len(teachers)} giáo viên",
-            info_style
-        )
-            elements.append(export_info)
-            elements.append(Spacer(1, 20))
-        
-        # Dữ liệu bảng
-            data = [['STT', 'Mã GV', 'Họ tên', 'Bộ môn', 'Môn phụ trách', 'Trạng thái', 'Email']]
-        
-            for i, teacher in enumerate(teachers, 1):
-                subjects = ", ".join([subj.subject_name for subj in teacher.assigned_subjects[:3]])
-                if len(teacher.assigned_subjects) > 3:
-                    subjects += f" (+{len(teacher.assigned_subjects) - 3})"
-                
-                status_map = {
-                'active': 'Đang làm việc',
-                'busy': 'Bận',
-                'inactive': 'Nghỉ việc'
-            }
-            
-                data.append([
-                str(i),
-                teacher.teacher_code,
-                teacher.full_name,
-                teacher.department_display,
-                subjects or 'Chưa phân công',
-                status_map.get(teacher.status, teacher.status),
-                teacher.user.email
-            ])
-        
-        # Tạo bảng
-            table = Table(data, colWidths=[30, 60, 100, 80, 120, 70, 120])
-            table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-        ]))
-        
-            elements.append(table)
-        
-        # Tạo PDF
-            doc.build(elements)
-            buffer.seek(0)
-        
-        # Trả về file PDF
-            response = make_response(buffer.getvalue())
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'attachment; filename=danh_sach_giao_vien_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf'
-        
-            return response
-        
-        except Exception as e:
-            logger.error(f"Error exporting teachers PDF: {str(e)}")
-            return jsonify({'success': False, 'message': f'Lỗi khi xuất PDF: {str(e)}'}), 500
+        params = {
+            'search': request.values.get('search', ''),
+            'department': request.values.get('department', ''),
+            'status': request.values.get('status', '')
+        }
+        return export_response('teachers_pdf', params)
 
 # Thêm route export PDF cho môn học
-    @app.route('/admin/subjects/export-pdf')
+    @app.route('/admin/subjects/export-pdf', methods=['GET', 'POST'])
     @login_required
     @admin_required
     def export_subjects_pdf():
-        try:
-            register_vietnamese_fonts()
         # Lấy tham số bộ lọc
-            search = request.args.get('search', '')
-            department = request.args.get('department', '')
-            type_filter = request.args.get('type', '')
-            semester = request.args.get('semester', '')
-        
-        # Lọc môn học
-            query = Subject.query.options(db.joinedload(Subject.courses).joinedload(Course.teacher))
-        
-            if search:
-                query = query.filter(
-                    db.or_(
-                    Subject.subject_name.ilike(f'%{search}%'),
-                    Subject.subject_code.ilike(f'%{search}%')
-                )
-            )
-        
-            if department:
-                query = query.filter(Subject.department == department)
-            
-            if type_filter:
-                query = query.filter(Subject.type == type_filter)
-            
-            if semester:
-                query = query.filter(Subject.semester == int(semester))
-        
-            subjects = query.all()
-        
-        # Tạo PDF
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30,encoding='utf-8')
-            elements = []
-        
-        # Styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1,
-            textColor=colors.HexColor('#2c3e50'),
-            encoding='utf-8'
-        )
-        
-        # Tiêu đề
-            title = Paragraph("DANH SÁCH MÔN HỌC", title_style)
-            elements.append(title)
-        
-        # Thông tin xuất
-            info_style = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.gray,
-            alignment=1
-        )
-            export_info = Paragraph(
-            f"Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')} | "
-            f"Tổng số: {len(subjects)} môn học",
-            info_style
-        )
-            elements.append(export_info)
-            elements.append(Spacer(1, 20))
-        
-        # Dữ liệu bảng
-            data = [['STT', 'Mã MH', 'Tên môn học', 'Tín chỉ', 'Bộ môn', 'Loại', 'HK', 'Số GV']]
-        
-            for i, subject in enumerate(subjects, 1):
-                type_map = {
-                'general': 'Đại cương',
-                'major': 'Chuyên ngành',
-                'elective': 'Tự chọn'
-            }
-                
-                teacher_count = 0
-                if subject.courses:
-                    teacher_ids = set()
-                    for course in subject.courses:
-                        if course.teacher_id:
-                            teacher_ids.add(course.teacher_id)
-                    teacher_count = len(teacher_ids)
-                
-                
-                data.append([
-                str(i),
-                subject.subject_code,
-                subject.subject_name,
-                str(subject.credits),
-                subject.department_name,
-                type_map.get(subject.type, subject.type),
-                str(subject.semester),
-                str(teacher_count)  # SỬA: dùng teacher_count thay vì subject.teachers
-            ])
-            
-                
-        # Tạo bảng
-            table = Table(data, colWidths=[30, 60, 150, 40, 80, 70, 30, 40])
-            table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-        ]))
-        
-            elements.append(table)
-        
-        # Tạo PDF
-            doc.build(elements)
-            buffer.seek(0)
-        
-        # Trả về file PDF
-            response = make_response(buffer.getvalue())
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'attachment; filename=danh_sach_mon_hoc_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf'
-
-        
-            return response
-        
-        except Exception as e:
-            logger.error(f"Error exporting subjects PDF: {str(e)}")
-            return jsonify({'success': False, 'message': f'Lỗi khi xuất PDF: {str(e)}'}), 500
+        params = {
+            'search': request.values.get('search', ''),
+            'department': request.values.get('department', ''),
+            'type': request.values.get('type', ''),
+            'semester': request.values.get('semester', '')
+        }
+        return export_response('subjects_pdf', params)
         
     # Thêm vào app.py - sau các route hiện có
 
@@ -1966,40 +2035,34 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @admin_required
     def export_classes_excel():
-        """Export danh sách lớp học ra Excel"""
+        """Export danh sách lớp học ra Excel (đọc theo lô, stream file)"""
         try:
-      
-        
-            classes = Class.query.all()
-        
-            data = []
-            for class_obj in classes:
-                data.append({
-                'Mã lớp': class_obj.class_code,
-                'Tên lớp': class_obj.class_name,
-                'Khóa': class_obj.course,
-                'Khoa/Viện': class_obj.faculty,
-                'Số SV hiện tại': class_obj.current_students,
-                'Số SV tối đa': class_obj.max_students,
-                'GVCN': class_obj.teacher.user.full_name if class_obj.teacher else 'Chưa phân công',
-                'Trạng thái': 'Đang học' if class_obj.status == 'active' else 'Đã tốt nghiệp'
-            })
-        
-            df = pd.DataFrame(data)
-        
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Danh sách lớp học', index=False)
-        
-            output.seek(0)
+            statement = db.select(
+            Class.class_code, Class.class_name, Class.course, Class.faculty, Class.current_students,
+            Class.max_students, Class.status, User.full_name.label('teacher_name')
+        ).outerjoin(Teacher, Class.teacher_id == Teacher.id).outerjoin(
+            User, Teacher.user_id == User.id
+        ).order_by(Class.id)
+        
+            def batches():
+                for rows in iter_partitions(db.session, statement):
+                    yield [[
+                    row.class_code,
+                    row.class_name,
+                    row.course,
+                    row.faculty,
+                    row.current_students,
+                    row.max_students,
+                    row.teacher_name or 'Chưa phân công',
+                    'Đang học' if row.status == 'active' else 'Đã tốt nghiệp'
+                ] for row in rows]
         
             filename = f"danh_sach_lop_hoc_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-        
-            return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+            return stream_xlsx(
+            filename, 'Danh sách lớp học',
+            ['Mã lớp', 'Tên lớp', 'Khóa', 'Khoa/Viện', 'Số SV hiện tại', 'Số SV tối đa', 'GVCN', 'Trạng thái'],
+            batches(),
+            widths=[14, 24, 10, 18, 14, 14, 28, 14]
         )
         
         except Exception as e:
@@ -2010,50 +2073,70 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @admin_required
     def export_courses_excel():
-        """Export danh sách khóa học ra Excel"""
+        """Export danh sách khóa học ra Excel (đọc theo lô, stream file)"""
         try:
-        
-        
-            courses = Course.query.all()
-        
-            data = []
-            for course in courses:
-                data.append({
-                'Mã khóa học': course.course_code,
-                'Tên môn': course.subject.subject_name if course.subject else 'N/A',
-                'Mã môn': course.subject.subject_code if course.subject else 'N/A',
-                'Học kỳ': course.semester,
-                'Năm học': course.year,
-                'Giảng viên': course.teacher.user.full_name if course.teacher else 'N/A',
-                'Số SV hiện tại': course.current_students,
-                'Số SV tối đa': course.max_students,
-                'Phòng học': course.room or 'Chưa có',
-                'Trạng thái': course.status,
-                'Ngày bắt đầu': course.start_date.strftime('%d/%m/%Y') if course.start_date else 'N/A',
-                'Ngày kết thúc': course.end_date.strftime('%d/%m/%Y') if course.end_date else 'N/A'
-            })
-        
-            df = pd.DataFrame(data)
-        
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Danh sách khóa học', index=False)
-        
-            output.seek(0)
+            statement = db.select(
+            Course.course_code, Subject.subject_name, Subject.subject_code, Course.semester, Course.year,
+            User.full_name.label('teacher_name'), Course.current_students, Course.max_students,
+            Course.room, Course.status, Course.start_date, Course.end_date
+        ).outerjoin(Subject, Course.subject_id == Subject.id).outerjoin(
+            Teacher, Course.teacher_id == Teacher.id
+        ).outerjoin(User, Teacher.user_id == User.id).order_by(Course.id)
+        
+            def batches():
+                for rows in iter_partitions(db.session, statement):
+                    yield [[
+                    row.course_code,
+                    row.subject_name or 'N/A',
+                    row.subject_code or 'N/A',
+                    row.semester,
+                    row.year,
+                    row.teacher_name or 'N/A',
+                    row.current_students,
+                    row.max_students,
+                    row.room or 'Chưa có',
+                    row.status,
+                    row.start_date.strftime('%d/%m/%Y') if row.start_date else 'N/A',
+                    row.end_date.strftime('%d/%m/%Y') if row.end_date else 'N/A'
+                ] for row in rows]
         
             filename = f"danh_sach_khoa_hoc_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-        
-            return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+            return stream_xlsx(
+            filename, 'Danh sách khóa học',
+            ['Mã khóa học', 'Tên môn', 'Mã môn', 'Học kỳ', 'Năm học', 'Giảng viên', 'Số SV hiện tại',
+             'Số SV tối đa', 'Phòng học', 'Trạng thái', 'Ngày bắt đầu', 'Ngày kết thúc'],
+            batches(),
+            widths=[16, 30, 12, 8, 12, 28, 14, 14, 12, 12, 14, 14]
         )
         
         except Exception as e:
             flash(f'Lỗi khi export: {str(e)}', 'error')
             return redirect(url_for('manage_courses'))
     
+    @app.route('/admin/export/<dataset>.<fmt>', methods=['GET', 'POST'])
+    @login_required
+    @admin_required
+    def export_dataset(dataset, fmt):
+        """Export CSV / NDJSON (sinh viên, đăng ký, điểm, người dùng) cho công cụ xử lý dữ liệu"""
+        export = EXPORT_DATASETS.get(dataset)
+        if request.method == 'POST':
+            # Job nền: thêm định dạng xlsx, file tải về sau qua /exports/jobs/<id>/download
+            if export is None or fmt not in EXPORT_FORMATS:
+                abort(404)
+            return export_response('dataset', {'dataset': dataset, 'fmt': fmt})
+        if export is None or fmt not in ('csv', 'ndjson'):
+            abort(404)
+        
+        filename = f"{export.name}_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}"
+        try:
+            batches = export.batches(db.session)
+            if fmt == 'csv':
+                return stream_csv(filename, export.keys, batches)
+            return stream_ndjson(filename, export.keys, batches)
+        except Exception as e:
+            logger.error(f"Error exporting {dataset} {fmt}: {str(e)}")
+            return jsonify({'success': False, 'message': f'Lỗi khi export: {str(e)}'}), 500
+    
     @app.route('/admin/fix-student-counts', methods=['POST'])
     @login_required
     @admin_required
@@ -2073,6 +2156,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/admin/classes/delete/<int:class_id>', methods=['POST'])
     @login_required
     @admin_required 
+    @cache.invalidates('classes')
     def delete_class(class_id):
         try:
             class_obj = Class.query.get_or_404(class_id)
@@ -2103,6 +2187,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/admin/classes/edit/<int:class_id>', methods=['POST'])
     @login_required
     @admin_required
+    @cache.invalidates('classes')
     def edit_class(class_id):
         try:
             class_obj = Class.query.get_or_404(class_id)
@@ -2133,6 +2218,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/admin/subjects/delete/<int:subject_id>', methods=['POST'])
     @login_required
     @admin_required
+    @cache.invalidates('subjects', 'departments')
     def delete_subject(subject_id):
         try:
             subject = Subject.query.get_or_404(subject_id)
@@ -2166,6 +2252,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/admin/subjects/edit/<int:subject_id>', methods=['POST'])
     @login_required
     @admin_required
+    @cache.invalidates('subjects', 'departments')
     def edit_subject(subject_id):
         try:
             subject = Subject.query.get_or_404(subject_id)
@@ -2246,12 +2333,17 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @admin_required
     def manage_subjects():
-        subjects = Subject.query.all()
+        # Danh mục môn học lấy từ cache; số SV đăng ký luôn mới (1 truy vấn GROUP BY trên bộ đếm)
+        student_counts = dict(db.session.query(
+            Course.subject_id, func.coalesce(func.sum(Course.total_registrations_count), 0)
+        ).group_by(Course.subject_id).all())
+        subjects = [dict(subject, student_count=student_counts.get(subject['id'], 0))
+                    for subject in ReferenceData.subjects()]
         stats = {
             'total_subjects': len(subjects),
-            'general_subjects': len([s for s in subjects if s.type == 'general']),
-            'major_subjects': len([s for s in subjects if s.type == 'major']),
-            'avg_credits': sum(s.credits for s in subjects) / len(subjects) if subjects else 0
+            'general_subjects': len([s for s in subjects if s['type'] == 'general']),
+            'major_subjects': len([s for s in subjects if s['type'] == 'major']),
+            'avg_credits': sum(s['credits'] for s in subjects) / len(subjects) if subjects else 0
         }
         return render_template('admin/manage_subjects.html', 
                              subjects=subjects, 
@@ -2261,6 +2353,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/admin/subjects/add', methods=['POST'])
     @login_required
     @admin_required
+    @cache.invalidates('subjects', 'departments')
     def add_subject():
         if request.method == 'POST':
             try:
@@ -2326,8 +2419,6 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                db.joinedload(Course.class_courses).joinedload(ClassCourse.class_),
             ).all()
 
-            classes = Class.query.all()
-
             stats ={
             'total_courses': len(courses),
             'active_courses': len([c for c in courses if c.status == 'active']),
@@ -2337,9 +2428,9 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     
             return render_template('admin/manage_courses.html',
                          courses=courses,
-                         classes=classes,
-                         subjects=Subject.query.all(),
-                         teachers=Teacher.query.all(),
+                         classes=ReferenceData.classes(),
+                         subjects=ReferenceData.subjects(),
+                         teachers=ReferenceData.teachers(),
                          stats=stats)
                              
         except Exception as e:
@@ -2367,8 +2458,8 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                 class_ids = request.form.getlist('class_ids')  # QUAN TRỌNG: lấy class_ids
 
                 # KIỂM TRA VÀ TỰ ĐỘNG PHÂN CÔNG
-                teacher = Teacher.query.get(int(teacher_id))
-                subject = Subject.query.get(int(subject_id))
+                teacher = loader.get(Teacher, teacher_id)
+                subject = loader.get(Subject, subject_id)
             
                 if teacher and subject and subject not in teacher.assigned_subjects:
                 # Tự động phân công môn học cho giáo viên
@@ -2405,8 +2496,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                 start_date=datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None,
                 end_date=datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None,
                 description=description,
-                current_students=0,  # Đảm bảo khởi tạo = 0
-                registered_students=0  # Đảm bảo khởi tạo = 0
+                current_students=0  # Đảm bảo khởi tạo = 0
             )
             
                 db.session.add(new_course)
@@ -2426,10 +2516,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                          
                     # Tự động đăng ký sinh viên
                 registered_count = new_course.auto_register_class_students()
-                if registered_count > 0:
-                    new_course.current_students = registered_count
-                    new_course.registered_students = registered_count
-                    total_registered += registered_count
+                total_registered += registered_count
                 
                 db.session.commit()
                 flash(f'Đã thêm khóa học "{course_code}" thành công.', 'success')
@@ -2449,11 +2536,11 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     def reports():
         reports_list = []  # Would be populated with generated reports
         
-        stats = {
+        stats = fragments.get('admin_reports', 'all', ('students', 'courses', 'scores'), lambda: {
             'total_students': Student.query.count(),
             'total_courses': Course.query.count(),
             'avg_gpa': db.session.query(db.func.avg(Student.gpa)).scalar() or 0
-        }
+        })
         
         return render_template('admin/reports.html',
                              reports=reports_list,
@@ -2464,29 +2551,10 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @teacher_required
     def teacher_dashboard():
-        teacher_courses = Course.query.filter_by(teacher_id=current_user.teacher_profile.id).all()
-    
-        student_set = set()
-        for course in teacher_courses:
-        # Lấy tất cả sinh viên đã đăng ký và được duyệt trong khóa học này
-            registrations = CourseRegistration.query.filter_by(
-            course_id=course.id,
-            status='approved'
-        ).all()
-            for reg in registrations:
-                student_set.add(reg.student_id)
-    
-        actual_total_students = len(student_set)
-    
-        stats = {
-        'total_courses': len(teacher_courses),
-        'total_students': actual_total_students,  # SỬA: Dùng số lượng không trùng lặp
-        'pending_grading': Score.query.filter(
-            Score.course_id.in_([c.id for c in teacher_courses]),
-            Score.status == 'draft'
-        ).count(),
-        'upcoming_classes': 0  # Would be calculated
-    }
+        teacher_id = current_user.teacher_profile.id
+        widgets = fragments.get('teacher_dashboard', teacher_id, ('courses', 'registrations', 'scores'),
+                                lambda: _teacher_dashboard_widgets(teacher_id))
+        stats = widgets['stats']
     
         upcoming_classes = []  # Would be populated
         teaching_tasks = []    # Would be populated
@@ -2501,6 +2569,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     
         return render_template('teacher/teacher_dashboard.html',
                          stats=stats,
+                         widgets=widgets,
                          upcoming_classes=upcoming_classes,
                          teaching_tasks=teaching_tasks,
                          recent_activities=recent_activities,
@@ -2529,6 +2598,9 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
         
             print(f"DEBUG: Found {len(class_courses)} class_courses")
         
+        # Thống kê điểm của mọi khóa học của giáo viên trong 1 truy vấn
+            course_stats = CourseScoreStats.summaries(cc.course_id for cc in class_courses)
+        
         # Tạo danh sách lớp học duy nhất
             unique_classes = {}
         
@@ -2556,7 +2628,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                     total_avg = 0
                     valid_courses = 0
                     for cc in teacher_courses_in_class:
-                        course_avg = calculate_course_avg_score(cc.course_id)
+                        course_avg = calculate_course_avg_score(cc.course_id, course_stats)
                         if course_avg > 0:
                             total_avg += course_avg
                             valid_courses += 1
@@ -2576,172 +2648,40 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                     'status': course.status if course else 'unknown',
                     'room': course.room if course else 'Chưa có phòng',
                     'schedule': course.schedule if course else 'Chưa có lịch',
-                    'completed_weeks': calculate_completed_weeks(course) if course else 0,
-                    'total_weeks': 15,
-                    'teacher_role': 'Giảng viên chính',
-                    'icon': course.subject.icon if course and course.subject else 'book',
-                    'course_count': len(teacher_courses_in_class),
-                    'course_id': course.id if course else None  # THÊM: để dùng cho link
-                }
-        
-            classes_data = list(unique_classes.values())
-        
-            print(f"DEBUG: Final result - {len(classes_data)} unique classes")
-            for cls in classes_data:
-                print(f"  - {cls['class_name']}: {cls['course_count']} courses, {cls['student_count']} students")
-        
-            return render_template('teacher/teacher_class_list.html', 
-                             classes=classes_data)
-                             
-        except Exception as e:
-            logger.error(f"Error in teacher_class_list: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            flash('Lỗi khi tải danh sách lớp học. Vui lòng thử lại.', 'error')
-            return redirect(url_for('teacher_dashboard'))
-        
-    @app.route('/teacher/classes/export-pdf')
-    @login_required
-    @teacher_required
-    def export_teacher_classes_pdf():
-        """Export danh sách lớp học của giáo viên ra PDF"""
-        try:
-            register_vietnamese_fonts()
-            teacher_id = current_user.teacher_profile.id
-        
-        # Lấy danh sách lớp học của giáo viên
-            class_courses = ClassCourse.query.join(
-            Course, ClassCourse.course_id == Course.id
-        ).filter(
-            Course.teacher_id == teacher_id
-        ).options(
-            db.joinedload(ClassCourse.class_),
-            db.joinedload(ClassCourse.course).joinedload(Course.subject),
-        ).all()
-
-        # Tạo PDF
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30)
-            elements = []
-
-        # Styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1,
-            textColor=colors.HexColor('#2c3e50')
-        )
-
-        # Tiêu đề
-            title = Paragraph("DANH SÁCH LỚP HỌC - GIÁO VIÊN", title_style)
-            elements.append(title)
-
-        # Thông tin giáo viên
-            info_style = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.gray,
-            alignment=1
-        )
-        
-            teacher_info = f"Giáo viên: {current_user.full_name} | Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-            export_info = Paragraph(teacher_info, info_style)
-            elements.append(export_info)
-            elements.append(Spacer(1, 20))
-
-        # Dữ liệu bảng
-            data = [['STT', 'Mã lớp', 'Tên lớp', 'Môn học', 'Học kỳ', 'Số SV', 'Điểm TB', 'Trạng thái']]
-
-            unique_classes = {}
-            for class_course in class_courses:
-                class_obj = class_course.class_
-                course = class_course.course
-            
-                if not class_obj:
-                    continue
-                
-                class_id = class_obj.id
-                if class_id not in unique_classes:
-                # Tính điểm trung bình
-                    teacher_courses_in_class = [
-                    cc for cc in class_obj.class_courses 
-                    if cc.course.teacher_id == teacher_id
-                ]
-                
-                    total_avg = 0
-                    valid_courses = 0
-                    for cc in teacher_courses_in_class:
-                        course_avg = calculate_course_avg_score(cc.course_id)
-                        if course_avg > 0:
-                            total_avg += course_avg
-                            valid_courses += 1
-                
-                    avg_score = round(total_avg / valid_courses, 2) if valid_courses > 0 else 0.0
-                
-                    unique_classes[class_id] = {
-                    'class_name': class_obj.class_name,
-                    'class_code': class_obj.class_code,
-                    'course_name': course.subject.subject_name if course and course.subject else 'N/A',
-                    'semester': course.semester if course else 1,
-                    'student_count': Student.query.filter(Student.classes.any(id=class_id)).count(),
-                    'avg_score': avg_score,
-                    'status': course.status if course else 'unknown'
+                    'completed_weeks': calculate_completed_weeks(course) if course else 0,
+                    'total_weeks': 15,
+                    'teacher_role': 'Giảng viên chính',
+                    'icon': course.subject.icon if course and course.subject else 'book',
+                    'course_count': len(teacher_courses_in_class),
+                    'course_id': course.id if course else None  # THÊM: để dùng cho link
                 }
-
-        # Thêm dữ liệu vào bảng
-            for i, (class_id, class_data) in enumerate(unique_classes.items(), 1):
-                status_text = {
-                'active': 'Đang học',
-                'upcoming': 'Sắp bắt đầu', 
-                'completed': 'Đã kết thúc'
-            }.get(class_data['status'], class_data['status'])
-            
-                data.append([
-                str(i),
-                class_data['class_code'],
-                class_data['class_name'],
-                class_data['course_name'],
-                f"HK{class_data['semester']}",
-                str(class_data['student_count']),
-                f"{class_data['avg_score']:.2f}",
-                status_text
-            ])
-
-        # Tạo bảng
-            table = Table(data, colWidths=[30, 60, 100, 120, 40, 50, 50, 60])
-            table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-
-            elements.append(table)
-
-        # Tạo PDF
-            doc.build(elements)
-            buffer.seek(0)
-
-        # Trả về file PDF
-            response = make_response(buffer.getvalue())
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'attachment; filename=danh_sach_lop_hoc_giao_vien_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf'
-
-            return response
-
+        
+            classes_data = list(unique_classes.values())
+        
+            print(f"DEBUG: Final result - {len(classes_data)} unique classes")
+            for cls in classes_data:
+                print(f"  - {cls['class_name']}: {cls['course_count']} courses, {cls['student_count']} students")
+        
+            return render_template('teacher/teacher_class_list.html', 
+                             classes=classes_data)
+                             
         except Exception as e:
-            logger.error(f"Error exporting teacher classes PDF: {str(e)}")
-            return jsonify({'success': False, 'message': f'Lỗi khi xuất PDF: {str(e)}'}), 500
+            logger.error(f"Error in teacher_class_list: {str(e)}")
+            import traceback
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            flash('Lỗi khi tải danh sách lớp học. Vui lòng thử lại.', 'error')
+            return redirect(url_for('teacher_dashboard'))
+        
+    @app.route('/teacher/classes/export-pdf', methods=['GET', 'POST'])
+    @login_required
+    @teacher_required
+    def export_teacher_classes_pdf():
+        """Export danh sách lớp học của giáo viên ra PDF"""
+        params = {
+            'teacher_id': current_user.teacher_profile.id,
+            'teacher_name': current_user.full_name
+        }
+        return export_response('teacher_classes_pdf', params)
 
 # Thêm route export Excel cho teacher_input_scores
     @app.route('/teacher/scores/export-excel/<int:course_id>')
@@ -2873,18 +2813,15 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
         'Tỷ lệ đỗ': f'{pass_rate:.1f}%'
     }
     
-    def calculate_course_avg_score(course_id):
-        """Tính điểm trung bình của khóa học - ĐÃ SỬA XỬ LÝ LỖI"""
-        try:
-            scores = Score.query.filter_by(course_id=course_id).all()
-            if not scores:
-                return 0.0
-    
-            valid_scores = [s.final_score for s in scores if s.final_score is not None]
-            if not valid_scores:
-                return 0.0
+    def calculate_course_avg_score(course_id, stats=None):
+        """Điểm trung bình của khóa học - đọc từ dòng thống kê (CourseScoreStats).
         
-            return round(sum(valid_scores) / len(valid_scores), 2)
+        stats: kết quả CourseScoreStats.summaries() đã nạp sẵn cho cả trang (tránh 1 truy vấn / khóa học)
+        """
+        try:
+            if stats is not None and course_id in stats:
+                return stats[course_id]['avg_score']
+            return CourseScoreStats.summary(course_id)['avg_score']
         except Exception as e:
             logger.error(f"Error calculating course avg score for course {course_id}: {str(e)}")
             return 0.0
@@ -3118,24 +3055,18 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
 
      
     def calculate_course_statistics(course_id):
-        """Tính thống kê cho khóa học CỤ THỂ - ĐÃ SỬA"""
-        scores = Score.query.filter_by(course_id=course_id).all()
-    
-        if not scores:
-            return {'avg_score': 0, 'attendance_rate': 0, 'pass_rate': 0}
+        """Tính thống kê cho khóa học CỤ THỂ - đọc O(1) từ CourseScoreStats"""
+        stats = CourseScoreStats.summary(course_id)
     
-        valid_scores = [s.final_score for s in scores if s.final_score is not None]
-    
-        if not valid_scores:
+        if not stats['count']:
             return {'avg_score': 0, 'attendance_rate': 0, 'pass_rate': 0}
     
-        avg_score = round(sum(valid_scores) / len(valid_scores), 2)
-        pass_rate = len([s for s in valid_scores if s >= 5.0]) / len(valid_scores) * 100
-    
         return {
-        'avg_score': avg_score,
+        'avg_score': stats['avg_score'],
         'attendance_rate': 95,  # Có thể tính từ bảng attendance
-        'pass_rate': round(pass_rate, 1)
+        'pass_rate': stats['pass_rate'],
+        'std_dev': stats['std_dev'],
+        'histogram': stats['histogram']
         }
 
     @app.route('/teacher/input-scores')
@@ -3299,137 +3230,19 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
             return redirect(url_for('teacher_student_list'))
 
 
-    @app.route('/teacher/students/export-pdf')
+    @app.route('/teacher/students/export-pdf', methods=['GET', 'POST'])
     @login_required
     @teacher_required
     def export_teacher_students_pdf():
         """Export danh sách sinh viên của giáo viên ra PDF"""
-        try:
-            register_vietnamese_fonts()
-            teacher_id = current_user.teacher_profile.id
-        
-        # Lấy tham số từ URL
-            course_id = request.args.get('course_id')
-            class_id = request.args.get('class_id')
-        
-        # Lấy dữ liệu sinh viên
-            students_data = []
-            title = "Danh sách sinh viên"
-        
-            if course_id:
-                result = Course.get_course_with_students(course_id, teacher_id)
-                if result:
-                    students_data = result['students']
-                    course = result['course']
-                    title = f"Danh sách sinh viên - {course.course_code}"
-                
-            elif class_id:
-                class_obj = Class.query.get(class_id)
-                if class_obj:
-                    for student in class_obj.students:
-                        students_data.append({
-                        'student_id': student.student_id,
-                        'full_name': student.user.full_name,
-                        'email': student.user.email,
-                        'class_name': class_obj.class_name
-                    })
-                    title = f"Danh sách sinh viên - {class_obj.class_name}"
-            else:
-                teacher_courses = Course.query.filter_by(teacher_id=teacher_id).all()
-                for course in teacher_courses:
-                    registrations = CourseRegistration.query.filter_by(
-                    course_id=course.id, 
-                    status='approved'
-                ).all()
-                    for reg in registrations:
-                        student = reg.student
-                        class_names = ', '.join([cls.class_name for cls in student.classes]) if student.classes else 'N/A'
-                    
-                        students_data.append({
-                        'student_id': student.student_id,
-                        'full_name': student.user.full_name,
-                        'email': student.user.email,
-                        'class_name': class_names
-                    })
-                title = "Danh sách sinh viên - Tất cả khóa học"
-
-        # Tạo PDF
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30)
-            elements = []
-
-        # Styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1,
-            textColor=colors.HexColor('#2c3e50')
-        )
-
-        # Tiêu đề
-            title_paragraph = Paragraph(title, title_style)
-            elements.append(title_paragraph)
-
-        # Thông tin giáo viên và thời gian
-            info_style = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.gray,
-            alignment=1
-        )
-        
-            teacher_info = f"Giáo viên: {current_user.full_name} | Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')} | Tổng số: {len(students_data)} sinh viên"
-            export_info = Paragraph(teacher_info, info_style)
-            elements.append(export_info)
-            elements.append(Spacer(1, 20))
-
-        # Dữ liệu bảng
-            data = [['STT', 'Mã SV', 'Họ tên', 'Lớp', 'Email']]
-
-            for i, student in enumerate(students_data, 1):
-                data.append([
-                str(i),
-                student['student_id'],
-                student['full_name'],
-                student['class_name'],
-                student['email']
-            ])
-
-        # Tạo bảng
-            table = Table(data, colWidths=[30, 80, 120, 80, 150])
-            table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-
-            elements.append(table)
-
-        # Tạo PDF
-            doc.build(elements)
-            buffer.seek(0)
-
-        # Trả về file PDF
-            response = make_response(buffer.getvalue())
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'attachment; filename=danh_sach_sinh_vien_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf'
-
-            return response
-
-        except Exception as e:
-            logger.error(f"Error exporting teacher students PDF: {str(e)}")
-            return jsonify({'success': False, 'message': f'Lỗi khi xuất PDF: {str(e)}'}), 500
+        params = {
+            'teacher_id': current_user.teacher_profile.id,
+            'teacher_name': current_user.full_name,
+            # Lấy tham số từ URL
+            'course_id': request.values.get('course_id'),
+            'class_id': request.values.get('class_id')
+        }
+        return export_response('teacher_students_pdf', params)
         
     
     def get_teacher_students_data(teacher_id, course_id=None, class_id=None):
@@ -3481,6 +3294,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/api/teacher/courses/<int:course_id>/students')
     @login_required
     @teacher_required
+    @conditional_get(lambda course_id: (f'course:{course_id}', 'students', 'users', 'classes', 'memberships', 'subjects'))
     def api_get_course_students(course_id):
         try:
             teacher_id = current_user.teacher_profile.id
@@ -3624,6 +3438,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/api/teacher/class/<int:class_id>/details')
     @login_required
     @teacher_required
+    @conditional_get(lambda class_id: (f'class:{class_id}', 'courses', 'subjects'))
     def api_get_class_details(class_id):
         """API lấy thông tin chi tiết lớp học"""
         try:
@@ -3690,7 +3505,9 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                  return jsonify({
                 'success': True,
                 'message': f'Đã cập nhật điểm cho {result["updated_count"]} sinh viên',
-                'updated_count': result['updated_count']
+                'updated_count': result['updated_count'],
+                'counts': result.get('counts', {}),
+                'results': result['results']
             })
             else:
                 return jsonify({'success': False, 'message': result['error']}), 500
@@ -3969,37 +3786,21 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @student_required
     def student_dashboard():
-        current_courses = CourseRegistration.query.filter_by(
-            student_id=current_user.student_profile.id,
-            status='approved'
-        ).all()
-        
-        stats = {
-            'current_courses': len(current_courses),
-            'current_gpa': current_user.student_profile.gpa,
-            'attendance_rate': 95,  # Would be calculated
-            'upcoming_deadlines': 3,  # Would be calculated
-            'overall_progress': 75,   # Would be calculated
-            'completed_credits': current_user.student_profile.completed_credits,
-            'total_credits': current_user.student_profile.total_credits,
-            'completed_courses': 15,  # Would be calculated
-            'upcoming_courses': 5     # Would be calculated
-        }
+        student_id = current_user.student_profile.id
+        user_id = current_user.id
+        widgets = dict(fragments.get('student_dashboard', student_id, (f'student:{student_id}', 'courses'),
+                                     lambda: _student_dashboard_widgets(student_id)))
+        widgets['notifications'] = fragments.get('student_notifications', user_id, (f'notifications:{user_id}',),
+                                                 lambda: _student_notification_widget(user_id))
         
         today_classes = []  # Would be populated
         upcoming_deadlines = []  # Would be populated
-        recent_notifications = Notification.query.filter_by(
-            user_id=current_user.id
-        ).order_by(
-            Notification.created_at.desc()
-        ).limit(5).all()
         
         return render_template('student/student_dashboard.html',
-                             stats=stats,
-                             current_courses=current_courses,
+                             stats=widgets['stats'],
+                             widgets=widgets,
                              today_classes=today_classes,
-                             upcoming_deadlines=upcoming_deadlines,
-                             recent_notifications=recent_notifications)
+                             upcoming_deadlines=upcoming_deadlines)
     
     @app.route('/student/profile')
     @login_required
@@ -4316,79 +4117,35 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
         # Get week parameter from request, default to current week
             week = request.args.get('week', type=int, default=1)
         
-        # Get registered courses
-            registrations = CourseRegistration.query.filter_by(
-            student_id=current_user.student_profile.id,
-            status='approved'
-        ).all()
-        
-            courses = [reg.course for reg in registrations if reg.course]
+        # Thời khóa biểu đã tính sẵn (cache theo sinh viên + học kỳ, xem models.StudentTimetable)
+            semester = request.args.get('semester', type=int)
+            year = request.args.get('year')
+            courses = StudentTimetable.get(current_user.student_profile.id, semester, year)['courses']
+            subjects = {subject['id']: subject for subject in ReferenceData.subjects()}
+            teachers = {teacher['id']: teacher for teacher in ReferenceData.teachers()}
         
         # Generate timetable data from actual courses
             timetable = []
             for course in courses:
-                if course.schedule:
-                # Parse schedule data (assuming format: "Thứ 2 - Tiết 1-3" or similar)
-                    schedule_parts = course.schedule.split(' - ')
-                    if len(schedule_parts) >= 2:
-                        day_part = schedule_parts[0].lower()
-                        session_part = schedule_parts[1].lower()
-                    
-                    # Map day names to day codes
-                        day_mapping = {
-                        'thứ 2': 'mon', 'thứ hai': 'mon',
-                        'thứ 3': 'tue', 'thứ ba': 'tue', 
-                        'thứ 4': 'wed', 'thứ tư': 'wed',
-                        'thứ 5': 'thu', 'thứ năm': 'thu',
-                        'thứ 6': 'fri', 'thứ sáu': 'fri',
-                        'thứ 7': 'sat', 'thứ bảy': 'sat'
-                    }
-                    
-                    # Extract day
-                        day_code = None
-                        for day_name, code in day_mapping.items():
-                            if day_name in day_part:
-                                day_code = code
-                                break
-                    
-                    # Extract sessions
-                        sessions = []
-                        if 'tiết' in session_part:
-                            session_text = session_part.split('tiết')[1].strip()
-                            if '-' in session_text:
-                                start_end = session_text.split('-')
-                                if len(start_end) == 2:
-                                    start_session = int(start_end[0])
-                                    end_session = int(start_end[1])
-                                    sessions = list(range(start_session, end_session + 1))
-                            else:
-                                sessions = [int(session_text)]
-                    
-                    # Create timetable entries for each session
-                        for session in sessions:
-                        # Determine class type based on course info
-                            class_type = 'theory'  # default
-                            if course.room and 'lab' in course.room.lower():
-                                class_type = 'lab'
-                            elif course.room and 'thực hành' in course.room.lower():
-                                class_type = 'practice'
-                            elif 'thực hành' in course.schedule.lower():
-                                class_type = 'practice'
-                        
-                            timetable.append({
-                            'id': course.id,
-                            'course_code': course.course_code,
-                            'course_name': course.subject.subject_name if course.subject else 'N/A',
-                            'day': day_code,
-                            'day_name': day_part.title(),
-                            'session': session,
-                            'room': course.room or 'Chưa có phòng',
-                            'teacher': course.teacher.user.full_name if course.teacher and course.teacher.user else 'N/A',
-                            'type': class_type,
-                            'time': get_time_from_session(session),
-                            'week': week,
-                            'is_current': check_if_current_class(day_code, session)
-                        })
+                subject = subjects.get(course['subject_id'])
+                teacher = teachers.get(course['teacher_id'])
+                for day_index, session in course['slots']:
+                    day_code = schedule_utils.DAY_CODES[day_index]
+                
+                    timetable.append({
+                    'id': course['id'],
+                    'course_code': course['course_code'],
+                    'course_name': subject['subject_name'] if subject else 'N/A',
+                    'day': day_code,
+                    'day_name': schedule_utils.DAY_NAMES[day_index],
+                    'session': session,
+                    'room': course['room'] or 'Chưa có phòng',
+                    'teacher': teacher['full_name'] if teacher else 'N/A',
+                    'type': course['type'],
+                    'time': get_time_from_session(session),
+                    'week': week,
+                    'is_current': check_if_current_class(day_code, session)
+                })
         
         # Complete time slots
             time_slots = [
@@ -4411,9 +4168,9 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
         
             stats = {
             'total_classes': len(timetable),
-            'credit_hours': sum(c.subject.credits for c in courses if c and c.subject) * 15,
-            'theory_classes': len([c for c in courses if c.schedule and 'lý thuyết' in c.schedule.lower()]),
-            'practice_classes': len([c for c in courses if c.schedule and 'thực hành' in c.schedule.lower()])
+            'credit_hours': sum(subjects[c['subject_id']]['credits'] or 0 for c in courses if c['subject_id'] in subjects) * 15,
+            'theory_classes': len([c for c in courses if 'lý thuyết' in c['schedule'].lower()]),
+            'practice_classes': len([c for c in courses if 'thực hành' in c['schedule'].lower()])
         }
         
             ranking_percentage = 85
@@ -4673,7 +4430,6 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     def export_student_scores_pdf():
         """Export bảng điểm sinh viên ra PDF"""
         try:
-            register_vietnamese_fonts()
         
             student_id = current_user.student_profile.id
             student = current_user.student_profile
@@ -4687,28 +4443,14 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
             elements = []
         
         # Styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1,
-            textColor=colors.HexColor('#2c3e50')
-        )
+            title_style = pdf_styles['ExportTitle']
         
         # Tiêu đề
             title = Paragraph("BẢNG ĐIỂM HỌC TẬP", title_style)
             elements.append(title)
         
         # Thông tin sinh viên
-            info_style = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.gray,
-            alignment=0
-        )
+            info_style = pdf_styles['ExportInfoLeft']
         
             class_name = student.classes[0].class_name if student.classes else 'N/A'
             student_info = [
@@ -4804,6 +4546,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/api/class/<int:class_id>/students')
     @login_required
     @admin_required
+    @conditional_get(lambda class_id: (f'class:{class_id}', 'students', 'users', 'scores'))
     def api_get_class_students(class_id):
         try:
             class_obj = Class.query.get_or_404(class_id)
@@ -4834,6 +4577,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/api/class/<int:class_id>/students/<int:student_id>', methods=['DELETE'])
     @login_required
     @admin_required
+    @cache.invalidates('classes')
     def api_remove_student_from_class(class_id, student_id):
         try:
             student = Student.query.get_or_404(student_id)
@@ -4848,10 +4592,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
         # Cập nhật class_id về None
             student.classes.remove(class_obj)
         
-        # Cập nhật số lượng sinh viên trong lớp - SỬA CÁCH NÀY
-            if class_obj.current_students > 0:
-                class_obj.current_students -= 1
-        
+        # Số lượng sinh viên trong lớp được cập nhật tự động khi flush
             db.session.commit()
         
             return jsonify({
@@ -4890,6 +4631,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/api/class/<int:class_id>/add-students', methods=['POST'])
     @login_required
     @admin_required 
+    @cache.invalidates('classes')
     def api_add_students_to_class(class_id):
         """API thêm sinh viên vào lớp"""
         try:
@@ -4905,15 +4647,14 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                 'message': f'Vượt quá số lượng tối đa. Chỉ còn {class_obj.max_students - class_obj.current_students} chỗ trống'
             }), 400
         
+            students = loader.get_many(Student, student_ids, options=[db.selectinload(Student.classes)])
             added_count = 0
-            for student_id in student_ids:
-                student = Student.query.get(student_id)
-                if student and class_obj not in student.classes:
+            for student in students.values():
+                if class_obj not in student.classes:
                     student.classes.append(class_obj)
                     added_count += 1
         
-        # Cập nhật số lượng sinh viên
-            class_obj.current_students += added_count
+        # Số lượng sinh viên được cập nhật tự động khi flush
             db.session.commit()
         
             return jsonify({
@@ -4934,26 +4675,16 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @login_required
     @admin_required
     def api_get_available_students():
+        """Danh sách sinh viên để thêm vào lớp/khóa học - keyset, lọc ?q=&exclude_class_id=&exclude_course_id="""
         try:
-        # Lấy sinh viên chưa có lớp
-            students = Student.query.all()
-        
-            student_data = []
-            for student in students:
-                current_classes = [cls.class_name for cls in student.classes] if hasattr(student, 'classes') else []
-                student_data.append({
-                'id': student.id,
-                'student_id': student.student_id,
-                'full_name': student.user.full_name,
-                'email': student.user.email,
-                'current_classes': current_classes,  # Danh sách các lớp đang học
-                'class_count': len(current_classes)
-            })
-
+            page = _keyset_page(_student_list_query(request.args), STUDENT_SORTS, 'id', Student.id, request.args)
+            student_data = [_student_row(student) for student in page['items']]
         
             return jsonify({
             'success': True,
-            'students': student_data
+            'students': student_data,
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more']
         })
         except Exception as e:
             return jsonify({
@@ -4964,33 +4695,8 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
 
     def check_prerequisites(student_id, course_id):
         """Kiểm tra điều kiện tiên quyết"""
-        course = Course.query.get(course_id)
-        if not course or not course.subject or not course.subject.prerequisites:
-            return True, []
-    
-    # Lấy danh sách môn học đã hoàn thành
-        completed_scores = Score.query.filter_by(
-        student_id=student_id,
-        status='published'
-    ).filter(Score.final_score.isnot(None)).filter(Score.final_score >= 5.0).all()
-    
-        completed_subject_ids = [score.course.subject_id for score in completed_scores if score.course]
-    
-    # Kiểm tra prerequisites
-        import json
-        try:
-            required_prereq_ids = json.loads(course.subject.prerequisites)
-            missing_prereqs = []
-        
-            for prereq_id in required_prereq_ids:
-                prereq_subject = Subject.query.get(prereq_id)
-                if prereq_subject and prereq_id not in completed_subject_ids:
-                    missing_prereqs.append(prereq_subject.subject_name)
-        
-            return len(missing_prereqs) == 0, missing_prereqs
-        
-        except:
-            return True, []
+        missing_prereqs = PrerequisiteGraph.get().check_cart(student_id, [course_id]).get(course_id, [])
+        return len(missing_prereqs) == 0, missing_prereqs
 
     @app.route('/admin/courses/delete/<int:course_id>', methods=['POST'])
     @login_required
@@ -5096,38 +4802,46 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                 'message': f'Vượt quá số lượng tối đa. Chỉ còn {course.max_students - course.current_students} chỗ trống'
             }), 400
         
+        # Bỏ qua sinh viên bị trùng lịch (trừ khi admin chọn bỏ qua kiểm tra)
+            schedule_conflicts = {}
+            if not data.get('ignore_conflicts'):
+                schedule_conflicts = ScheduleConflictEngine.check_students(
+                student_ids, course.slot_mask, course.semester, course.year, course.id
+            )
+        
+            conflicted = {str(sid) for sid in schedule_conflicts}
+            students = loader.get_many(Student, [sid for sid in student_ids if str(sid) not in conflicted])
+            # Sinh viên đã đăng ký khóa học (1 truy vấn thay vì 1 truy vấn / sinh viên)
+            registered_ids = {row[0] for row in db.session.query(CourseRegistration.student_id).filter(
+                CourseRegistration.course_id == course_id,
+                CourseRegistration.student_id.in_(list(students))
+            )} if students else set()
+        
             added_count = 0
-            for student_id in student_ids:
-                student = Student.query.get(student_id)
-                if student:
-                # Kiểm tra xem sinh viên đã đăng ký chưa
-                    existing_reg = CourseRegistration.query.filter_by(
+            for student in students.values():
+                if student.id not in registered_ids:
+                 # Thêm đăng ký mới
+                    registration = CourseRegistration(
+                    student_id=student.id,
                     course_id=course_id,
-                    student_id=student.id
-                ).first()
-                
-                    if not existing_reg:
-                     # Thêm đăng ký mới
-                        registration = CourseRegistration(
-                        student_id=student.id,
-                        course_id=course_id,
-                        status='approved',  # Tự động duyệt khi admin thêm
-                        registration_date=datetime.utcnow()
-                    )
-                        db.session.add(registration)
-                        added_count += 1
-        
-        # Cập nhật số lượng sinh viên
-            if added_count > 0:
-                course.current_students += added_count
-                course.update_registration_counts()
+                    status='approved',  # Tự động duyệt khi admin thêm
+                    registration_date=datetime.utcnow()
+                )
+                    db.session.add(registration)
+                    added_count += 1
         
+        # Số lượng sinh viên được cập nhật tự động khi flush
             db.session.commit()
         
             return jsonify({
             'success': True,
-            'message': f'Đã thêm {added_count} sinh viên vào khóa học',
-            'added_count': added_count
+            'message': f'Đã thêm {added_count} sinh viên vào khóa học'
+                       + (f', {len(schedule_conflicts)} sinh viên bị trùng lịch' if schedule_conflicts else ''),
+            'added_count': added_count,
+            'schedule_conflicts': [
+                {'student_id': student_id, 'courses': codes}
+                for student_id, codes in schedule_conflicts.items()
+            ]
         })
         
         except Exception as e:
@@ -5161,11 +4875,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
         # Xóa đăng ký
             db.session.delete(registration)
         
-        # Cập nhật số lượng
-            if course.current_students > 0:
-                course.current_students -= 1
-                course.update_registration_counts()
-        
+        # Số lượng được cập nhật tự động khi flush
             db.session.commit()
         
             return jsonify({
@@ -5184,6 +4894,7 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     @app.route('/admin/classes/add', methods=['POST'])
     @login_required
     @admin_required
+    @cache.invalidates('classes')
     def add_class():
         if request.method == 'POST':
             try:
@@ -5235,8 +4946,6 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
                     for student in students:
                         if new_class not in student.classes:
                             student.classes.append(new_class)
-                
-                    new_class.current_students = len(students)
             
                 db.session.commit()
                 flash(f'Đã thêm lớp "{class_name}" thành công với {new_class.current_students} sinh viên.', 'success')
@@ -5255,11 +4964,13 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
             Notification.created_at.desc()
         ).all()
         
+        # Số chưa đọc từ bộ đếm, số theo loại từ 1 truy vấn GROUP BY
+        categories = Notification.category_counts(current_user.id)
         stats = {
-            'unread_count': len([n for n in notifications if not n.is_read]),
-            'academic_count': len([n for n in notifications if n.category == 'academic']),
-            'deadline_count': len([n for n in notifications if n.category == 'deadline']),
-            'system_count': len([n for n in notifications if n.category == 'system'])
+            'unread_count': Notification.unread_count(current_user.id),
+            'academic_count': categories.get('academic', {}).get('total', 0),
+            'deadline_count': categories.get('deadline', {}).get('total', 0),
+            'system_count': categories.get('system', {}).get('total', 0)
         }
         
         return render_template('student/student_notifications.html',
@@ -5275,11 +4986,12 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     def api_sync_system():
         """API đồng bộ toàn bộ hệ thống"""
         try:
-            from models import sync_complete_system
-            if sync_complete_system():
+            report = SystemSynchronizer.sync_all_data()
+            if report:
                 return jsonify({
                 'success': True,
-                'message': 'Đồng bộ hệ thống thành công!'
+                'message': 'Đồng bộ hệ thống thành công!',
+                'report': report
             })
             else:
                 return jsonify({
@@ -5292,50 +5004,71 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
             'message': f'Lỗi: {str(e)}'
         }), 500
 
+    def can_view_student_progress(student_id):
+        """Admin / giáo viên xem được mọi sinh viên; sinh viên chỉ xem được chính mình"""
+        if current_user.is_admin or current_user.is_teacher:
+            return True
+        profile = current_user.student_profile if current_user.is_student else None
+        return profile is not None and profile.id == student_id
+    
     @app.route('/api/sync/check-prerequisites/<int:course_id>/<int:student_id>')
     @login_required
     def api_check_prerequisites(course_id, student_id):
         """Kiểm tra điều kiện tiên quyết của sinh viên cho khóa học"""
+        if not can_view_student_progress(student_id):
+            return jsonify({'success': False, 'message': 'Không có quyền xem sinh viên này'}), 403
         try:
-            course = Course.query.get_or_404(course_id)
-            student = Student.query.get_or_404(student_id)
-        
-            if not course.subject or not course.subject.prerequisites:
-                return jsonify({
-                'can_register': True,
-                'missing_prerequisites': []
-            })
+            Course.query.get_or_404(course_id)
+            Student.query.get_or_404(student_id)
         
-        # Lấy danh sách môn học đã hoàn thành của sinh viên
-            completed_courses = Score.query.filter_by(
-                student_id=student_id,
-            status='published'
-        ).filter(Score.final_score >= 5.0).all()
+            missing_prereqs = PrerequisiteGraph.get().check_cart(student_id, [course_id]).get(course_id, [])
+            return jsonify({
+            'can_register': len(missing_prereqs) == 0,
+            'missing_prerequisites': missing_prereqs
+        })
+            
+        except Exception as e:
+            return jsonify({
+            'success': False,
+            'message': f'Lỗi khi kiểm tra điều kiện: {str(e)}'
+        }), 500
+
+    @app.route('/api/sync/check-prerequisites', methods=['POST'])
+    @login_required
+    def api_check_prerequisites_cart():
+        """Kiểm tra điều kiện tiên quyết cho cả giỏ đăng ký: {student_id, course_ids}.
+        
+        Sinh viên chỉ kiểm tra được giỏ của mình (bỏ trống student_id = chính mình).
+        """
+        data = request.get_json(silent=True) or {}
+        student_id = data.get('student_id')
+        if student_id is None and current_user.is_student and current_user.student_profile:
+            student_id = current_user.student_profile.id
+        try:
+            student_id = int(student_id)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Thiếu student_id'}), 400
+        if not can_view_student_progress(student_id):
+            return jsonify({'success': False, 'message': 'Không có quyền xem sinh viên này'}), 403
+        try:
+            student = Student.query.get_or_404(student_id)
+            course_ids = [int(course_id) for course_id in data.get('course_ids', [])]
         
-            completed_subject_ids = [score.course.subject_id for score in completed_courses if score.course]
+            details = PrerequisiteGraph.get().cart_details(student.id, course_ids)
+            return jsonify({
+            'can_register': not any(detail['missing'] for detail in details.values()),
+            'courses': [
+                {
+                    'course_id': course_id,
+                    'can_register': not details.get(course_id, {}).get('missing'),
+                    'missing_prerequisites': details.get(course_id, {}).get('missing', []),
+                    # Toàn bộ chuỗi tiên quyết (cả gián tiếp) sinh viên chưa qua
+                    'missing_chain': details.get(course_id, {}).get('chain', [])
+                }
+                for course_id in course_ids
+            ]
+        })
         
-        # Kiểm tra prerequisites
-            import json
-            try:
-                required_prereq_ids = json.loads(course.subject.prerequisites)
-                missing_prereqs = []
-            
-                for prereq_id in required_prereq_ids:
-                    prereq_subject = Subject.query.get(prereq_id)
-                    if prereq_subject and prereq_id not in completed_subject_ids:
-                        missing_prereqs.append(prereq_subject.subject_name)
-            
-                return jsonify({
-                'can_register': len(missing_prereqs) == 0,
-                'missing_prerequisites': missing_prereqs
-            })
-            
-            except Exception as e:
-                return jsonify({
-                'can_register': True,
-                'missing_prerequisites': []
-            })
-            
         except Exception as e:
             return jsonify({
             'success': False,
@@ -5347,19 +5080,20 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
     def api_teacher_available_subjects(teacher_id):
         """Lấy danh sách môn học giáo viên có thể dạy (theo department)"""
         try:
-            teacher = Teacher.query.get_or_404(teacher_id)
+            teacher = ReferenceData.teacher(teacher_id)
+            if teacher is None:
+                return jsonify({'success': False, 'message': 'Không tìm thấy giáo viên'}), 404
         
         # Lấy môn học cùng department với giáo viên
-            available_subjects = Subject.query.filter_by(department=teacher.department).all()
-        
+            assigned_ids = set(teacher['subject_ids'])
             subject_data = []
-            for subject in available_subjects:
+            for subject in ReferenceData.subjects_by_department(teacher['department']):
                 subject_data.append({
-                'id': subject.id,
-                'subject_code': subject.subject_code,
-                'subject_name': subject.subject_name,
-                'credits': subject.credits,
-                'is_assigned': subject in teacher.assigned_subjects
+                'id': subject['id'],
+                'subject_code': subject['subject_code'],
+                'subject_name': subject['subject_name'],
+                'credits': subject['credits'],
+                'is_assigned': subject['id'] in assigned_ids
             })
         
             return jsonify({
@@ -5444,13 +5178,80 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
         # Update score logic
         return jsonify({'success': True})
     
+    # Export chạy nền (utils/export_jobs.py)
+    @app.route('/exports/jobs')
+    @login_required
+    def export_job_list():
+        """Các lượt export gần đây của người dùng hiện tại"""
+        jobs = ExportJob.query.filter_by(user_id=current_user.id).order_by(
+            ExportJob.created_at.desc()
+        ).limit(20).all()
+        return jsonify({'success': True, 'jobs': [
+            job.to_dict(export_jobs.download_url(job.id)) for job in jobs
+        ]})
+    
+    @app.route('/exports/jobs/<job_id>')
+    @login_required
+    def export_job_status(job_id):
+        job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+        if not job:
+            return jsonify({'success': False, 'message': 'Không tìm thấy lượt xuất file'}), 404
+        return jsonify({'success': True, 'job': job.to_dict(export_jobs.download_url(job.id))})
+    
+    @app.route('/exports/jobs/<job_id>/download')
+    @login_required
+    def export_job_download(job_id):
+        job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+        if not job:
+            abort(404)
+        path = export_jobs.file_path(job.id)
+        if job.status == 'expired' or (job.status == 'done' and not os.path.exists(path)):
+            return jsonify({'success': False, 'message': 'File đã hết hạn, vui lòng xuất lại'}), 410
+        if job.status != 'done':
+            return jsonify({'success': False, 'message': 'File chưa sẵn sàng', 'job': job.to_dict()}), 409
+        return send_file(path, mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
+    
+    @app.route('/admin/export/transcripts', methods=['POST'])
+    @login_required
+    @admin_required
+    def export_cohort_transcripts():
+        """ZIP bảng điểm của cả lớp / khoa / khóa tuyển sinh - chỉ chạy nền (job export)"""
+        params = {
+            'class_id': request.values.get('class_id', type=int),
+            'faculty': request.values.get('faculty', '').strip() or None,
+            'intake': request.values.get('intake', '').strip() or None
+        }
+        if not any(params.values()):
+            return jsonify({'success': False, 'message': 'Cần chọn lớp, khoa hoặc khóa tuyển sinh'}), 400
+        return export_response('cohort_transcripts', params)
+    
     # Export routes
     @app.route('/export/transcript')
     @login_required
+    @student_required
     def export_transcript():
-        # This would require pdf_generator utility
-        flash('Chức năng export đang được phát triển.', 'info')
-        return redirect(url_for('student_scores'))
+        """Bảng điểm PDF của sinh viên đang đăng nhập"""
+        try:
+            student = current_user.student_profile
+            if not student:
+                flash('Không tìm thấy hồ sơ sinh viên.', 'error')
+                return redirect(url_for('index'))
+            scores = Score.query.filter_by(student_id=student.id).options(
+                db.joinedload(Score.course).joinedload(Course.subject)
+            ).join(Course).order_by(Course.year, Course.semester).all()
+            
+            generator = PDFGenerator()
+            pdf = pdf_renderer.render('transcript', generator.transcript_data(student, scores))
+            response = make_response(pdf)
+            response.headers['Content-Type'] = 'application/pdf'
+            response.headers['Content-Disposition'] = (
+                f'attachment; filename=bang_diem_{secure_filename(student.student_id)}.pdf'
+            )
+            return response
+        except Exception as e:
+            logger.error(f"Error exporting transcript: {str(e)}")
+            flash('Lỗi khi xuất bảng điểm.', 'error')
+            return redirect(url_for('student_scores'))
     
     @app.route('/export/scores/<int:course_id>')
     @login_required
@@ -5470,6 +5271,9 @@ Nếu bạn nhận được email này, cấu hình email đang hoạt động t
         db.session.rollback()
         return render_template('500.html'), 500
     
+    # Biên dịch sẵn template (sau khi mọi filter / handler đã đăng ký)
+    template_utils.warmup_on_startup(app)
+    
     return app
 
 
@@ -5478,6 +5282,8 @@ def initialize_app():
     """Initialize the application with database and sample data"""
     app = create_app()
     start_notification_scheduler(app)
+    # Khởi động sẵn worker render PDF (font nạp 1 lần / worker) trước request đầu tiên
+    pdf_renderer.start()
     
     with app.app_context():
         create_tables()
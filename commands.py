@@ -0,0 +1,272 @@
+"""
+Các lệnh quản trị chạy qua Flask CLI (flask <tên lệnh>)
+"""
+import click
+
+from models import db, SystemSync
+
+
+def register_commands(app):
+    """Đăng ký các lệnh CLI cho ứng dụng"""
+
+    @app.cli.command('verify-counters')
+    @click.option('--fix', is_flag=True, help='Đồng bộ lại các bộ đếm bị lệch sau khi kiểm tra')
+    @click.option('--limit', default=20, show_default=True, help='Số dòng lệch tối đa in ra cho mỗi bảng')
+    def verify_counters_command(fix, limit):
+        """Kiểm tra bộ đếm phi chuẩn hóa (sĩ số, số đăng ký, tổng GPA, thông báo chưa đọc, thống kê điểm) so với dữ liệu gốc"""
+        report = SystemSync.verify_counters()
+
+        for table in ('courses', 'classes', 'students', 'users', 'course_score_stats'):
+            rows = report[table]
+            click.echo(f"{table}: {len(rows)} giá trị lệch")
+            for row in rows[:limit]:
+                click.echo(f"  #{row['id']} {row['column']}: lưu={row['stored']} thực tế={row['expected']}")
+            if len(rows) > limit:
+                click.echo(f"  ... và {len(rows) - limit} giá trị khác")
+
+        if report['total_mismatches'] == 0:
+            click.echo('✅ Tất cả bộ đếm khớp với dữ liệu')
+            return
+
+        if not fix:
+            click.echo('⚠️ Có bộ đếm bị lệch - chạy lại với --fix để đồng bộ')
+            raise SystemExit(1)
+
+        result = SystemSync.run()
+        if result is None:
+            click.echo('❌ Đồng bộ thất bại, xem log để biết chi tiết')
+            raise SystemExit(1)
+        click.echo(f"✅ Đã đồng bộ: {result['changed_rows']} ({result['elapsed_ms']} ms)")
+
+    @app.cli.command('check-indexes')
+    @click.option('--verbose', is_flag=True, help='In kế hoạch thực thi của từng truy vấn')
+    def check_indexes_command(verbose):
+        """Kiểm tra các truy vấn nóng có dùng index (EXPLAIN trên MySQL / SQLite)"""
+        from utils.index_check import check_indexes, FULL_SCAN_ACCESS
+
+        results = check_indexes()
+        for result in results:
+            mark = '✅' if result['ok'] else '❌'
+            note = ''
+            if result['expected'] and result['used'] != result['expected']:
+                note = f" (mong đợi {result['expected']})"
+            if result['access'] in FULL_SCAN_ACCESS:
+                note += f" - quét toàn bộ ({result['access']})"
+            click.echo(f"{mark} {result['name']}: {result['table']} -> {result['used'] or 'không dùng index'}{note}")
+            if verbose:
+                for line in result['plan']:
+                    click.echo(f"     {line}")
+
+        failed = [result['name'] for result in results if not result['ok']]
+        if failed:
+            click.echo(f"❌ {len(failed)} truy vấn không tìm theo index mong đợi: {', '.join(failed)}")
+            raise SystemExit(1)
+        click.echo(f'✅ {len(results)} truy vấn nóng đều tìm theo index mong đợi')
+
+    @app.cli.command('generate-data')
+    @click.option('--students', default=1000, show_default=True, help='Số sinh viên')
+    @click.option('--courses', default=100, show_default=True, help='Tổng số khóa học (chia đều cho các học kỳ)')
+    @click.option('--semesters', default=4, show_default=True, help='Số học kỳ, học kỳ cuối là học kỳ hiện tại')
+    @click.option('--teachers', default=None, type=int, help='Số giáo viên (mặc định: courses / 10)')
+    @click.option('--subjects', default=None, type=int, help='Số môn học (mặc định: 2 x số khóa mỗi học kỳ)')
+    @click.option('--class-size', default=50, show_default=True, help='Sĩ số mỗi lớp sinh hoạt')
+    @click.option('--courses-per-semester', default=4, show_default=True, help='Số khóa mỗi sinh viên đăng ký / học kỳ')
+    @click.option('--attendance-sessions', default=5, show_default=True, help='Số buổi điểm danh của học kỳ hiện tại')
+    @click.option('--notifications', default=3, show_default=True, help='Số thông báo trung bình mỗi sinh viên')
+    @click.option('--batch-size', default=5000, show_default=True, help='Số dòng mỗi lệnh INSERT')
+    @click.option('--seed', default=42, show_default=True, help='Seed ngẫu nhiên (cùng seed -> cùng dữ liệu)')
+    @click.option('--yes', is_flag=True, help='Không hỏi xác nhận')
+    def generate_data_command(students, courses, semesters, teachers, subjects, class_size,
+                              courses_per_semester, attendance_sessions, notifications, batch_size, seed, yes):
+        """Sinh bộ dữ liệu lớn tái lập được để đo hiệu năng (ghi thêm vào database hiện tại)"""
+        from utils.datagen import generate_dataset
+
+        click.echo(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+        if not yes:
+            click.confirm(f'Sinh {students} sinh viên, {courses} khóa học, {semesters} học kỳ?', abort=True)
+
+        try:
+            report = generate_dataset(
+                students=students, courses=courses, semesters=semesters, teachers=teachers,
+                subjects=subjects, class_size=class_size, courses_per_semester=courses_per_semester,
+                attendance_sessions=attendance_sessions, notifications_per_user=notifications,
+                batch_size=batch_size, seed=seed
+            )
+        except ValueError as e:
+            click.echo(f'❌ {e}')
+            raise SystemExit(1)
+
+        for table, count in report['counts'].items():
+            click.echo(f"  {table}: {count:,} dòng")
+        for step, seconds in report['timings'].items():
+            click.echo(f"  {step}: {seconds}s")
+        total = sum(report['counts'].values())
+        click.echo(f"✅ Đã sinh {total:,} dòng trong {report['elapsed']}s")
+
+    @app.cli.command('rebuild-course-stats')
+    def rebuild_course_stats_command():
+        """Tính lại thống kê điểm của tất cả khóa học từ bảng điểm (1 truy vấn GROUP BY)"""
+        import time
+        from models import CourseScoreStats
+
+        started = time.perf_counter()
+        try:
+            rebuilt = CourseScoreStats.rebuild()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f'❌ Tính lại thống kê thất bại: {e}')
+            raise SystemExit(1)
+        elapsed = round((time.perf_counter() - started) * 1000, 1)
+        click.echo(f"✅ Đã tính lại thống kê điểm của {rebuilt} khóa học ({elapsed} ms)")
+
+    @app.cli.command('benchmark-pdf')
+    @click.option('--iterations', default=50, show_default=True, help='Số lần xuất mỗi cách')
+    @click.option('--rows', default=30, show_default=True, help='Số dòng của bảng mẫu')
+    def benchmark_pdf_command(iterations, rows):
+        """Đo chi phí mỗi lần xuất PDF: nạp lại font + style mỗi lần (cũ) và dùng registry chung"""
+        from utils.pdf_styles import benchmark
+
+        report = benchmark(iterations=iterations, rows=rows)
+        click.echo(f"Font: {report['font']} ({report['font_path'] or 'có sẵn trong ReportLab'})")
+        click.echo(f"{'':<22}{'chuẩn bị (ms)':>15}{'cả lần xuất (ms)':>19}")
+        for label, key in (('Nạp lại mỗi lần', 'before'), ('Registry dùng chung', 'after')):
+            row = report[key]
+            click.echo(f"{label:<22}{row['setup_ms']:>15}{row['export_ms']:>19}")
+        saved = report['before']['export_ms'] - report['after']['export_ms']
+        click.echo(f"✅ Tiết kiệm ~{saved:.2f} ms mỗi lần xuất ({iterations} lần, {rows} dòng)")
+
+    @app.cli.command('warm-timetables')
+    @click.option('--semester', default=None, type=int, help='Chỉ tính học kỳ này (mặc định: tất cả, như trang thời khóa biểu)')
+    @click.option('--year', default=None, help='Chỉ tính năm học này, vd 2024-2025')
+    @click.option('--batch-size', default=1000, show_default=True, help='Số dòng đọc mỗi lô')
+    def warm_timetables_command(semester, year, batch_size):
+        """Tính sẵn thời khóa biểu của mọi sinh viên vào cache (chạy trước khi bắt đầu học kỳ)"""
+        import time
+        from models import StudentTimetable
+
+        started = time.perf_counter()
+        warmed = StudentTimetable.warm(semester, year, batch_size=batch_size)
+        elapsed = round(time.perf_counter() - started, 2)
+        click.echo(f"✅ Đã tính sẵn thời khóa biểu của {warmed} sinh viên ({elapsed}s)")
+        cache_type = app.config.get('CACHE_TYPE', 'memory')
+        if cache_type != 'redis':
+            click.echo(f'⚠️ CACHE_TYPE={cache_type}: cache không dùng chung, các worker web không thấy kết quả này')
+
+    @app.cli.command('template-report')
+    @click.option('--clear', is_flag=True, help='Xóa bytecode cache trước khi đo (đo biên dịch từ mã nguồn)')
+    def template_report_command(clear):
+        """Thời gian biên dịch template và thời gian tới byte đầu tiên của trang chủ từng vai trò"""
+        import time
+        from flask import g, url_for
+        from models import User, UserRole
+        from utils import templates as template_utils
+        from utils.cache import cache
+
+        landing_pages = (
+            (UserRole.ADMIN, 'admin_dashboard'),
+            (UserRole.TEACHER, 'teacher_dashboard'),
+            (UserRole.STUDENT, 'student_dashboard'),
+        )
+        users = {role: User.query.filter_by(role=role, is_active=True).order_by(User.id).first()
+                 for role, _ in landing_pages}
+        client = app.test_client()
+
+        def first_byte(user, endpoint):
+            """(status, ms) của 1 request; bỏ fragment cache để chỉ đo phần template"""
+            cache.invalidate('fragments')
+            g.pop('_login_user', None)
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user.id)
+            with app.test_request_context():
+                url = url_for(endpoint)
+            started = time.perf_counter()
+            response = client.get(url)
+            return response.status_code, round((time.perf_counter() - started) * 1000, 1)
+
+        # 1 lượt làm nóng kết nối DB / cache dữ liệu để 2 lượt đo chỉ khác nhau ở phần template
+        for (role, endpoint), user in zip(landing_pages, users.values()):
+            if user:
+                first_byte(user, endpoint)
+
+        template_utils.clear(app, bytecode=clear)
+        cold = {role: first_byte(user, endpoint) for (role, endpoint), user in
+                zip(landing_pages, users.values()) if user}
+
+        report = template_utils.warmup(app)
+        source = 'mã nguồn' if clear or app.jinja_env.bytecode_cache is None else 'bytecode cache'
+        click.echo(f"Biên dịch sẵn {report['templates']} template: {report['elapsed_ms']} ms (từ {source})")
+        for name, ms in report['slowest']:
+            click.echo(f"  {name}: {ms} ms")
+        for name, error in report['failed']:
+            click.echo(f"  ❌ {name}: {error}")
+
+        click.echo(f"{'Trang':<22}{'chưa biên dịch (ms)':>22}{'đã biên dịch (ms)':>20}")
+        for (role, endpoint), user in zip(landing_pages, users.values()):
+            if not user:
+                click.echo(f"{endpoint:<22}{'(không có người dùng)':>22}")
+                continue
+            status, warm_ms = first_byte(user, endpoint)
+            cold_status, cold_ms = cold[role]
+            mark = '' if status == cold_status == 200 else f'  (HTTP {cold_status}/{status})'
+            click.echo(f"{endpoint:<22}{cold_ms:>22}{warm_ms:>20}{mark}")
+
+    @app.cli.command('cleanup-exports')
+    def cleanup_exports_command():
+        """Xóa file export nền đã hết hạn (EXPORT_JOB_TTL) và đánh dấu các job bị treo"""
+        from utils.export_jobs import export_jobs
+
+        report = export_jobs.cleanup()
+        click.echo(f"✅ Đã xóa {report['expired']} file hết hạn, {report['orphans']} file mồ côi; "
+                   f"{report['interrupted']} job treo chuyển sang 'failed'")
+
+    @app.cli.command('benchmark-pdf-render')
+    @click.option('--jobs', default=20, show_default=True, help='Số báo cáo render mỗi cách')
+    @click.option('--rows', default=200, show_default=True, help='Số dòng của mỗi báo cáo')
+    def benchmark_pdf_render_command(jobs, rows):
+        """So sánh render PDF ngay trong tiến trình web và qua pool tiến trình (PDF_RENDER_WORKERS)"""
+        from utils.pdf_render import benchmark
+
+        report = benchmark(jobs=jobs, rows=rows)
+        click.echo(f"{jobs} báo cáo x {rows} dòng, {report['workers']} worker, {report['cpus']} CPU")
+        click.echo(f"{'':<22}{'tổng (s)':>12}{'web bị chặn (s)':>18}")
+        for label, key in (('Trong tiến trình web', 'inline'), ('Pool tiến trình', 'pool')):
+            row = report[key]
+            if row is None:
+                click.echo(f"{label:<22}{'(PDF_RENDER_WORKERS = 0)':>30}")
+                continue
+            click.echo(f"{label:<22}{row['wall_s']:>12}{row['blocked_s']:>18}")
+
+    @app.cli.command('export-transcripts')
+    @click.option('--class-id', type=int, help='ID lớp')
+    @click.option('--faculty', help='Mã khoa (Class.faculty)')
+    @click.option('--intake', help='Khóa tuyển sinh, vd K2024 hoặc 2024')
+    @click.option('--output', default=None, help='Đường dẫn file ZIP (mặc định: tên tự sinh trong thư mục hiện tại)')
+    def export_transcripts_command(class_id, faculty, intake, output):
+        """Xuất bảng điểm PDF của cả lớp / khoa / khóa tuyển sinh vào 1 file ZIP"""
+        import time
+        import zipfile
+        from utils.export_transcripts import cohort_transcripts
+        from utils.pdf_render import pdf_renderer
+
+        try:
+            pdf_renderer.start(wait=True)
+            started = time.perf_counter()
+            result = cohort_transcripts(class_id=class_id, faculty=faculty, intake=intake)
+            output = output or result.filename
+            size = 0
+            with open(output, 'wb') as archive:
+                for chunk in result.data:
+                    archive.write(chunk)
+                    size += len(chunk)
+        except ValueError as e:
+            click.echo(f"❌ {e}")
+            return
+        finally:
+            pdf_renderer.shutdown()
+
+        elapsed = time.perf_counter() - started
+        with zipfile.ZipFile(output) as archive:
+            count = len(archive.namelist())
+        click.echo(f"✅ {count} bảng điểm -> {output} ({size / 1024:.0f} KB) trong {elapsed:.2f}s "
+                   f"({count / elapsed * 60:.0f} bảng điểm/phút, {pdf_renderer.workers} worker render)")
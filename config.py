@@ -32,6 +32,36 @@ class Config:
     # Redis Config (for Celery and SocketIO)
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
+    # Cache dữ liệu tham chiếu (utils/cache.py): memory | redis | null
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'memory'
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT') or 300)
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES') or 5000)
+    # Fragment dashboard (utils/fragments.py): còn "tươi" trong TTL giây, sau đó phục vụ bản cũ
+    # tối đa MAX_STALE giây trong lúc 1 luồng nền render lại
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL') or 60)
+    FRAGMENT_CACHE_MAX_STALE = int(os.environ.get('FRAGMENT_CACHE_MAX_STALE') or 900)
+    FRAGMENT_CACHE_BACKGROUND = True
+    # Thời khóa biểu đã tính sẵn của sinh viên (models.StudentTimetable) - tự mất hiệu lực khi
+    # đăng ký / lịch khóa học đổi, timeout chỉ để dọn khóa cũ
+    TIMETABLE_CACHE_TIMEOUT = int(os.environ.get('TIMETABLE_CACHE_TIMEOUT') or 7 * 24 * 3600)
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or REDIS_URL
+    
+    # Template Jinja (utils/templates.py): bytecode cache trên đĩa + biên dịch sẵn khi khởi động
+    TEMPLATE_BYTECODE_CACHE = os.environ.get('TEMPLATE_BYTECODE_CACHE', 'true').lower() == 'true'
+    TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR')
+    TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', 'true').lower() == 'true'
+    
+    # Export chạy nền (utils/export_jobs.py): số job chạy cùng lúc, thư mục file kết quả (mặc định
+    # instance/exports), thời gian giữ file (giây), số job chờ / chạy tối đa mỗi người dùng
+    EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS') or 2)
+    EXPORT_JOB_DIR = os.environ.get('EXPORT_JOB_DIR')
+    EXPORT_JOB_TTL = int(os.environ.get('EXPORT_JOB_TTL') or 24 * 3600)
+    EXPORT_JOB_MAX_ACTIVE = 3
+    
+    # Render PDF trong pool tiến trình (utils/pdf_render.py): 0 = render ngay trong tiến trình web
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS') or min(4, os.cpu_count() or 1))
+    PDF_RENDER_TIMEOUT = int(os.environ.get('PDF_RENDER_TIMEOUT') or 60)
+    
     # Application Specific Config
     MAX_CREDITS_PER_SEMESTER = 24
     MIN_CREDITS_PER_SEMESTER = 12
@@ -52,6 +82,10 @@ class ProductionConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    CACHE_TYPE = 'null'
+    TEMPLATE_WARMUP = False
+    EXPORT_JOB_WORKERS = 0  # chạy job ngay trong request
+    PDF_RENDER_WORKERS = 0
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
 
 config = {
@@ -1,7 +1,8 @@
 from functools import wraps
-from flask import flash, redirect, url_for, request, jsonify
+from flask import flash, redirect, url_for, request, jsonify, make_response
 from flask_login import current_user
 from models import UserRole
+from utils.fragments import fragments
 import logging
 
 logger = logging.getLogger(__name__)
@@ -36,6 +37,34 @@ def student_required(f):
     """Decorator to require student role"""
     return role_required(UserRole.STUDENT)(f)
 
+def conditional_get(dependencies):
+    """Conditional GET cho API JSON: ETag tính từ phiên bản dữ liệu (utils.fragments).
+
+    dependencies: hàm nhận tham số của route (vd: course_id=...) và trả về danh sách phiên bản
+    mà dữ liệu trả về phụ thuộc, vd ('course:5', 'users'). ETag gắn với người dùng hiện tại nên
+    304 chỉ trả cho người đã từng nhận bản 200 tương ứng -> không cần chạy lại kiểm tra quyền.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = fragments.etag(dependencies(**kwargs), current_user.get_id())
+            if etag is None:
+                return f(*args, **kwargs)
+            
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag)
+            # Trình duyệt luôn hỏi lại server (If-None-Match) trước khi dùng bản đã lưu
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
 def permission_required(permission):
     """Decorator for more granular permissions"""
     def decorator(f):
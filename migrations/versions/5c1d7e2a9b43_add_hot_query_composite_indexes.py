@@ -0,0 +1,44 @@
+"""Add composite indexes for hot query shapes
+
+Revision ID: 5c1d7e2a9b43
+Revises: 97b49fbf93f9
+Create Date: 2026-10-17 10:05:17.214836
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d7e2a9b43'
+down_revision = '97b49fbf93f9'
+branch_labels = None
+depends_on = None
+
+
+# (tên index, bảng, cột) - đồng bộ với __table_args__ trong models.py
+INDEXES = [
+    ('ix_scores_course_status_final', 'scores', ['course_id', 'status', 'final_score']),
+    ('ix_course_registrations_course_status', 'course_registrations', ['course_id', 'status']),
+    ('ix_notifications_user_read_created', 'notifications', ['user_id', 'is_read', 'created_at']),
+    ('ix_notifications_user_created', 'notifications', ['user_id', 'created_at']),
+    ('ix_student_class_class_student', 'student_class', ['class_id', 'student_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    # MySQL/InnoDB có thể đã bỏ index tự tạo của khóa ngoại và dùng các index trên thay thế:
+    # tạo lại index 1 cột cho cột đầu trước khi xóa để không vi phạm ràng buộc khóa ngoại
+    if op.get_bind().dialect.name == 'mysql':
+        for table, column in sorted({(table, columns[0]) for _, table, columns in INDEXES}):
+            op.create_index(f'ix_{table}_{column}', table, [column], unique=False)
+
+    for name, table, columns in reversed(INDEXES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(name)
@@ -0,0 +1,53 @@
+"""Add Student.gpa_weighted_sum for delta-based GPA engine
+
+Revision ID: 97b49fbf93f9
+Revises: fc3e8b2c5270
+Create Date: 2026-10-17 09:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '97b49fbf93f9'
+down_revision = 'fc3e8b2c5270'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('gpa_weighted_sum', sa.Float(), nullable=False, server_default='0'))
+
+    # Khởi tạo tổng tích lũy từ dữ liệu điểm hiện có (cùng định nghĩa với rebuild_gpa_aggregates)
+    op.execute("""
+        UPDATE students SET
+            gpa_weighted_sum = COALESCE((
+                SELECT SUM(sc.final_score * sj.credits)
+                FROM scores sc
+                JOIN courses c ON c.id = sc.course_id
+                JOIN subjects sj ON sj.id = c.subject_id
+                WHERE sc.student_id = students.id
+                  AND sc.final_score IS NOT NULL AND sc.final_score <> 0
+            ), 0),
+            completed_credits = COALESCE((
+                SELECT SUM(sj.credits)
+                FROM scores sc
+                JOIN courses c ON c.id = sc.course_id
+                JOIN subjects sj ON sj.id = c.subject_id
+                WHERE sc.student_id = students.id
+                  AND sc.final_score IS NOT NULL AND sc.final_score <> 0
+            ), 0)
+    """)
+    op.execute("""
+        UPDATE students SET gpa = CASE
+            WHEN completed_credits > 0 THEN ROUND(gpa_weighted_sum / completed_credits, 2)
+            ELSE 0
+        END
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_column('gpa_weighted_sum')
@@ -0,0 +1,42 @@
+"""Add Course.schedule_mask (72-bit day x period bitmask)
+
+Revision ID: a3e9f1c07d52
+Revises: 5c1d7e2a9b43
+Create Date: 2026-10-17 10:48:03.662190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.schedule import MASK_HEX_LENGTH, schedule_to_hex
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e9f1c07d52'
+down_revision = '5c1d7e2a9b43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('schedule_mask', sa.String(length=MASK_HEX_LENGTH), nullable=True))
+
+    # Parse lịch học hiện có 1 lần
+    connection = op.get_bind()
+    courses = sa.table('courses', sa.column('id', sa.Integer), sa.column('schedule', sa.Text),
+                       sa.column('schedule_mask', sa.String))
+    rows = [
+        {'b_id': course_id, 'b_mask': schedule_to_hex(schedule)}
+        for course_id, schedule in connection.execute(sa.select(courses.c.id, courses.c.schedule))
+    ]
+    if rows:
+        connection.execute(
+            courses.update().where(courses.c.id == sa.bindparam('b_id')).values(schedule_mask=sa.bindparam('b_mask')),
+            rows
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('schedule_mask')
@@ -0,0 +1,46 @@
+"""Add export_jobs (background export queue)
+
+Revision ID: b7d2f5e8c013
+Revises: e4b7c93a1f26
+Create Date: 2026-10-17 18:40:12.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2f5e8c013'
+down_revision = 'e4b7c93a1f26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('export_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('progress', sa.Integer(), nullable=False),
+    sa.Column('message', sa.String(length=255), nullable=True),
+    sa.Column('filename', sa.String(length=255), nullable=True),
+    sa.Column('mimetype', sa.String(length=100), nullable=True),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('export_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_export_jobs_user_created', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_export_jobs_status_expires', ['status', 'expires_at'], unique=False)
+
+
+def downgrade():
+    # Xóa bảng kéo theo index (MySQL không cho xóa riêng index mà khóa ngoại user_id đang dùng)
+    op.drop_table('export_jobs')
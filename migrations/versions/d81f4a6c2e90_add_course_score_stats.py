@@ -0,0 +1,58 @@
+"""Add course_score_stats (incremental per-course score statistics)
+
+Revision ID: d81f4a6c2e90
+Revises: a3e9f1c07d52
+Create Date: 2026-10-17 14:05:27.318640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f4a6c2e90'
+down_revision = 'a3e9f1c07d52'
+branch_labels = None
+depends_on = None
+
+# Xếp loại -> (cột, cận dưới, cận trên) - ĐỒNG BỘ với Score.GRADE_THRESHOLDS
+GRADE_BUCKETS = [
+    ('grade_f', None, 4.0), ('grade_d', 4.0, 5.0), ('grade_d_plus', 5.0, 5.5), ('grade_c', 5.5, 6.5),
+    ('grade_c_plus', 6.5, 7.0), ('grade_b', 7.0, 8.0), ('grade_b_plus', 8.0, 8.5), ('grade_a', 8.5, None),
+]
+
+
+def upgrade():
+    op.create_table('course_score_stats',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('score_count', sa.Integer(), nullable=False),
+    sa.Column('score_sum', sa.Float(), nullable=False),
+    sa.Column('score_sq_sum', sa.Float(), nullable=False),
+    sa.Column('pass_count', sa.Integer(), nullable=False),
+    *[sa.Column(column, sa.Integer(), nullable=False) for column, _, _ in reversed(GRADE_BUCKETS)],
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('course_id')
+    )
+
+    # Khởi tạo từ dữ liệu điểm hiện có (cùng định nghĩa với CourseScoreStats.rebuild)
+    buckets = []
+    for column, lower, upper in GRADE_BUCKETS:
+        conditions = [f'final_score >= {lower}' if lower is not None else None,
+                      f'final_score < {upper}' if upper is not None else None]
+        buckets.append((column, ' AND '.join(c for c in conditions if c)))
+
+    op.execute(f"""
+        INSERT INTO course_score_stats (course_id, score_count, score_sum, score_sq_sum, pass_count,
+                                        {', '.join(column for column, _ in buckets)})
+        SELECT course_id, COUNT(final_score), COALESCE(SUM(final_score), 0),
+               COALESCE(SUM(final_score * final_score), 0),
+               COUNT(CASE WHEN final_score >= 5.0 THEN 1 END),
+               {', '.join(f'COUNT(CASE WHEN {condition} THEN 1 END)' for _, condition in buckets)}
+        FROM scores
+        WHERE final_score IS NOT NULL
+        GROUP BY course_id
+    """)
+
+
+def downgrade():
+    op.drop_table('course_score_stats')
@@ -0,0 +1,34 @@
+"""Add User.unread_notifications_count counter
+
+Revision ID: e4b7c93a1f26
+Revises: d81f4a6c2e90
+Create Date: 2026-10-17 15:22:09.471385
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c93a1f26'
+down_revision = 'd81f4a6c2e90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Khởi tạo bộ đếm từ dữ liệu hiện có (cùng định nghĩa với SystemSync.sync_user_counts)
+    op.execute("""
+        UPDATE users SET unread_notifications_count = (
+            SELECT COUNT(*) FROM notifications n
+            WHERE n.user_id = users.id AND (n.is_read IS NULL OR n.is_read = 0)
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications_count')
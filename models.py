@@ -1,13 +1,23 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import validates  # THÊM DÒNG NÀY
+from sqlalchemy import event, func, case, or_, literal
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 
 from flask_login import UserMixin
+from flask import current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date
 import enum
 import logging
+import threading
 import re  # THÊM CHO VALIDATION EMAIL
 
+from utils import schedule as schedule_mask_utils
+from utils.cache import cache
+from utils.fragments import fragments
+from utils.loader import loader
+
 
 db = SQLAlchemy()
 logger = logging.getLogger(__name__)
@@ -28,7 +38,9 @@ student_class = db.Table('student_class',
     db.Column('student_id', db.Integer, db.ForeignKey('students.id'), primary_key=True),
     db.Column('class_id', db.Integer, db.ForeignKey('classes.id'), primary_key=True),
     db.Column('joined_at', db.DateTime, default=datetime.utcnow),
-    db.Column('is_active', db.Boolean, default=True)
+    db.Column('is_active', db.Boolean, default=True),
+    # PK là (student_id, class_id) -> cần index riêng cho truy vấn danh sách lớp theo class_id
+    db.Index('ix_student_class_class_student', 'class_id', 'student_id')
 )
 
 
@@ -47,6 +59,8 @@ class User(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
+    # Bộ đếm thông báo chưa đọc - BỘ ĐẾM PHI CHUẨN HÓA cập nhật khi flush
+    unread_notifications_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     student_profile = db.relationship('Student', backref='user', uselist=False, lazy=True, cascade='all, delete-orphan')
@@ -96,11 +110,25 @@ class Student(db.Model):
         """Property tương thích - trả về lớp đầu tiên (nếu có)"""
         class_list = self.classes.all() if hasattr(self.classes, 'all') else list(self.classes)
         return class_list[0] if class_list else None
+    
+    @classmethod
+    def class_names_column(cls, separator=', '):
+        """Cột tên các lớp của sinh viên (theo tên lớp, NULL nếu chưa có lớp) cho câu select export.
+        
+        Subquery tương quan trong chính câu select: đọc theo lô (yield_per) không cần truy vấn phụ
+        trên cùng kết nối - với MySQL (pymysql) truy vấn phụ sẽ cắt ngang result set đang stream.
+        """
+        return db.select(string_agg(Class.class_name, separator, Class.class_name)).join(
+            student_class, student_class.c.class_id == Class.id
+        ).where(student_class.c.student_id == cls.id).correlate(cls).scalar_subquery()
 
     # Academic info
     gpa = db.Column(db.Float, default=0.0)
     total_credits = db.Column(db.Integer, default=0)
     completed_credits = db.Column(db.Integer, default=0)
+    # Tổng (điểm TK x tín chỉ) - cùng completed_credits tạo thành tổng tích lũy cho GPA,
+    # được cập nhật theo delta mỗi khi Score thay đổi (xem GPA ENGINE bên dưới)
+    gpa_weighted_sum = db.Column(db.Float, default=0.0, nullable=False, server_default='0')
     
     # Relationships
     scores = db.relationship('Score', backref='student', lazy=True)
@@ -110,26 +138,29 @@ class Student(db.Model):
     
 
     def update_gpa(self):
-        """Cập nhật GPA tự động dựa trên điểm số"""
+        """Tính lại GPA của sinh viên từ DB (1 truy vấn tổng hợp) - dùng để khôi phục.
+        
+        Bình thường GPA đã được GPA ENGINE cập nhật theo delta khi lưu điểm,
+        không cần gọi hàm này. Không commit - hàm gọi tự commit.
+        """
         try:
-            scores = Score.query.filter_by(student_id=self.id).all()
-            total_credits = 0
-            weighted_sum = 0.0
-            
-            for score in scores:
-                if score.final_score and score.course and score.course.subject:
-                    credits = score.course.subject.credits
-                    total_credits += credits
-                    weighted_sum += score.final_score * credits
+            weighted_sum, credit_sum = db.session.query(
+                func.coalesce(func.sum(Score.final_score * Subject.credits), 0.0),
+                func.coalesce(func.sum(Subject.credits), 0)
+            ).select_from(Score).join(
+                Course, Course.id == Score.course_id
+            ).join(
+                Subject, Subject.id == Course.subject_id
+            ).filter(
+                Score.student_id == self.id,
+                Score.final_score.isnot(None),
+                Score.final_score != 0
+            ).one()
             
-            if total_credits > 0:
-                self.gpa = round(weighted_sum / total_credits, 2)
-                self.completed_credits = total_credits
-            else:
-                self.gpa = 0.0
-                self.completed_credits = 0
-                
-            db.session.commit()
+            self.gpa_weighted_sum = float(weighted_sum)
+            self.completed_credits = int(credit_sum)
+            self.gpa = round(self.gpa_weighted_sum / self.completed_credits, 2) if self.completed_credits > 0 else 0.0
+            db.session.add(self)
             return self.gpa
             
         except Exception as e:
@@ -335,7 +366,7 @@ class Subject(db.Model):
     @property
     def teacher_count(self):
         """Số lượng giáo viên dạy môn này"""
-        return len(self.teachers)  
+        return len(self.assigned_teachers)
 
     
     @property 
@@ -378,16 +409,10 @@ class Subject(db.Model):
     @property
     def prerequisites_list(self):
         """Parse prerequisites JSON thành list"""
-        import json
-        if self.prerequisites:
-            try:
-                prereq_ids = json.loads(self.prerequisites)
-                # Lấy tên môn học từ database
-                subjects = Subject.query.filter(Subject.id.in_(prereq_ids)).all()
-                return [s.subject_name for s in subjects]
-            except:
-                return []
-        return []
+        if not self.prerequisites:
+            return []
+        graph = PrerequisiteGraph.get()
+        return [graph.names[prereq_id] for prereq_id in graph.prerequisites_of(self.id)]
     
     def update_teacher_count(self):
         """Cập nhật số lượng giáo viên dạy môn này"""
@@ -429,6 +454,9 @@ class Course(db.Model):
     current_students = db.Column(db.Integer, default=0)
     room = db.Column(db.String(50))
     schedule = db.Column(db.Text, default='')
+    # Bitmask 72 bit (6 ngày x 12 tiết) dạng hex, tự tính lại mỗi khi gán schedule - xem utils/schedule.py
+    schedule_mask = db.Column(db.String(schedule_mask_utils.MASK_HEX_LENGTH),
+                              default=schedule_mask_utils.EMPTY_MASK_HEX)
     start_date = db.Column(db.Date)
     end_date = db.Column(db.Date)
     status = db.Column(db.String(20), default='upcoming')  # upcoming, active, completed, cancelled
@@ -453,7 +481,10 @@ class Course(db.Model):
     class_courses = db.relationship('ClassCourse', back_populates='course', cascade='all, delete-orphan')
 
     def update_registration_counts(self):
-        """Cập nhật số lượng đăng ký - HIỆU SUẤT CAO"""
+        """Đếm lại số lượng đăng ký từ DB (khôi phục).
+        
+        Bình thường các bộ đếm đã được cập nhật theo delta khi flush, không cần gọi hàm này.
+        """
         from sqlalchemy import func, case
     
         # CHỈ 1 QUERY thay vì 2 queries - ĐÃ SỬA LỖI INDENTATION
@@ -498,11 +529,8 @@ class Course(db.Model):
                         db.session.add(registration)
                         registered_count += 1
             
-            # Cập nhật số lượng
+            # Số lượng được cập nhật tự động khi flush (xem BỘ ĐẾM PHI CHUẨN HÓA)
             if registered_count > 0:
-                self.current_students += registered_count
-                self.registered_students = registered_count
-                self.update_registration_counts()
                 db.session.commit()
                 
             return registered_count
@@ -529,30 +557,7 @@ class Course(db.Model):
     @classmethod
     def batch_update_registration_counts(cls):
         """Batch update cho tất cả courses - TỐI ƯU KHI SYNC SYSTEM"""
-        from sqlalchemy import func, case
-    
-        # 1 QUERY cho tất cả counts - ĐÃ SỬA LỖI INDENTATION
-        count_query = db.session.query(
-            CourseRegistration.course_id,
-            func.count(CourseRegistration.id).label('total'),
-            func.count(case((CourseRegistration.status == 'approved', 1))).label('approved')
-        ).group_by(CourseRegistration.course_id)
-    
-        count_data = {row.course_id: row for row in count_query}
-    
-        # Update tất cả courses
-        courses = cls.query.all()
-        for course in courses:
-            if course.id in count_data:
-                data = count_data[course.id]
-                course.total_registrations_count = data.total
-                course.approved_registrations_count = data.approved
-            else:
-                course.total_registrations_count = 0
-                course.approved_registrations_count = 0
-        
-            db.session.add(course)
-    
+        SystemSync.sync_course_counts()
         db.session.commit()
 
     @classmethod
@@ -636,90 +641,42 @@ class Course(db.Model):
         
         return available_courses
 
+    @validates('schedule')
+    def validate_schedule(self, key, value):
+        """Parse lịch học 1 lần khi ghi và lưu bitmask bên cạnh chuỗi gốc"""
+        self.schedule_mask = schedule_mask_utils.schedule_to_hex(value)
+        return value
+    
+    @property
+    def slot_mask(self):
+        """Bitmask các tiết học trong tuần (int)"""
+        if self.schedule_mask is None:
+            # Dữ liệu cũ chưa được backfill
+            return schedule_mask_utils.parse_schedule(self.schedule)
+        return schedule_mask_utils.mask_from_hex(self.schedule_mask)
+    
     @staticmethod
     def check_schedule_conflicts(student_id, course_ids):
-        """Kiểm tra xung đột lịch học"""
-        conflicts = []
-        
-        # Lấy lịch học của các khóa học muốn đăng ký
-        target_courses = Course.query.filter(Course.id.in_(course_ids)).all()
-        
-        # Lấy lịch học các khóa học đã đăng ký
-        registered_registrations = CourseRegistration.query.filter(
-            CourseRegistration.student_id == student_id,
-            CourseRegistration.status.in_(['pending', 'approved'])
-        ).all()
-        
-        registered_courses = [reg.course for reg in registered_registrations if reg.course]
-        
-        # Kiểm tra xung đột
-        for target_course in target_courses:
-            for registered_course in registered_courses:
-                if Course.has_schedule_conflict(target_course.schedule, registered_course.schedule):
-                    conflicts.append({
-                        'course1': target_course.course_code,
-                        'course2': registered_course.course_code,
-                        'schedule1': target_course.schedule,
-                        'schedule2': registered_course.schedule
-                    })
-        
-        return conflicts
+        """Kiểm tra xung đột lịch học - xem ScheduleConflictEngine"""
+        return ScheduleConflictEngine.check_student(student_id, course_ids)
 
     @staticmethod
     def has_schedule_conflict(schedule1, schedule2):
-        """Kiểm tra xung đột giữa 2 lịch học"""
-        # Logic đơn giản: nếu cùng ngày và cùng khung giờ -> xung đột
-        if schedule1 and schedule2:
-            days1 = Course.extract_days(schedule1)
-            days2 = Course.extract_days(schedule2)
-            times1 = Course.extract_times(schedule1)
-            times2 = Course.extract_times(schedule2)
-            
-            # Kiểm tra xem có ngày trùng nhau không
-            common_days = set(days1) & set(days2)
-            if common_days:
-                # Kiểm tra xem có khung giờ trùng nhau không
-                for time1 in times1:
-                    for time2 in times2:
-                        if Course.time_overlap(time1, time2):
-                            return True
-        return False
+        """Kiểm tra xung đột giữa 2 lịch học (chuỗi hoặc bitmask)"""
+        mask1 = schedule1 if isinstance(schedule1, int) else schedule_mask_utils.parse_schedule(schedule1)
+        mask2 = schedule2 if isinstance(schedule2, int) else schedule_mask_utils.parse_schedule(schedule2)
+        return bool(mask1 & mask2)
 
     @staticmethod
     def extract_days(schedule):
         """Trích xuất các ngày học từ schedule string"""
-        days = []
-        schedule_lower = schedule.lower()
-        if 'thứ 2' in schedule_lower or 'thứ hai' in schedule_lower: 
-            days.append('mon')
-        if 'thứ 3' in schedule_lower or 'thứ ba' in schedule_lower: 
-            days.append('tue')
-        if 'thứ 4' in schedule_lower or 'thứ tư' in schedule_lower: 
-            days.append('wed')
-        if 'thứ 5' in schedule_lower or 'thứ năm' in schedule_lower: 
-            days.append('thu')
-        if 'thứ 6' in schedule_lower or 'thứ sáu' in schedule_lower: 
-            days.append('fri')
-        if 'thứ 7' in schedule_lower or 'thứ bảy' in schedule_lower: 
-            days.append('sat')
-        return days
+        return schedule_mask_utils.days_of(schedule_mask_utils.parse_schedule(schedule))
 
     @staticmethod
     def extract_times(schedule):
-        """Trích xuất khung giờ từ schedule string"""
-        times = []
-        sessions = schedule.split(',')
-        for session in sessions:
-            if 'tiết' in session.lower():
-                # Trích xuất tiết học - ví dụ: "Thứ 2 - Tiết 1-3"
-                import re
-                # Tìm pattern "Tiết X-Y" hoặc "Tiết X"
-                match = re.search(r'tiết\s*(\d+)(?:\s*-\s*(\d+))?', session.lower())
-                if match:
-                    start_session = int(match.group(1))
-                    end_session = int(match.group(2)) if match.group(2) else start_session
-                    times.append((start_session, end_session))
-        return times
+        """Trích xuất khung giờ (tiết bắt đầu, tiết kết thúc) từ schedule string"""
+        mask = schedule_mask_utils.parse_schedule(schedule)
+        return sorted({(start, end) for _, start, end in schedule_mask_utils.iter_ranges(mask)})
 
     @staticmethod
     def time_overlap(time1, time2):
@@ -730,6 +687,31 @@ class Course(db.Model):
         # Kiểm tra overlap: (start1 <= end2) and (start2 <= end1)
         return max(start1, start2) < min(end1, end2)
 
+    @classmethod
+    def room_occupancy(cls, room, semester, year, exclude_course_id=None):
+        """Bitmask các tiết phòng `room` đã được sử dụng trong học kỳ (OR của các khóa học)"""
+        query = db.session.query(cls.schedule_mask, cls.schedule).filter(
+            cls.room == room,
+            cls.semester == semester,
+            cls.year == year,
+            cls.status != 'cancelled'
+        )
+        if exclude_course_id:
+            query = query.filter(cls.id != exclude_course_id)
+        
+        occupied = 0
+        for mask_hex, schedule in query:
+            occupied |= (schedule_mask_utils.mask_from_hex(mask_hex) if mask_hex is not None
+                         else schedule_mask_utils.parse_schedule(schedule))
+        return occupied
+
+    def room_conflict_slots(self):
+        """Các tiết (day_index, tiết) của khóa học bị trùng phòng với khóa học khác"""
+        if not self.room:
+            return []
+        overlap = self.slot_mask & Course.room_occupancy(self.room, self.semester, self.year, self.id)
+        return list(schedule_mask_utils.iter_slots(overlap))
+
 
     @property
     def teacher_name(self):
@@ -828,8 +810,8 @@ class Course(db.Model):
             hasattr(self, 'subject_id') and self.subject_id and
             db.session.is_modified(self, include_collections=False)):
         
-            teacher = Teacher.query.get(value)
-            subject = Subject.query.get(self.subject_id)
+            teacher = loader.get(Teacher, value)
+            subject = loader.get(Subject, self.subject_id)
         
             if teacher and subject and subject not in teacher.assigned_subjects:
             # TỰ ĐỘNG PHÂN CÔNG THAY VÌ BÁO LỖI
@@ -848,65 +830,28 @@ class Course(db.Model):
     
 def sync_complete_system():
     """Đồng bộ toàn bộ hệ thống - HIỆU SUẤT CAO"""
-    try:
-        # 1. Đồng bộ số lượng đăng ký khóa học
-        Course.batch_update_registration_counts()
-        
-        # 2. Đồng bộ GPA cho tất cả students
-        students = Student.query.all()
-        for student in students:
-            student.update_gpa()
-            
-        # 3. Đồng bộ số lượng môn học của giáo viên
-        teachers = Teacher.query.all()
-        for teacher in teachers:
-            teacher.update_subject_count()
-            
-        # 4. Đồng bộ số lượng sinh viên trong lớp
-        classes = Class.query.all()
-        for class_obj in classes:
-            actual_count = Student.query.filter_by(class_id=class_obj.id).count()
-            if class_obj.current_students != actual_count:
-                class_obj.current_students = actual_count
-                db.session.add(class_obj)
-        
-        # 5. Đồng bộ số lượng giáo viên dạy môn học
-        subjects = Subject.query.all()
-        for subject in subjects:
-            subject.update_teacher_count()
-        
-        db.session.commit()
-        logger.info("Complete system synchronization successful")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error in complete system sync: {str(e)}")
-        db.session.rollback()
-        return False
+    return SystemSync.run() is not None
 
 class CourseRegistration(db.Model):
     __tablename__ = 'course_registrations'
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    # active_history: giữ giá trị cũ để bộ đếm của Course được cập nhật theo delta
+    course_id = db.column_property(db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False), active_history=True)
     registration_date = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='approved')  # pending, approved, rejected, cancelled
+    status = db.column_property(db.Column(db.String(20), default='approved'), active_history=True)  # pending, approved, rejected, cancelled
     notes = db.Column(db.Text)
     
     # Unique constraint
-    __table_args__ = (db.UniqueConstraint('student_id', 'course_id', name='unique_student_course'),)
-
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Tự động cập nhật count khi tạo mới
-        self._update_course_counts()
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'course_id', name='unique_student_course'),
+        db.Index('ix_course_registrations_course_status', 'course_id', 'status'),
+    )
 
     def save(self):
-        """Lưu và cập nhật counts"""
+        """Lưu đăng ký - bộ đếm của Course được cập nhật tự động khi flush"""
         db.session.add(self)
-        db.session.flush()
-        self._update_course_counts()
         db.session.commit()
     
     def get_current_score(self):
@@ -924,21 +869,80 @@ class CourseRegistration(db.Model):
             course_id=self.course_id
         ).first()
 
+def upsert_statement(dialect, table, rows, key_columns, update):
+    """INSERT ... ON DUPLICATE KEY UPDATE (MySQL) / ON CONFLICT DO UPDATE (SQLite, PostgreSQL).
+    
+    update(new) -> {cột: biểu thức}, với new[cột] là giá trị của dòng đang chèn
+    (inserted / excluded), vd. ghi đè: new[cột]; cộng dồn: table.c[cột] + new[cột].
+    Trả về None nếu dialect không hỗ trợ upsert.
+    """
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(rows)
+        return stmt.on_duplicate_key_update(update(stmt.inserted))
+    
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(rows)
+        return stmt.on_conflict_do_update(index_elements=key_columns, set_=update(stmt.excluded))
+    
+    return None
+
+
+class string_agg(FunctionElement):
+    """Nối chuỗi các giá trị trong nhóm, theo thứ tự: string_agg(cột, dấu phân cách, cột sắp xếp).
     
-    def _update_course_counts(self):
-        """Cập nhật số lượng đăng ký cho course"""
-        if self.course:
-            self.course.update_registration_counts()
+    MySQL: GROUP_CONCAT(... ORDER BY ... SEPARATOR ...); PostgreSQL: string_agg(... ORDER BY ...);
+    SQLite: group_concat (ORDER BY trong hàm gộp từ SQLite 3.44, bản cũ hơn giữ thứ tự quét).
+    """
+    name = 'string_agg'
+    type = db.String()
+    inherit_cache = True
+    
+    def __init__(self, expr, separator, order_by):
+        super().__init__(expr, literal(separator), order_by)
+
+
+def _string_agg_parts(compiler, element, **kw):
+    expr, separator, order_by = element.clauses
+    return (compiler.process(expr, **kw), compiler.process(separator, literal_binds=True),
+            compiler.process(order_by, **kw))
+
+
+@compiles(string_agg)
+def _compile_string_agg(element, compiler, **kw):
+    expr, separator, order_by = _string_agg_parts(compiler, element, **kw)
+    version = getattr(compiler.dialect.dbapi, 'sqlite_version_info', (0,))
+    if version >= (3, 44, 0):
+        return f'group_concat({expr}, {separator} ORDER BY {order_by})'
+    return f'group_concat({expr}, {separator})'
+
+
+@compiles(string_agg, 'mysql')
+def _compile_string_agg_mysql(element, compiler, **kw):
+    expr, separator, order_by = _string_agg_parts(compiler, element, **kw)
+    return f'GROUP_CONCAT({expr} ORDER BY {order_by} SEPARATOR {separator})'
+
+
+@compiles(string_agg, 'postgresql')
+def _compile_string_agg_postgresql(element, compiler, **kw):
+    expr, separator, order_by = _string_agg_parts(compiler, element, **kw)
+    return f'string_agg({expr}, {separator} ORDER BY {order_by})'
+
 
 class Score(db.Model):
     __tablename__ = 'scores'
     
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    # active_history: luôn giữ giá trị cũ để GPA ENGINE tính delta chính xác
+    student_id = db.column_property(db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False), active_history=True)
+    course_id = db.column_property(db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False), active_history=True)
     process_score = db.Column(db.Float)
     exam_score = db.Column(db.Float)
-    final_score = db.Column(db.Float)
+    final_score = db.column_property(db.Column(db.Float), active_history=True)
     grade = db.Column(db.String(2))  # A, B+, B, C+, C, D+, D, F
     status = db.Column(db.String(20), default='draft')  # draft, published
     components = db.Column(db.Text)  # JSON string of component scores
@@ -946,7 +950,10 @@ class Score(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Unique constraint
-    __table_args__ = (db.UniqueConstraint('student_id', 'course_id', name='unique_student_course_score'),)
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'course_id', name='unique_student_course_score'),
+        db.Index('ix_scores_course_status_final', 'course_id', 'status', 'final_score'),
+    )
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -954,14 +961,8 @@ class Score(db.Model):
         self._calculate_final_score()
 
     def save(self):
-        """Lưu điểm và cập nhật GPA"""
+        """Lưu điểm - GPA được GPA ENGINE cập nhật tự động khi flush"""
         db.session.add(self)
-        db.session.flush()
-        
-        # Cập nhật GPA cho student
-        if self.student:
-            self.student.update_gpa()
-            
         db.session.commit()
 
     def _calculate_final_score(self):
@@ -983,72 +984,1706 @@ class Score(db.Model):
         elif score >= 4.0: return 'D'
         else: return 'F'
 
+    # Ngưỡng xếp loại (tăng dần) - ĐỒNG BỘ với _calculate_grade
+    GRADE_THRESHOLDS = [4.0, 5.0, 5.5, 6.5, 7.0, 8.0, 8.5]
+    GRADE_LABELS = ['F', 'D', 'D+', 'C', 'C+', 'B', 'B+', 'A']
+    
+    # Các cột được ghi khi upsert hàng loạt
+    UPSERT_COLUMNS = ('process_score', 'exam_score', 'final_score', 'grade', 'status', 'notes', 'updated_at')
+    
     @classmethod
-    def batch_update_scores(cls, course_id, scores_data):
-        """Cập nhật hàng loạt điểm số"""
+    def compute_final_scores(cls, process_scores, exam_scores):
+        """Tính điểm tổng và xếp loại cho cả vector điểm (None = thiếu điểm).
+        
+        Trả về (final_scores, grades); phần tử là None nếu thiếu điểm quá trình hoặc điểm thi.
+        """
+        import numpy as np
+        
+        process = np.array([np.nan if v is None else v for v in process_scores], dtype=float)
+        exam = np.array([np.nan if v is None else v for v in exam_scores], dtype=float)
+        raw = process * 0.4 + exam * 0.6
+        complete = ~np.isnan(raw)
+        
+        # round() của Python để khớp từng chữ số với _calculate_final_score
+        final = np.array([round(v, 2) if ok else np.nan for v, ok in zip(raw.tolist(), complete)], dtype=float)
+        grade_idx = np.searchsorted(cls.GRADE_THRESHOLDS, np.nan_to_num(final), side='right')
+        
+        final_scores = [v if ok else None for v, ok in zip(final.tolist(), complete)]
+        grades = [cls.GRADE_LABELS[i] if ok else None for i, ok in zip(grade_idx.tolist(), complete)]
+        return final_scores, grades
+    
+    @staticmethod
+    def _parse_score(value):
+        """Chuẩn hóa 1 ô điểm: None/'' -> None, còn lại phải là số trong [0, 10]"""
+        if value is None or value == '':
+            return None
         try:
-            updated_count = 0
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Điểm không hợp lệ: {value}')
+        if not 0 <= value <= 10:
+            raise ValueError('Điểm phải nằm trong khoảng 0 - 10')
+        return value
+    
+    @classmethod
+    def _upsert_statement(cls, rows):
+        """Upsert các dòng điểm theo (student_id, course_id), ghi đè UPSERT_COLUMNS.
+        
+        Trả về None nếu dialect không hỗ trợ upsert.
+        """
+        return upsert_statement(
+            db.session.get_bind().dialect.name, cls.__table__, rows, ['student_id', 'course_id'],
+            lambda new: {column: new[column] for column in cls.UPSERT_COLUMNS}
+        )
+    
+    @classmethod
+    def batch_update_scores(cls, course_id, scores_data, chunk_size=500):
+        """Cập nhật hàng loạt điểm số của 1 khóa học.
         
+        - 1 truy vấn lấy (và khóa) toàn bộ điểm hiện có của khóa học
+        - Tính điểm tổng / xếp loại theo vector
+        - Ghi bằng upsert theo dialect (mỗi chunk 1 câu lệnh), bỏ qua dòng không đổi
+        - GPA: cộng delta 1 lần cho mỗi sinh viên bị ảnh hưởng
+        
+        Trả về kết quả từng dòng trong 'results' (status: inserted/updated/unchanged/error).
+        """
+        try:
+            table = cls.__table__
+            results = []
+            valid = {}  # student_id -> (index trong results, process, exam, notes)
+            
             for score_data in scores_data:
                 student_id = score_data.get('student_id')
-                process_score = score_data.get('process_score')
-                exam_score = score_data.get('exam_score')
-                notes = score_data.get('notes', '')
+                result = {'student_id': student_id}
+                results.append(result)
+                try:
+                    student_id = int(student_id)
+                except (TypeError, ValueError):
+                    result.update(status='error', message='Mã sinh viên không hợp lệ')
+                    continue
+                try:
+                    process_score = cls._parse_score(score_data.get('process_score'))
+                    exam_score = cls._parse_score(score_data.get('exam_score'))
+                except ValueError as e:
+                    result.update(status='error', message=str(e))
+                    continue
+                
+                # Trùng sinh viên trong cùng request: dòng sau ghi đè dòng trước
+                if student_id in valid:
+                    results[valid[student_id][0]].update(status='error', message='Bị ghi đè bởi dòng sau')
+                result['student_id'] = student_id
+                valid[student_id] = (len(results) - 1, process_score, exam_score, score_data.get('notes', ''))
             
-            # Tìm hoặc tạo bản ghi điểm
-                score = cls.query.filter_by(
-                student_id=student_id,
-                course_id=course_id
-            ).first()
+            if not valid:
+                return {'success': True, 'updated_count': 0, 'results': results}
             
-                if not score:
-                    score = cls(
-                    student_id=student_id,
-                    course_id=course_id,
-                    process_score=process_score,
-                    exam_score=exam_score,
-                    notes=notes
+            # 1. Lấy toàn bộ điểm hiện có của khóa học trong 1 truy vấn, khóa tới khi commit:
+            # phân loại inserted/updated và delta GPA / thống kê dựa trên ảnh chụp này, nên không
+            # được có dòng điểm mới của khóa học chen vào trước upsert (InnoDB: SELECT ... FOR UPDATE
+            # khóa cả khoảng course_id trên ix_scores_course_status_final, chặn INSERT đồng thời)
+            existing = {
+                row.student_id: row
+                for row in db.session.execute(
+                    db.select(table).where(table.c.course_id == course_id).with_for_update()
                 )
-                    db.session.add(score)
+            }
+            
+            # 2. Tính điểm tổng / xếp loại theo vector
+            student_ids = list(valid)
+            final_scores, grades = cls.compute_final_scores(
+                [valid[sid][1] for sid in student_ids],
+                [valid[sid][2] for sid in student_ids]
+            )
+            
+            now = datetime.utcnow()
+            rows = []
+            score_changes = {}  # student_id -> (final_score cũ, final_score mới)
+            for student_id, final_score, grade in zip(student_ids, final_scores, grades):
+                index, process_score, exam_score, notes = valid[student_id]
+                old = existing.get(student_id)
+                
+                values = {
+                    'process_score': process_score,
+                    'exam_score': exam_score,
+                    'notes': notes,
+                }
+                if final_score is not None:
+                    values.update(final_score=final_score, grade=grade, status='published')
+                elif old is not None:
+                    # Chưa đủ điểm: giữ nguyên điểm tổng đã có (như cách cập nhật từng bản ghi trước đây)
+                    values.update(final_score=old.final_score, grade=old.grade, status=old.status)
+                else:
+                    values.update(final_score=None, grade=None, status='draft')
+                
+                if old is not None and all(getattr(old, key) == value for key, value in values.items()):
+                    outcome = 'unchanged'
                 else:
-                    score.process_score = process_score
-                    score.exam_score = exam_score
-                    score.notes = notes
+                    outcome = 'updated' if old is not None else 'inserted'
+                    rows.append(dict(values, student_id=student_id, course_id=course_id, updated_at=now))
+                    old_final = old.final_score if old is not None else None
+                    if old_final != values['final_score']:
+                        score_changes[student_id] = (old_final, values['final_score'])
+                
+                results[index].update(status=outcome, final_score=values['final_score'], grade=values['grade'])
             
-            # Tính điểm tổng nếu có đủ điểm
-                if process_score is not None and exam_score is not None:
-                    score.final_score = round((process_score * 0.4) + (exam_score * 0.6), 2)
-                    score.grade = score._calculate_grade(score.final_score)
-                    score.status = 'published'
+            # 3. Ghi bằng upsert
+            if rows:
+                db.session.flush()
+                statement_rows = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+                statements = [cls._upsert_statement(chunk) for chunk in statement_rows]
+                if any(stmt is None for stmt in statements):
+                    # Dialect không hỗ trợ upsert: INSERT dòng mới, UPDATE dòng cũ theo lô
+                    new_rows = [row for row in rows if row['student_id'] not in existing]
+                    if new_rows:
+                        db.session.execute(table.insert(), new_rows)
+                    old_rows = [{f'b_{key}': value for key, value in row.items()} for row in rows
+                                if row['student_id'] in existing]
+                    if old_rows:
+                        db.session.execute(table.update().where(
+                            table.c.course_id == course_id,
+                            table.c.student_id == db.bindparam('b_student_id')
+                        ).values({column: db.bindparam(f'b_{column}') for column in cls.UPSERT_COLUMNS}), old_rows)
+                else:
+                    for stmt in statements:
+                        db.session.execute(stmt)
+            
+            # 4. GPA: Core statement bỏ qua session events -> tự cộng delta, 1 lần mỗi sinh viên
+            if score_changes:
+                credits = _course_credits(db.session, [course_id]).get(course_id)
+                deltas = {}
+                for student_id, (old_final, new_final) in score_changes.items():
+                    old_weighted, old_credits = _score_contribution(old_final, credits)
+                    new_weighted, new_credits = _score_contribution(new_final, credits)
+                    if old_credits or new_credits:
+                        deltas[student_id] = [new_weighted - old_weighted, new_credits - old_credits]
+                if deltas:
+                    apply_gpa_deltas(db.session.connection(), deltas)
+                    expire_gpa_fields(db.session, deltas.keys())
+
+                # Thống kê điểm của khóa học: cùng lý do, cộng delta thủ công
+                stat_changes = []
+                for student_id, (old_final, new_final) in score_changes.items():
+                    stat_changes.append((-1, (student_id, course_id, old_final)))
+                    stat_changes.append((1, (student_id, course_id, new_final)))
+                CourseScoreStats.apply_deltas(db.session.connection(),
+                                              CourseScoreStats.compute_deltas(stat_changes))
+
+            # Score đã nạp vào session không còn khớp với DB
+            for obj in list(db.session.identity_map.values()):
+                if isinstance(obj, cls) and db.inspect(obj).dict.get('course_id') == course_id:
+                    db.session.expire(obj)
+            if rows:
+                DataVersions.touch(db.session, 'scores', f'course:{course_id}',
+                                   *{f"student:{row['student_id']}" for row in rows})
             
-                updated_count += 1
-        
             db.session.commit()
-            return {'success': True, 'updated_count': updated_count}
+            
+            counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'error': 0}
+            for result in results:
+                counts[result['status']] += 1
+            
+            return {
+                'success': True,
+                'updated_count': counts['inserted'] + counts['updated'] + counts['unchanged'],
+                'counts': counts,
+                'results': results
+            }
         
         except Exception as e:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
 
+# ======== GPA ENGINE (CẬP NHẬT THEO DELTA) ========
+# Mỗi sinh viên giữ tổng tích lũy (gpa_weighted_sum, completed_credits).
+# Khi Score được thêm/sửa/xóa, before_flush ghi nhận phần đóng góp cũ/mới của từng điểm,
+# after_flush cộng dồn delta bằng 1 câu UPDATE nguyên tử cho mỗi sinh viên bị ảnh hưởng.
+# Lưu ý: Query.update()/bulk update bỏ qua session events -> gọi rebuild_gpa_aggregates().
+
+_GPA_CHANGES_KEY = '_gpa_changes'
+_GPA_EXPIRE_KEY = '_gpa_expire'
+
+
+def _committed_value(obj, key):
+    """Giá trị của thuộc tính trước khi bị thay đổi trong session hiện tại"""
+    history = db.inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, key)
+
+
+def _score_contribution(final_score, credits):
+    """Phần đóng góp (điểm x tín chỉ, tín chỉ) của 1 điểm vào GPA"""
+    if final_score and credits:
+        return final_score * credits, credits
+    return 0.0, 0
+
+
+def _course_credits(session, course_ids):
+    """Map course_id -> số tín chỉ của môn học, 1 truy vấn cho cả lô"""
+    course_ids = {cid for cid in course_ids if cid is not None}
+    if not course_ids:
+        return {}
+    with session.no_autoflush:
+        rows = session.query(Course.id, Subject.credits).join(
+            Subject, Subject.id == Course.subject_id
+        ).filter(Course.id.in_(course_ids)).all()
+    return {course_id: credits for course_id, credits in rows}
+
+
+def _gpa_changes(session):
+    """[(±1, Score | (student_id, course_id, final_score))] cho các Score đang chờ flush.
+    
+    Phía "mới" giữ nguyên đối tượng Score vì id có thể chỉ có sau khi flush.
+    """
+    changes = []
+    
+    for obj in session.new:
+        if isinstance(obj, Score):
+            changes.append((1, obj))
+    
+    for obj in session.dirty:
+        if isinstance(obj, Score) and session.is_modified(obj, include_collections=False):
+            changes.append((-1, (_committed_value(obj, 'student_id'), _committed_value(obj, 'course_id'),
+                                 _committed_value(obj, 'final_score'))))
+            changes.append((1, obj))
+    
+    for obj in session.deleted:
+        if isinstance(obj, Score):
+            changes.append((-1, (_committed_value(obj, 'student_id'), _committed_value(obj, 'course_id'),
+                                 _committed_value(obj, 'final_score'))))
+    
+    return changes
+
+
+def compute_gpa_deltas(session, changes):
+    """{student_id: [delta_weighted, delta_credits]} từ danh sách thay đổi của _gpa_changes"""
+    resolved = []
+    for sign, ref in changes:
+        if isinstance(ref, Score):
+            ref = (ref.student_id, ref.course_id, ref.final_score)
+        # Bỏ qua các thay đổi không ảnh hưởng GPA (không có điểm tổng)
+        if ref[0] is not None and ref[2]:
+            resolved.append((sign,) + ref)
+    if not resolved:
+        return {}
+    
+    credits_map = _course_credits(session, [r[2] for r in resolved])
+    
+    deltas = {}
+    for sign, student_id, course_id, final_score in resolved:
+        weighted, credits = _score_contribution(final_score, credits_map.get(course_id))
+        if not credits:
+            continue
+        delta = deltas.setdefault(student_id, [0.0, 0])
+        delta[0] += sign * weighted
+        delta[1] += sign * credits
+    
+    return {sid: d for sid, d in deltas.items() if d[1] != 0 or abs(d[0]) > 1e-9}
+
+
+def apply_gpa_deltas(connection, deltas):
+    """Cộng dồn delta vào tổng tích lũy và tính lại GPA - UPDATE nguyên tử, O(1) mỗi sinh viên"""
+    students = Student.__table__
+    weighted = func.coalesce(students.c.gpa_weighted_sum, 0.0)
+    credits = func.coalesce(students.c.completed_credits, 0)
+    
+    for student_id, (delta_weighted, delta_credits) in deltas.items():
+        new_weighted = weighted + delta_weighted
+        new_credits = credits + delta_credits
+        # gpa đặt TRƯỚC: MySQL đánh giá SET từ trái sang phải trên giá trị đã cập nhật
+        stmt = students.update().where(students.c.id == student_id).ordered_values(
+            (students.c.gpa, case(
+                (new_credits > 0, func.round(new_weighted / new_credits, 2)),
+                else_=0.0
+            )),
+            (students.c.gpa_weighted_sum, new_weighted),
+            (students.c.completed_credits, new_credits),
+        )
+        connection.execute(stmt)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _gpa_before_flush(session, flush_context, instances):
+    changes = _gpa_changes(session)
+    if changes:
+        session.info.setdefault(_GPA_CHANGES_KEY, []).extend(changes)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _gpa_after_flush(session, flush_context):
+    changes = session.info.pop(_GPA_CHANGES_KEY, None)
+    if not changes:
+        return
+    deltas = compute_gpa_deltas(session, changes)
+    if deltas:
+        apply_gpa_deltas(session.connection(), deltas)
+        session.info.setdefault(_GPA_EXPIRE_KEY, set()).update(deltas.keys())
+
+
+def expire_gpa_fields(session, student_ids):
+    """Đánh dấu hết hạn GPA của các Student đang nằm trong session để lần đọc sau lấy giá trị mới"""
+    for student_id in student_ids:
+        student = session.identity_map.get(session.identity_key(Student, student_id))
+        if student is not None:
+            session.expire(student, ['gpa', 'gpa_weighted_sum', 'completed_credits'])
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _gpa_after_flush_postexec(session, flush_context):
+    expire_gpa_fields(session, session.info.pop(_GPA_EXPIRE_KEY, ()))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _gpa_after_rollback(session):
+    session.info.pop(_GPA_CHANGES_KEY, None)
+    session.info.pop(_GPA_EXPIRE_KEY, None)
+
+
+def gpa_aggregate_subquery():
+    """Subquery (student_id, weighted_sum, credit_sum) tính từ bảng điểm - nguồn chuẩn của GPA"""
+    return db.session.query(
+        Score.student_id.label('student_id'),
+        func.sum(Score.final_score * Subject.credits).label('weighted_sum'),
+        func.sum(Subject.credits).label('credit_sum')
+    ).join(
+        Course, Course.id == Score.course_id
+    ).join(
+        Subject, Subject.id == Course.subject_id
+    ).filter(
+        Score.final_score.isnot(None),
+        Score.final_score != 0
+    ).group_by(Score.student_id).subquery()
+
+
+def rebuild_gpa_aggregates():
+    """Tính lại tổng tích lũy và GPA cho TẤT CẢ sinh viên bằng 1 truy vấn GROUP BY.
+    
+    Dùng để khôi phục khi dữ liệu điểm bị sửa ngoài ORM. Trả về số sinh viên thay đổi.
+    Không commit - hàm gọi tự commit.
+    """
+    students = Student.__table__
+    aggregates = gpa_aggregate_subquery()
+    
+    # 1. Sinh viên có điểm: UPDATE ... FROM (SELECT ... GROUP BY), chỉ ghi dòng khác biệt
+    with_scores = students.update().where(
+        students.c.id == aggregates.c.student_id
+    ).where(or_(
+        students.c.gpa.is_(None),
+        students.c.gpa_weighted_sum.is_(None),
+        students.c.completed_credits.is_(None),
+        func.abs(students.c.gpa_weighted_sum - aggregates.c.weighted_sum) > 1e-6,
+        students.c.completed_credits != aggregates.c.credit_sum
+    )).values(
+        gpa=func.round(aggregates.c.weighted_sum / aggregates.c.credit_sum, 2),
+        gpa_weighted_sum=aggregates.c.weighted_sum,
+        completed_credits=aggregates.c.credit_sum
+    )
+    
+    # 2. Sinh viên không còn điểm nào: đưa về 0
+    without_scores = students.update().where(
+        students.c.id.notin_(db.select(aggregates.c.student_id))
+    ).where(or_(
+        func.coalesce(students.c.gpa, -1) != 0,
+        func.coalesce(students.c.gpa_weighted_sum, -1) != 0,
+        func.coalesce(students.c.completed_credits, -1) != 0
+    )).values(gpa=0.0, gpa_weighted_sum=0.0, completed_credits=0)
+    
+    changed = db.session.execute(with_scores).rowcount + db.session.execute(without_scores).rowcount
+    db.session.expire_all()
+    logger.info(f"GPA aggregates rebuilt: {changed} students changed")
+    return changed
+
+# ======== BỘ ĐẾM PHI CHUẨN HÓA (CẬP NHẬT THEO SESSION EVENTS) ========
+# Course.total_registrations_count / approved_registrations_count / current_students
+# Class.current_students và User.unread_notifications_count được cộng trừ nguyên tử
+# (counter = counter ± n) khi flush, thay vì đếm lại bằng truy vấn tổng hợp mỗi lần đọc.
+# Kiểm tra lệch với dữ liệu thật: SystemSync.verify_counters() / `flask verify-counters`.
+
+_COUNTER_CHANGES_KEY = '_counter_changes'
+_COUNTER_EXPIRE_KEY = '_counter_expire'
+# {user_id: [delta, số chưa đọc sau flush]} chờ commit để đẩy qua Socket.IO
+UNREAD_PUSH_KEY = '_unread_push'
+
+
+def _registration_status(status):
+    """Trạng thái thực sự được ghi xuống DB (None -> giá trị mặc định của cột)"""
+    return status if status is not None else CourseRegistration.__table__.c.status.default.arg
+
+
+def _registration_changes(session):
+    """[(course_id | CourseRegistration, status, ±1)] cho các CourseRegistration đang chờ flush.
+    
+    Phía "mới" giữ nguyên đối tượng vì course_id có thể chỉ có sau khi flush.
+    """
+    changes = []
+    
+    for obj in session.new:
+        if isinstance(obj, CourseRegistration):
+            changes.append((obj, _registration_status(obj.status), 1))
+    
+    for obj in session.dirty:
+        if isinstance(obj, CourseRegistration) and session.is_modified(obj, include_collections=False):
+            old = (_committed_value(obj, 'course_id'), _committed_value(obj, 'status'))
+            if old != (obj.course_id, obj.status):
+                changes.append((old[0], old[1], -1))
+                changes.append((obj, obj.status, 1))
+    
+    for obj in session.deleted:
+        if isinstance(obj, CourseRegistration):
+            changes.append((_committed_value(obj, 'course_id'), _committed_value(obj, 'status'), -1))
+    
+    return changes
+
+
+def _notification_changes(session):
+    """[(user_id | Notification, ±1)] cho các thông báo CHƯA ĐỌC được thêm/bớt trong flush.
+    
+    is_read = None được ghi xuống là giá trị mặc định (False) -> tính là chưa đọc.
+    """
+    changes = []
+    
+    for obj in session.new:
+        if isinstance(obj, Notification) and not obj.is_read:
+            changes.append((obj, 1))
+    
+    for obj in session.dirty:
+        if isinstance(obj, Notification) and session.is_modified(obj, include_collections=False):
+            old = (_committed_value(obj, 'user_id'), not _committed_value(obj, 'is_read'))
+            if old != (obj.user_id, not obj.is_read):
+                if old[1]:
+                    changes.append((old[0], -1))
+                if not obj.is_read:
+                    changes.append((obj, 1))
+    
+    for obj in session.deleted:
+        if isinstance(obj, Notification) and not _committed_value(obj, 'is_read'):
+            changes.append((_committed_value(obj, 'user_id'), -1))
+    
+    return changes
+
+
+def record_unread_push(session, counts, deltas):
+    """Ghi nhận số chưa đọc mới để đẩy qua Socket.IO sau khi commit.
+    
+    counts: {user_id: số chưa đọc hiện tại}, deltas: {user_id: thay đổi trong lần ghi này}
+    """
+    pending = session.info.setdefault(UNREAD_PUSH_KEY, {})
+    for user_id, count in counts.items():
+        entry = pending.setdefault(user_id, [0, count])
+        entry[0] += deltas.get(user_id, 0)
+        entry[1] = count
+
+
+def _membership_changes(session):
+    """{(student, class_): ±1} cho các thay đổi bảng student_class đang chờ flush.
+    
+    Quan hệ nhiều-nhiều có thể được sửa từ cả 2 phía (student.classes / class_.class_students),
+    chỉ phía đã load mới có history -> gom theo cặp đối tượng để không đếm trùng.
+    """
+    changes = {}
+    
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Student):
+            history = db.inspect(obj).attrs.classes.history
+            for class_obj in history.added or ():
+                changes[(obj, class_obj)] = 1
+            for class_obj in history.deleted or ():
+                changes[(obj, class_obj)] = -1
+        elif isinstance(obj, Class):
+            history = db.inspect(obj).attrs.class_students.history
+            for student in history.added or ():
+                changes[(student, obj)] = 1
+            for student in history.deleted or ():
+                changes[(student, obj)] = -1
+    
+    for obj in session.deleted:
+        if isinstance(obj, Student):
+            # Xóa sinh viên -> các dòng student_class của sinh viên cũng bị xóa
+            history = db.inspect(obj).attrs.classes.history
+            class_list = list(history.unchanged or ()) + list(history.deleted or ())
+            for class_obj in class_list or obj.classes:
+                changes[(obj, class_obj)] = -1
+    
+    # Lớp bị xóa thì không cần cập nhật sĩ số
+    return {pair: sign for pair, sign in changes.items() if pair[1] not in session.deleted}
+
+
+@event.listens_for(db.session, 'before_flush')
+def _counters_before_flush(session, flush_context, instances):
+    registrations = _registration_changes(session)
+    memberships = _membership_changes(session)
+    notifications = _notification_changes(session)
+    if registrations or memberships or notifications:
+        pending = session.info.setdefault(_COUNTER_CHANGES_KEY,
+                                          {'registrations': [], 'memberships': {}, 'notifications': []})
+        pending['registrations'].extend(registrations)
+        pending['memberships'].update(memberships)
+        pending['notifications'].extend(notifications)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _counters_after_flush(session, flush_context):
+    pending = session.info.pop(_COUNTER_CHANGES_KEY, None)
+    if not pending:
+        return
+    
+    # {(Model, id): {cột: delta}} - id của đối tượng mới chỉ có sau khi flush
+    deltas = {}
+    
+    def add(model, pk, column, delta):
+        if pk is None or not delta:
+            return
+        row = deltas.setdefault((model, pk), {})
+        row[column] = row.get(column, 0) + delta
+    
+    for course_ref, status, sign in pending['registrations']:
+        course_id = course_ref.course_id if isinstance(course_ref, CourseRegistration) else course_ref
+        add(Course, course_id, 'total_registrations_count', sign)
+        if status == 'approved':
+            add(Course, course_id, 'approved_registrations_count', sign)
+            add(Course, course_id, 'current_students', sign)
+    
+    for (student, class_obj), sign in pending['memberships'].items():
+        add(Class, class_obj.id, 'current_students', sign)
+    
+    for user_ref, sign in pending['notifications']:
+        user_id = user_ref.user_id if isinstance(user_ref, Notification) else user_ref
+        add(User, user_id, 'unread_notifications_count', sign)
+    
+    connection = session.connection()
+    for (model, pk), columns in deltas.items():
+        columns = {name: delta for name, delta in columns.items() if delta}
+        if not columns:
+            continue
+        table = model.__table__
+        connection.execute(table.update().where(table.c.id == pk).values({
+            name: func.coalesce(table.c[name], 0) + delta for name, delta in columns.items()
+        }))
+        session.info.setdefault(_COUNTER_EXPIRE_KEY, {})[(model, pk)] = list(columns)
+    
+    # Số chưa đọc sau flush (đọc trong cùng transaction) để đẩy qua Socket.IO khi commit
+    unread_deltas = {pk: columns['unread_notifications_count'] for (model, pk), columns in deltas.items()
+                     if model is User and columns.get('unread_notifications_count')}
+    if unread_deltas:
+        record_unread_push(session, Notification.unread_counts(unread_deltas, connection), unread_deltas)
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _counters_after_flush_postexec(session, flush_context):
+    for (model, pk), columns in session.info.pop(_COUNTER_EXPIRE_KEY, {}).items():
+        obj = session.identity_map.get(session.identity_key(model, pk))
+        if obj is not None:
+            session.expire(obj, columns)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _counters_after_rollback(session):
+    session.info.pop(_COUNTER_CHANGES_KEY, None)
+    session.info.pop(_COUNTER_EXPIRE_KEY, None)
+    session.info.pop(UNREAD_PUSH_KEY, None)
+
+# ======== THỐNG KÊ ĐIỂM THEO KHÓA HỌC (CẬP NHẬT THEO DELTA) ========
+# Mỗi khóa học giữ 1 dòng tổng hợp (số điểm, tổng, tổng bình phương, số đỗ, phân bố xếp loại)
+# -> điểm TB / tỷ lệ đỗ / độ lệch chuẩn đọc O(1) thay vì nạp mọi Score của khóa học.
+# Cập nhật cùng cách với GPA ENGINE: before_flush ghi nhận điểm cũ/mới, after_flush cộng delta.
+# Điểm ghi ngoài ORM: gọi CourseScoreStats.rebuild() / `flask rebuild-course-stats`.
+
+_SCORE_STATS_CHANGES_KEY = '_score_stats_changes'
+_SCORE_STATS_EXPIRE_KEY = '_score_stats_expire'
+
+
+class CourseScoreStats(db.Model):
+    __tablename__ = 'course_score_stats'
+
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    score_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0.0)
+    score_sq_sum = db.Column(db.Float, nullable=False, default=0.0)
+    pass_count = db.Column(db.Integer, nullable=False, default=0)
+    grade_a = db.Column(db.Integer, nullable=False, default=0)
+    grade_b_plus = db.Column(db.Integer, nullable=False, default=0)
+    grade_b = db.Column(db.Integer, nullable=False, default=0)
+    grade_c_plus = db.Column(db.Integer, nullable=False, default=0)
+    grade_c = db.Column(db.Integer, nullable=False, default=0)
+    grade_d_plus = db.Column(db.Integer, nullable=False, default=0)
+    grade_d = db.Column(db.Integer, nullable=False, default=0)
+    grade_f = db.Column(db.Integer, nullable=False, default=0)
+
+    PASS_SCORE = 5.0
+    # Xếp loại -> cột phân bố, cùng thứ tự với Score.GRADE_LABELS
+    GRADE_COLUMNS = {
+        'F': 'grade_f', 'D': 'grade_d', 'D+': 'grade_d_plus', 'C': 'grade_c',
+        'C+': 'grade_c_plus', 'B': 'grade_b', 'B+': 'grade_b_plus', 'A': 'grade_a'
+    }
+    SUM_COLUMNS = ('score_count', 'score_sum', 'score_sq_sum', 'pass_count') + tuple(GRADE_COLUMNS.values())
+
+    @staticmethod
+    def grade_of(final_score):
+        """Xếp loại theo điểm tổng - cùng ngưỡng với Score._calculate_grade"""
+        import bisect
+        return Score.GRADE_LABELS[bisect.bisect_right(Score.GRADE_THRESHOLDS, final_score)]
+
+    @classmethod
+    def contribution(cls, final_score):
+        """Phần đóng góp của 1 điểm vào dòng thống kê ({} nếu chưa có điểm tổng)"""
+        if final_score is None:
+            return {}
+        return {
+            'score_count': 1,
+            'score_sum': final_score,
+            'score_sq_sum': final_score * final_score,
+            'pass_count': 1 if final_score >= cls.PASS_SCORE else 0,
+            cls.GRADE_COLUMNS[cls.grade_of(final_score)]: 1
+        }
+
+    @classmethod
+    def compute_deltas(cls, changes):
+        """{course_id: {cột: delta}} từ danh sách thay đổi dạng _gpa_changes"""
+        deltas = {}
+        for sign, ref in changes:
+            if isinstance(ref, Score):
+                ref = (ref.student_id, ref.course_id, ref.final_score)
+            course_id, final_score = ref[1], ref[2]
+            if course_id is None:
+                continue
+            row = deltas.setdefault(course_id, {})
+            for column, value in cls.contribution(final_score).items():
+                row[column] = row.get(column, 0) + sign * value
+
+        result = {}
+        for course_id, row in deltas.items():
+            row = {column: value for column, value in row.items() if abs(value) > 1e-9}
+            if row:
+                result[course_id] = row
+        return result
+
+    @classmethod
+    def apply_deltas(cls, connection, deltas):
+        """Cộng delta nguyên tử bằng 1 câu upsert (course_id là khóa): khóa học chưa có dòng thống kê
+        thì dòng chèn vào chính là delta, đã có thì cột = cột + delta.
+        
+        Không dùng UPDATE rồi INSERT khi rowcount = 0: 2 transaction cùng lưu điểm đầu tiên của 1
+        khóa học sẽ cùng INSERT -> IntegrityError (MySQL: deadlock do gap lock).
+        """
+        table = cls.__table__
+        columns = sorted({column for row in deltas.values() for column in row})
+        # Thứ tự khóa cố định giữa các transaction -> không khóa chéo nhau
+        rows = [
+            dict({column: 0 for column in cls.SUM_COLUMNS},
+                 **{column: row.get(column, 0) for column in columns}, course_id=course_id)
+            for course_id, row in sorted(deltas.items())
+        ]
+        stmt = upsert_statement(
+            connection.dialect.name, table, rows, ['course_id'],
+            lambda new: {column: table.c[column] + new[column] for column in columns}
+        )
+        if stmt is not None:
+            connection.execute(stmt)
+            return
+        
+        # Dialect không có upsert: UPDATE, khóa học chưa có dòng thì INSERT
+        for row in rows:
+            updated = connection.execute(table.update().where(table.c.course_id == row['course_id']).values({
+                column: table.c[column] + row[column] for column in columns
+            })).rowcount
+            if not updated:
+                connection.execute(table.insert().values(row))
+
+    @classmethod
+    def _summarize(cls, row):
+        """Dòng thống kê (hoặc None) -> dict hiển thị"""
+        count = row.score_count if row is not None else 0
+        if not count:
+            return {'count': 0, 'avg_score': 0.0, 'pass_rate': 0.0, 'std_dev': 0.0,
+                    'histogram': {label: 0 for label in cls.GRADE_COLUMNS}}
+        mean = row.score_sum / count
+        variance = max(row.score_sq_sum / count - mean * mean, 0.0)
+        return {
+            'count': count,
+            'avg_score': round(mean, 2),
+            'pass_rate': round(row.pass_count / count * 100, 1),
+            'std_dev': round(variance ** 0.5, 2),
+            'histogram': {label: getattr(row, column) for label, column in cls.GRADE_COLUMNS.items()}
+        }
+
+    @classmethod
+    def summaries(cls, course_ids):
+        """{course_id: thống kê} cho nhiều khóa học trong 1 truy vấn (khóa học chưa có điểm -> 0)"""
+        course_ids = {cid for cid in course_ids if cid is not None}
+        if not course_ids:
+            return {}
+        table = cls.__table__
+        rows = {
+            row.course_id: row
+            for row in db.session.execute(db.select(table).where(table.c.course_id.in_(course_ids)))
+        }
+        return {course_id: cls._summarize(rows.get(course_id)) for course_id in course_ids}
+
+    @classmethod
+    def summary(cls, course_id):
+        """Thống kê điểm của 1 khóa học"""
+        return cls.summaries([course_id]).get(course_id) or cls._summarize(None)
+
+    @classmethod
+    def aggregate_select(cls):
+        """SELECT course_id, <các cột tổng> FROM scores GROUP BY course_id - nguồn chuẩn của thống kê"""
+        final = Score.final_score
+        columns = [
+            func.count(final).label('score_count'),
+            func.coalesce(func.sum(final), 0.0).label('score_sum'),
+            func.coalesce(func.sum(final * final), 0.0).label('score_sq_sum'),
+            func.count(case((final >= cls.PASS_SCORE, 1))).label('pass_count'),
+        ]
+        thresholds = Score.GRADE_THRESHOLDS
+        for index, label in enumerate(Score.GRADE_LABELS):
+            conditions = []
+            if index > 0:
+                conditions.append(final >= thresholds[index - 1])
+            if index < len(thresholds):
+                conditions.append(final < thresholds[index])
+            columns.append(func.count(case((db.and_(*conditions), 1))).label(cls.GRADE_COLUMNS[label]))
+        return db.select(Score.course_id.label('course_id'), *columns).where(
+            final.isnot(None)
+        ).group_by(Score.course_id)
+
+    @classmethod
+    def rebuild(cls):
+        """Tính lại thống kê của TẤT CẢ khóa học bằng 1 truy vấn GROUP BY.
+
+        Không commit - hàm gọi tự commit. Trả về số khóa học có điểm.
+        """
+        table = cls.__table__
+        db.session.execute(table.delete())
+        rebuilt = db.session.execute(table.insert().from_select(
+            ['course_id'] + list(cls.SUM_COLUMNS), cls.aggregate_select()
+        )).rowcount
+        db.session.expire_all()
+        logger.info(f"Course score stats rebuilt: {rebuilt} courses")
+        return rebuilt
+
+
+@event.listens_for(db.session, 'before_flush')
+def _score_stats_before_flush(session, flush_context, instances):
+    changes = _gpa_changes(session)
+    if changes:
+        session.info.setdefault(_SCORE_STATS_CHANGES_KEY, []).extend(changes)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _score_stats_after_flush(session, flush_context):
+    changes = session.info.pop(_SCORE_STATS_CHANGES_KEY, None)
+    if not changes:
+        return
+    deltas = CourseScoreStats.compute_deltas(changes)
+    if deltas:
+        CourseScoreStats.apply_deltas(session.connection(), deltas)
+        session.info.setdefault(_SCORE_STATS_EXPIRE_KEY, set()).update(deltas.keys())
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _score_stats_after_flush_postexec(session, flush_context):
+    for course_id in session.info.pop(_SCORE_STATS_EXPIRE_KEY, ()):
+        obj = session.identity_map.get(session.identity_key(CourseScoreStats, course_id))
+        if obj is not None:
+            session.expire(obj)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _score_stats_after_rollback(session):
+    session.info.pop(_SCORE_STATS_CHANGES_KEY, None)
+    session.info.pop(_SCORE_STATS_EXPIRE_KEY, None)
+
+# ======== XUNG ĐỘT LỊCH HỌC (BITMASK) ========
+# Lịch của mỗi khóa học là bitmask 72 bit (Course.slot_mask). Lịch đã đăng ký của sinh viên
+# trong 1 học kỳ là OR của các mask -> kiểm tra 1 khóa học mới chỉ cần 1 phép AND.
+
+class ScheduleConflictEngine:
+    """Kiểm tra trùng lịch học bằng phép toán bit"""
+    
+    ACTIVE_STATUSES = ('pending', 'approved')
+    
+    @staticmethod
+    def _course_mask(mask_hex, schedule):
+        if mask_hex is None:
+            return schedule_mask_utils.parse_schedule(schedule)
+        return schedule_mask_utils.mask_from_hex(mask_hex)
+    
+    @staticmethod
+    def _union(entries):
+        """OR các mask của danh sách (course_id, course_code, schedule, mask)"""
+        occupied = 0
+        for entry in entries:
+            occupied |= entry[3]
+        return occupied
+    
+    @staticmethod
+    def registered_schedules(student_ids, exclude_course_ids=()):
+        """{student_id: {(semester, year): [(course_id, course_code, schedule, mask)]}} - 1 truy vấn"""
+        query = db.session.query(
+            CourseRegistration.student_id, Course.id, Course.course_code,
+            Course.semester, Course.year, Course.schedule, Course.schedule_mask
+        ).join(
+            Course, Course.id == CourseRegistration.course_id
+        ).filter(
+            CourseRegistration.student_id.in_(list(student_ids)),
+            CourseRegistration.status.in_(ScheduleConflictEngine.ACTIVE_STATUSES)
+        )
+        if exclude_course_ids:
+            query = query.filter(Course.id.notin_(list(exclude_course_ids)))
+        
+        schedules = {}
+        for student_id, course_id, code, semester, year, schedule, mask_hex in query:
+            mask = ScheduleConflictEngine._course_mask(mask_hex, schedule)
+            if mask:
+                schedules.setdefault(student_id, {}).setdefault((semester, year), []).append(
+                    (course_id, code, schedule, mask)
+                )
+        return schedules
+    
+    @staticmethod
+    def occupied_masks(student_ids, exclude_course_ids=()):
+        """{student_id: {(semester, year): OR các mask đã đăng ký}}"""
+        return {
+            student_id: {
+                term: ScheduleConflictEngine._union(entries) for term, entries in terms.items()
+            }
+            for student_id, terms in ScheduleConflictEngine.registered_schedules(
+                student_ids, exclude_course_ids
+            ).items()
+        }
+    
+    @staticmethod
+    def check_student(student_id, course_ids):
+        """Trùng lịch giữa các khóa học muốn đăng ký và lịch đã đăng ký (kể cả giữa các khóa muốn đăng ký).
+        
+        Trả về list {'course1', 'course2', 'schedule1', 'schedule2'}.
+        """
+        targets = Course.query.filter(Course.id.in_(list(course_ids))).all()
+        registered = ScheduleConflictEngine.registered_schedules(
+            [student_id], exclude_course_ids=[course.id for course in targets]
+        ).get(student_id, {})
+        
+        occupied = {
+            term: ScheduleConflictEngine._union(entries) for term, entries in registered.items()
+        }
+        
+        conflicts = []
+        for target in targets:
+            term = (target.semester, target.year)
+            mask = target.slot_mask
+            # 1 phép AND; chỉ khi trùng mới duyệt danh sách để báo khóa học nào gây trùng
+            if mask & occupied.get(term, 0):
+                for course_id, code, schedule, other_mask in registered[term]:
+                    if mask & other_mask:
+                        conflicts.append({
+                            'course1': target.course_code,
+                            'course2': code,
+                            'schedule1': target.schedule,
+                            'schedule2': schedule
+                        })
+            occupied[term] = occupied.get(term, 0) | mask
+            registered.setdefault(term, []).append((target.id, target.course_code, target.schedule, mask))
+        
+        return conflicts
+    
+    @staticmethod
+    def check_students(student_ids, mask, semester, year, exclude_course_id=None):
+        """{student_id: [mã khóa học bị trùng]} của các sinh viên không thể học thêm lịch `mask` trong học kỳ"""
+        if not mask or not student_ids:
+            return {}
+        
+        term = (semester, year)
+        exclude = [exclude_course_id] if exclude_course_id else []
+        conflicts = {}
+        for student_id, terms in ScheduleConflictEngine.registered_schedules(student_ids, exclude).items():
+            entries = terms.get(term, [])
+            if mask & ScheduleConflictEngine._union(entries):
+                conflicts[student_id] = [code for _, code, _, other_mask in entries if mask & other_mask]
+        return conflicts
+    
+    @staticmethod
+    def conflict_matrix(semester, year):
+        """Ma trận trùng lịch course x course của 1 học kỳ (NumPy).
+        
+        overlap[i][j] = số tiết trùng giữa khóa i và khóa j (đường chéo = 0).
+        """
+        import numpy as np
+        
+        rows = db.session.query(
+            Course.id, Course.course_code, Course.schedule, Course.schedule_mask
+        ).filter(
+            Course.semester == semester,
+            Course.year == year,
+            Course.status != 'cancelled'
+        ).order_by(Course.id).all()
+        
+        course_ids = [row[0] for row in rows]
+        course_codes = [row[1] for row in rows]
+        if not rows:
+            return {'course_ids': [], 'course_codes': [], 'overlap': np.zeros((0, 0), dtype=np.int32)}
+        
+        # Mỗi mask 72 bit -> 9 byte -> 72 cột 0/1
+        n_bytes = schedule_mask_utils.TOTAL_SLOTS // 8
+        raw = b''.join(
+            ScheduleConflictEngine._course_mask(mask_hex, schedule).to_bytes(n_bytes, 'little')
+            for _, _, schedule, mask_hex in rows
+        )
+        slots = np.unpackbits(
+            np.frombuffer(raw, dtype=np.uint8).reshape(len(rows), n_bytes), axis=1, bitorder='little'
+        ).astype(np.int32)
+        
+        overlap = slots @ slots.T
+        np.fill_diagonal(overlap, 0)
+        return {'course_ids': course_ids, 'course_codes': course_codes, 'overlap': overlap}
+    
+    @staticmethod
+    def conflict_pairs(semester, year):
+        """Danh sách cặp khóa học trùng lịch trong học kỳ (dạng JSON được)"""
+        import numpy as np
+        
+        matrix = ScheduleConflictEngine.conflict_matrix(semester, year)
+        overlap = matrix['overlap']
+        course_ids, course_codes = matrix['course_ids'], matrix['course_codes']
+        
+        pairs = []
+        for i, j in zip(*np.nonzero(np.triu(overlap))):
+            pairs.append({
+                'course1_id': course_ids[i], 'course1': course_codes[i],
+                'course2_id': course_ids[j], 'course2': course_codes[j],
+                'overlap_periods': int(overlap[i, j])
+            })
+        return {
+            'course_ids': course_ids,
+            'course_codes': course_codes,
+            'matrix': (overlap > 0).astype(int).tolist(),
+            'pairs': pairs
+        }
+
+# ======== ĐỒ THỊ MÔN TIÊN QUYẾT (DAG + BITSET) ========
+# Subject.prerequisites (JSON) được parse 1 lần thành đồ thị trong bộ nhớ: mỗi môn là 1 bit,
+# điều kiện tiên quyết / bao đóng bắc cầu / môn đã hoàn thành của sinh viên đều là bitset (int).
+# Đồ thị được dựng lại lười sau khi có commit thay đổi Subject (xem _prereq_* listeners),
+# hoặc khi quá MAX_AGE giây (an toàn khi Subject bị sửa từ process khác).
+
+class PrerequisiteGraph:
+    """Đồ thị môn tiên quyết dựng sẵn trong bộ nhớ"""
+    
+    MAX_AGE = 300
+    PASS_SCORE = 5.0
+    
+    _instance = None
+    _lock = threading.Lock()
+    
+    def __init__(self, rows):
+        import json
+        import time
+        
+        self.built_at = time.monotonic()
+        self.subject_ids = [row[0] for row in rows]
+        self.names = {row[0]: row[1] for row in rows}
+        self.bit_of = {subject_id: index for index, subject_id in enumerate(self.subject_ids)}
+        
+        # direct[i]: bitset các môn tiên quyết trực tiếp của môn thứ i
+        self.direct = [0] * len(rows)
+        for index, (subject_id, _, prerequisites) in enumerate(rows):
+            if not prerequisites:
+                continue
+            try:
+                prereq_ids = json.loads(prerequisites)
+            except (TypeError, ValueError):
+                logger.warning(f"Subject {subject_id}: prerequisites không phải JSON hợp lệ")
+                continue
+            for prereq_id in prereq_ids or []:
+                bit = self.bit_of.get(self._as_id(prereq_id))
+                if bit is not None and bit != index:
+                    self.direct[index] |= 1 << bit
+        
+        self.cycles = self._find_cycles()
+        self.closure = self._transitive_closure()
+    
+    @staticmethod
+    def _as_id(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def _bits(mask):
+        """Duyệt vị trí các bit đang bật"""
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+    
+    def _find_cycles(self):
+        """Phát hiện chu trình (DFS 3 màu, không đệ quy). Trả về list chu trình dạng list subject_id."""
+        WHITE, GRAY, BLACK = 0, 1, 2
+        color = [WHITE] * len(self.direct)
+        cycles = []
+        
+        for root in range(len(self.direct)):
+            if color[root] != WHITE:
+                continue
+            color[root] = GRAY
+            path = [root]
+            stack = [iter(self._bits(self.direct[root]))]
+            while stack:
+                child = next(stack[-1], None)
+                if child is None:
+                    color[path.pop()] = BLACK
+                    stack.pop()
+                elif color[child] == GRAY:
+                    cycle = path[path.index(child):]
+                    cycles.append([self.subject_ids[i] for i in cycle])
+                elif color[child] == WHITE:
+                    color[child] = GRAY
+                    path.append(child)
+                    stack.append(iter(self._bits(self.direct[child])))
+        
+        if cycles:
+            logger.warning(f"Phát hiện {len(cycles)} chu trình môn tiên quyết: {cycles}")
+        return cycles
+    
+    def _transitive_closure(self):
+        """closure[i]: bitset mọi môn tiên quyết (trực tiếp và gián tiếp) của môn i.
+        
+        Lặp tới điểm bất động - đúng cả khi dữ liệu có chu trình.
+        """
+        closure = list(self.direct)
+        changed = True
+        while changed:
+            changed = False
+            for index, mask in enumerate(closure):
+                expanded = mask
+                for bit in self._bits(mask):
+                    expanded |= closure[bit]
+                if expanded != mask:
+                    closure[index] = expanded
+                    changed = True
+        return closure
+    
+    # ---------- Truy cập dùng chung ----------
+    
+    @classmethod
+    def get(cls):
+        """Đồ thị hiện tại, dựng lại nếu đã bị invalidate hoặc quá hạn"""
+        import time
+        
+        graph = cls._instance
+        if graph is None or time.monotonic() - graph.built_at > cls.MAX_AGE:
+            with cls._lock:
+                graph = cls._instance
+                if graph is None or time.monotonic() - graph.built_at > cls.MAX_AGE:
+                    rows = db.session.query(Subject.id, Subject.subject_name, Subject.prerequisites).all()
+                    graph = cls._instance = cls(rows)
+        return graph
+    
+    @classmethod
+    def invalidate(cls):
+        cls._instance = None
+    
+    # ---------- Bitset ----------
+    
+    def mask_of(self, subject_ids):
+        mask = 0
+        for subject_id in subject_ids:
+            bit = self.bit_of.get(subject_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+    
+    def subjects_of(self, mask):
+        return [self.subject_ids[bit] for bit in self._bits(mask)]
+    
+    def prerequisites_of(self, subject_id, transitive=False):
+        """subject_id các môn tiên quyết (trực tiếp hoặc toàn bộ chuỗi)"""
+        bit = self.bit_of.get(subject_id)
+        if bit is None:
+            return []
+        return self.subjects_of(self.closure[bit] if transitive else self.direct[bit])
+    
+    def completed_masks(self, student_ids):
+        """{student_id: bitset môn đã qua (điểm tổng >= PASS_SCORE, đã công bố)} - 1 truy vấn"""
+        rows = db.session.query(Score.student_id, Course.subject_id).join(
+            Course, Course.id == Score.course_id
+        ).filter(
+            Score.student_id.in_(list(student_ids)),
+            Score.status == 'published',
+            Score.final_score.isnot(None),
+            Score.final_score >= self.PASS_SCORE
+        ).distinct()
+        
+        masks = {student_id: 0 for student_id in student_ids}
+        for student_id, subject_id in rows:
+            bit = self.bit_of.get(subject_id)
+            if bit is not None:
+                masks[student_id] |= 1 << bit
+        return masks
+    
+    def missing_for_subjects(self, subject_ids, completed_mask):
+        """{subject_id: [subject_id tiên quyết còn thiếu]} - mỗi môn 1 phép AND NOT"""
+        missing = {}
+        for subject_id in subject_ids:
+            bit = self.bit_of.get(subject_id)
+            if bit is None:
+                continue
+            lacking = self.direct[bit] & ~completed_mask
+            if lacking:
+                missing[subject_id] = self.subjects_of(lacking)
+        return missing
+    
+    def cart_details(self, student_id, course_ids):
+        """Tiên quyết còn thiếu của từng khóa học trong giỏ đăng ký (2 truy vấn + phép toán bit).
+        
+        Trả về {course_id: {'missing': [tên môn tiên quyết trực tiếp chưa qua],
+                            'chain': [tên mọi môn trong chuỗi tiên quyết (closure) chưa qua]}}.
+        Điều kiện đăng ký chỉ xét 'missing'; 'chain' cho biết toàn bộ lộ trình còn phải học.
+        """
+        course_subjects = dict(db.session.query(Course.id, Course.subject_id).filter(
+            Course.id.in_(list(course_ids))
+        ).all())
+        completed = self.completed_masks([student_id])[student_id]
+        
+        details = {}
+        for course_id, subject_id in course_subjects.items():
+            bit = self.bit_of.get(subject_id)
+            direct = self.direct[bit] & ~completed if bit is not None else 0
+            chain = self.closure[bit] & ~completed if bit is not None else 0
+            details[course_id] = {
+                'missing': [self.names[prereq_id] for prereq_id in self.subjects_of(direct)],
+                'chain': [self.names[prereq_id] for prereq_id in self.subjects_of(chain)]
+            }
+        return details
+    
+    def check_cart(self, student_id, course_ids):
+        """Kiểm tra tiên quyết cho cả giỏ đăng ký.
+        
+        Trả về {course_id: [tên môn tiên quyết còn thiếu]} (chỉ các khóa học chưa đủ điều kiện).
+        """
+        return {
+            course_id: detail['missing']
+            for course_id, detail in self.cart_details(student_id, course_ids).items()
+            if detail['missing']
+        }
+
+
+@event.listens_for(db.session, 'after_flush')
+def _prereq_after_flush(session, flush_context):
+    if any(isinstance(obj, Subject) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['_prereq_dirty'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _prereq_after_commit(session):
+    if session.info.pop('_prereq_dirty', False):
+        PrerequisiteGraph.invalidate()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _prereq_after_rollback(session):
+    session.info.pop('_prereq_dirty', None)
+
+
+# ======== DỮ LIỆU THAM CHIẾU (CACHE) ========
+# Danh mục môn học / giáo viên / lớp / khoa được đọc trên hầu hết trang admin và giáo viên
+# nhưng hiếm khi đổi -> lưu trong cache dạng dict thuần (không giữ ORM object qua request).
+# Cache bị xóa theo họ khóa khi commit có thay đổi bảng liên quan.
+
+class ReferenceData:
+    """Các truy vấn danh mục đi qua cache (utils.cache)"""
+
+    # Bảng thay đổi -> các họ khóa cần xóa
+    INVALIDATES = {
+        'subjects': ('subjects', 'departments'),
+        'teachers': ('teachers', 'subjects', 'departments'),
+        'users': ('teachers',),
+        'classes': ('classes',),
+        'students': ('classes',),
+    }
+    # Với các bảng này chỉ tính là thay đổi khi các thuộc tính liệt kê thay đổi
+    # (vd: users.last_login đổi mỗi lần đăng nhập không được làm mất cache giáo viên)
+    WATCHED_ATTRIBUTES = {
+        'users': ('full_name', 'email', 'avatar'),
+        'students': ('classes',),
+    }
+
+    @staticmethod
+    def subjects():
+        """Tất cả môn học (dict) kèm tên khoa, icon, môn tiên quyết và số giáo viên"""
+        def load():
+            teacher_counts = dict(db.session.query(
+                teacher_subject.c.subject_id, func.count(teacher_subject.c.teacher_id)
+            ).group_by(teacher_subject.c.subject_id).all())
+            return [{
+                'id': subject.id,
+                'subject_code': subject.subject_code,
+                'subject_name': subject.subject_name,
+                'credits': subject.credits,
+                'department': subject.department,
+                'department_name': subject.department_name,
+                'icon': subject.icon,
+                'type': subject.type,
+                'semester': subject.semester,
+                'theory_hours': subject.theory_hours,
+                'practice_hours': subject.practice_hours,
+                'description': subject.description,
+                'prerequisites_list': subject.prerequisites_list,
+                'teacher_count': teacher_counts.get(subject.id, 0),
+            } for subject in Subject.query.order_by(Subject.id).all()]
+        return cache.get_or_set('subjects:all', load)
+
+    @staticmethod
+    def subject(subject_id):
+        return next((s for s in ReferenceData.subjects() if s['id'] == subject_id), None)
+
+    @staticmethod
+    def subjects_by_department(department):
+        return [s for s in ReferenceData.subjects() if s['department'] == department]
+
+    @staticmethod
+    def teachers():
+        """Tất cả giáo viên (dict) kèm tên, email và id các môn được phân công"""
+        def load():
+            teachers = Teacher.query.options(
+                db.joinedload(Teacher.user), db.selectinload(Teacher.assigned_subjects)
+            ).order_by(Teacher.id).all()
+            return [{
+                'id': teacher.id,
+                'teacher_code': teacher.teacher_code,
+                'full_name': teacher.full_name,
+                'email': teacher.email,
+                'department': teacher.department,
+                'department_display': teacher.department_display,
+                'status': teacher.status,
+                'subject_ids': [subject.id for subject in teacher.assigned_subjects],
+            } for teacher in teachers]
+        return cache.get_or_set('teachers:all', load)
+
+    @staticmethod
+    def teacher(teacher_id):
+        return next((t for t in ReferenceData.teachers() if t['id'] == teacher_id), None)
+
+    @staticmethod
+    def teachers_by_department(department):
+        return [t for t in ReferenceData.teachers() if t['department'] == department]
+
+    @staticmethod
+    def classes():
+        """Tất cả lớp (dict); sĩ số lấy từ bộ đếm current_students"""
+        def load():
+            return [{
+                'id': class_obj.id,
+                'class_code': class_obj.class_code,
+                'class_name': class_obj.class_name,
+                'course': class_obj.course,
+                'faculty': class_obj.faculty,
+                'teacher_id': class_obj.teacher_id,
+                'max_students': class_obj.max_students,
+                'current_students_count': class_obj.current_students or 0,
+                'status': class_obj.status,
+            } for class_obj in Class.query.order_by(Class.id).all()]
+        return cache.get_or_set('classes:all', load)
+
+    @staticmethod
+    def departments():
+        """[{'code', 'name'}] các khoa đang có môn học hoặc giáo viên"""
+        def load():
+            names = {s['department']: s['department_name'] for s in ReferenceData.subjects()}
+            for teacher in ReferenceData.teachers():
+                names.setdefault(teacher['department'], teacher['department_display'])
+            return [{'code': code, 'name': names[code]} for code in sorted(names)]
+        return cache.get_or_set('departments:all', load)
+
+    @staticmethod
+    def changed_families(session):
+        """Các họ khóa bị ảnh hưởng bởi thay đổi đang chờ trong session"""
+        families = set()
+        for obj, is_deleted in [(obj, False) for obj in (*session.new, *session.dirty)] + \
+                               [(obj, True) for obj in session.deleted]:
+            table = getattr(obj, '__tablename__', None)
+            if table not in ReferenceData.INVALIDATES:
+                continue
+            watched = ReferenceData.WATCHED_ATTRIBUTES.get(table)
+            if watched and not is_deleted:
+                state = db.inspect(obj)
+                if not any(state.attrs[name].history.has_changes() for name in watched):
+                    continue
+            families.update(ReferenceData.INVALIDATES[table])
+        return families
+
+
+@event.listens_for(db.session, 'before_flush')
+def _reference_before_flush(session, flush_context, instances):
+    # Lịch sử thuộc tính chỉ còn trước khi flush
+    families = ReferenceData.changed_families(session)
+    if families:
+        session.info.setdefault('_reference_dirty', set()).update(families)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _reference_after_commit(session):
+    families = session.info.pop('_reference_dirty', None)
+    if families:
+        cache.invalidate(*families)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _reference_after_rollback(session):
+    session.info.pop('_reference_dirty', None)
+
+
+# ======== DANH TÍNH NGƯỜI DÙNG (USER LOADER CACHE) ========
+# Flask-Login gọi user_loader ở mỗi request và mỗi sự kiện Socket.IO. Thay vì SELECT users
+# (+ teacher_profile / student_profile khi route dùng tới), snapshot gọn của user được giữ
+# trong cache với TTL ngắn rồi gắn lại vào session như 1 đối tượng đã load, không tốn truy vấn.
+# Cột không có trong snapshot bị đánh dấu expired -> chỉ load khi thực sự được đọc.
+
+class UserIdentity:
+    """Snapshot danh tính (user, vai trò, id hồ sơ) trong cache họ khóa 'identity'"""
+
+    TIMEOUT = 60
+    COLUMNS = ('username', 'email', 'full_name', 'role', 'is_active', 'avatar', 'phone')
+    # Đổi các cột này (hoặc mật khẩu) thì snapshot cũ không còn dùng được
+    WATCHED = COLUMNS + ('password_hash',)
+
+    @staticmethod
+    def _key(user_id):
+        return f'identity:{user_id}'
+
+    @staticmethod
+    def snapshot(user):
+        data = {name: getattr(user, name) for name in UserIdentity.COLUMNS}
+        data['id'] = user.id
+        data['role'] = user.role.value
+        data['teacher_id'] = user.teacher_profile.id if user.teacher_profile else None
+        data['student_id'] = user.student_profile.id if user.student_profile else None
+        return data
+
+    @staticmethod
+    def _attach(data):
+        """Dựng lại User (+ hồ sơ) từ snapshot và gắn vào session như vừa load từ DB"""
+        from sqlalchemy.orm import make_transient_to_detached
+
+        user = User(id=data['id'], **{name: data[name] for name in UserIdentity.COLUMNS if name != 'role'})
+        user.role = UserRole(data['role'])
+        user.teacher_profile = Teacher(id=data['teacher_id'], user_id=data['id']) if data['teacher_id'] else None
+        user.student_profile = Student(id=data['student_id'], user_id=data['id']) if data['student_id'] else None
+
+        for obj in (user, user.teacher_profile, user.student_profile):
+            if obj is not None:
+                make_transient_to_detached(obj)
+        db.session.add(user)
+        return user
+
+    @staticmethod
+    def load(user_id):
+        """user_loader: đối tượng đã có trong session > snapshot trong cache > SELECT"""
+        from sqlalchemy.orm.util import identity_key
+
+        user_id = int(user_id)
+        existing = db.session.identity_map.get(identity_key(User, user_id))
+        if existing is not None:
+            return existing
+
+        data = cache.get(UserIdentity._key(user_id))
+        if data is not None:
+            try:
+                return UserIdentity._attach(data)
+            except Exception as e:
+                logger.warning(f"Identity snapshot {user_id} không dùng được: {e}")
+                cache.delete(UserIdentity._key(user_id))
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.set(UserIdentity._key(user_id), UserIdentity.snapshot(user), UserIdentity.TIMEOUT)
+        return user
+
+    @staticmethod
+    def invalidate(*user_ids):
+        for user_id in user_ids:
+            cache.delete(UserIdentity._key(user_id))
+
+    @staticmethod
+    def changed_user_ids(session):
+        """Id các user có snapshot bị ảnh hưởng bởi thay đổi đang chờ trong session"""
+        user_ids = set()
+        for obj in session.dirty:
+            if isinstance(obj, User):
+                state = db.inspect(obj)
+                if any(state.attrs[name].history.has_changes() for name in UserIdentity.WATCHED):
+                    user_ids.add(obj.id)
+        for obj in (*session.new, *session.deleted):
+            if isinstance(obj, User):
+                user_ids.add(obj.id)
+            elif isinstance(obj, (Teacher, Student)):
+                user_ids.add(obj.user_id)
+        user_ids.discard(None)
+        return user_ids
+
+
+@event.listens_for(db.session, 'before_flush')
+def _identity_before_flush(session, flush_context, instances):
+    user_ids = UserIdentity.changed_user_ids(session)
+    if user_ids:
+        session.info.setdefault('_identity_dirty', set()).update(user_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _identity_after_commit(session):
+    user_ids = session.info.pop('_identity_dirty', None)
+    if user_ids:
+        UserIdentity.invalidate(*user_ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _identity_after_rollback(session):
+    session.info.pop('_identity_dirty', None)
+
+
+# ======== PHIÊN BẢN DỮ LIỆU (FRAGMENT CACHE / ETAG) ========
+# Widget dashboard (utils.fragments) và ETag của API JSON phụ thuộc vào các phiên bản dữ liệu:
+# theo bảng ('students', 'scores', ...) và theo đối tượng ('student:<id>', 'course:<id>',
+# 'class:<id>', 'notifications:<user_id>').
+# Commit có thay đổi -> tăng phiên bản -> fragment liên quan được render lại (stale-while-revalidate).
+# Ghi bằng Core statement bỏ qua session events -> gọi DataVersions.touch() trước khi commit.
+
+_DATA_VERSIONS_KEY = '_data_versions'
+
+
+class DataVersions:
+    """Xác định các phiên bản dữ liệu bị thay đổi bởi 1 transaction"""
+
+    # Bảng -> phiên bản theo bảng
+    FAMILIES = {
+        'users': 'users',
+        'students': 'students',
+        'teachers': 'teachers',
+        'classes': 'classes',
+        'subjects': 'subjects',
+        'courses': 'courses',
+        'class_courses': 'courses',
+        'course_registrations': 'registrations',
+        'scores': 'scores',
+        'notifications': 'notifications',
+    }
+    # Bảng -> phiên bản theo đối tượng: (tiền tố, thuộc tính chứa id)
+    SCOPES = {
+        'users': (('user', 'id'),),
+        'students': (('student', 'id'),),
+        'courses': (('course', 'id'),),
+        'classes': (('class', 'id'),),
+        'class_courses': (('class', 'class_id'), ('course', 'course_id')),
+        'course_registrations': (('student', 'student_id'), ('course', 'course_id'),
+                                 ('registrations', 'student_id')),
+        'scores': (('student', 'student_id'), ('course', 'course_id')),
+        'notifications': (('notifications', 'user_id'),),
+    }
+    # Chỉ tính là thay đổi khi các thuộc tính này đổi (users.last_login đổi mỗi lần đăng nhập)
+    WATCHED_ATTRIBUTES = {'users': ('full_name', 'email', 'avatar', 'phone')}
+    # Phiên bản hẹp hơn theo đối tượng: chỉ đổi khi 1 trong các thuộc tính đổi
+    # (vd 'schedule:<course_id>' không đổi khi khóa học chỉ có thêm sinh viên)
+    ATTRIBUTE_SCOPES = {
+        'courses': (('schedule', 'id', ('schedule', 'schedule_mask', 'room', 'subject_id', 'teacher_id',
+                                        'course_code', 'semester', 'year')),),
+    }
+
+    @staticmethod
+    def _scoped(obj, table):
+        """Phiên bản theo đối tượng (cả giá trị cũ lẫn mới của khóa ngoại)"""
+        dependencies = set()
+        for prefix, attribute in DataVersions.SCOPES.get(table, ()):
+            for value in {getattr(obj, attribute), _committed_value(obj, attribute)}:
+                if value is not None:
+                    dependencies.add(f'{prefix}:{value}')
+        return dependencies
+
+    @staticmethod
+    def changed(session):
+        """Các phiên bản bị ảnh hưởng bởi thay đổi đang chờ trong session"""
+        dependencies = set()
+        for obj in (*session.new, *session.deleted, *session.dirty):
+            table = getattr(obj, '__tablename__', None)
+            if obj in session.dirty:
+                if not session.is_modified(obj, include_collections=False):
+                    continue
+                watched = DataVersions.WATCHED_ATTRIBUTES.get(table)
+                state = db.inspect(obj)
+                if watched and not any(state.attrs[name].history.has_changes() for name in watched):
+                    continue
+            family = DataVersions.FAMILIES.get(table)
+            if family:
+                dependencies.add(family)
+            dependencies.update(DataVersions._scoped(obj, table))
+            for prefix, attribute, watched in DataVersions.ATTRIBUTE_SCOPES.get(table, ()):
+                value = getattr(obj, attribute)
+                if value is None:
+                    continue
+                if obj in session.dirty:
+                    state = db.inspect(obj)
+                    if not any(state.attrs[name].history.has_changes() for name in watched):
+                        continue
+                dependencies.add(f'{prefix}:{value}')
+
+        # Thay đổi sinh viên <-> lớp (bảng student_class) không làm đối tượng "modified"
+        for student, class_obj in _membership_changes(session):
+            dependencies.add('memberships')
+            if class_obj.id is not None:
+                dependencies.add(f'class:{class_obj.id}')
+            if student.id is not None:
+                dependencies.add(f'student:{student.id}')
+        return dependencies
+
+    @staticmethod
+    def touch(session, *dependencies):
+        """Ghi nhận thay đổi do Core statement, phiên bản được tăng khi commit"""
+        session.info.setdefault(_DATA_VERSIONS_KEY, set()).update(dependencies)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _versions_before_flush(session, flush_context, instances):
+    dependencies = DataVersions.changed(session)
+    if dependencies:
+        DataVersions.touch(session, *dependencies)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _versions_after_commit(session):
+    dependencies = session.info.pop(_DATA_VERSIONS_KEY, None)
+    if dependencies:
+        fragments.bump(*dependencies)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _versions_after_rollback(session):
+    session.info.pop(_DATA_VERSIONS_KEY, None)
+
+
+# ======== THỜI KHÓA BIỂU SINH VIÊN (CACHE) ========
+# Phần không phụ thuộc tuần của thời khóa biểu (khóa học đã duyệt + các tiết đã parse từ bitmask)
+# được lưu ở khóa "timetable:<student_id>:<học kỳ>:<năm học>" cùng phiên bản của các phụ thuộc:
+# - 'registrations:<student_id>': đăng ký của sinh viên thêm / đổi trạng thái / hủy
+# - 'schedule:<course_id>': lịch, phòng, môn hoặc giáo viên của khóa học đổi
+# Tên môn / giáo viên không nằm trong cache mà lấy từ ReferenceData lúc hiển thị.
+# Chuyển tuần hay xem lại chỉ còn vài lần đọc cache. `flask warm-timetables` tính sẵn cho mọi
+# sinh viên bằng 1 truy vấn (chạy trước khi bắt đầu học kỳ).
+
+class StudentTimetable:
+    """Thời khóa biểu đã tính sẵn theo sinh viên + học kỳ"""
+
+    DEFAULT_TIMEOUT = 7 * 24 * 3600
+
+    @staticmethod
+    def _key(student_id, semester=None, year=None):
+        return f"timetable:{student_id}:{semester or 'all'}:{year or 'all'}"
+
+    @staticmethod
+    def _timeout():
+        return current_app.config.get('TIMETABLE_CACHE_TIMEOUT', StudentTimetable.DEFAULT_TIMEOUT)
+
+    @staticmethod
+    def dependencies(student_id, course_ids):
+        return [f'registrations:{student_id}', *(f'schedule:{course_id}' for course_id in course_ids)]
+
+    # Cột khóa học cần cho thời khóa biểu (đọc theo cột, không dựng đối tượng ORM)
+    COURSE_COLUMNS = (Course.id, Course.course_code, Course.subject_id, Course.teacher_id,
+                      Course.room, Course.schedule, Course.schedule_mask)
+
+    @staticmethod
+    def _courses_query(semester=None, year=None):
+        """(student_id, cột khóa học...) của các đăng ký đã duyệt, lọc theo học kỳ / năm học nếu có"""
+        query = db.session.query(CourseRegistration.student_id, *StudentTimetable.COURSE_COLUMNS).join(
+            Course, Course.id == CourseRegistration.course_id
+        ).filter(CourseRegistration.status == 'approved')
+        if semester:
+            query = query.filter(Course.semester == semester)
+        if year:
+            query = query.filter(Course.year == year)
+        return query
+
+    @staticmethod
+    def _course_entry(course):
+        if course.schedule_mask is None:
+            mask = schedule_mask_utils.parse_schedule(course.schedule)  # dữ liệu cũ chưa backfill
+        else:
+            mask = schedule_mask_utils.mask_from_hex(course.schedule_mask)
+        room = (course.room or '').lower()
+        if 'lab' in room:
+            class_type = 'lab'
+        elif 'thực hành' in room or 'thực hành' in (course.schedule or '').lower():
+            class_type = 'practice'
+        else:
+            class_type = 'theory'
+        return {
+            'id': course.id,
+            'course_code': course.course_code,
+            'subject_id': course.subject_id,
+            'teacher_id': course.teacher_id,
+            'room': course.room,
+            'schedule': course.schedule or '',
+            'type': class_type,
+            'slots': list(schedule_mask_utils.iter_slots(mask)),
+        }
+
+    @staticmethod
+    def _store(student_id, courses, semester, year, registrations_version):
+        course_ids = [course.id for course in courses]
+        dependencies = StudentTimetable.dependencies(student_id, course_ids)
+        # Phiên bản đăng ký đọc trước truy vấn; phiên bản lịch đọc ngay sau (khóa học chỉ biết
+        # sau truy vấn) - ghi xen giữa rất hiếm và bị giới hạn bởi timeout
+        versions = (registrations_version, *fragments.versions(dependencies[1:]))
+        entry = {
+            'dependencies': dependencies,
+            'versions': versions,
+            'courses': [StudentTimetable._course_entry(course) for course in courses],
+        }
+        cache.set(StudentTimetable._key(student_id, semester, year), entry, timeout=StudentTimetable._timeout())
+        return entry
+
+    @staticmethod
+    def get(student_id, semester=None, year=None):
+        """{'courses': [...]} của sinh viên - đọc cache nếu các phiên bản còn khớp, không thì tính lại"""
+        entry = cache.get(StudentTimetable._key(student_id, semester, year))
+        if entry is not None and fragments.versions(entry['dependencies']) == entry['versions']:
+            return entry
+
+        registrations_version = fragments.version(f'registrations:{student_id}')
+        courses = StudentTimetable._courses_query(semester, year).filter(
+            CourseRegistration.student_id == student_id
+        ).order_by(Course.id).all()
+        return StudentTimetable._store(student_id, courses, semester, year, registrations_version)
+
+    @staticmethod
+    def warm(semester=None, year=None, batch_size=1000):
+        """Tính sẵn thời khóa biểu của mọi sinh viên có đăng ký đã duyệt; trả về số sinh viên.
+
+        1 truy vấn duyệt theo student_id (yield_per), mỗi sinh viên ghi 1 khóa cache.
+        """
+        query = StudentTimetable._courses_query(semester, year).order_by(
+            CourseRegistration.student_id, Course.id
+        ).execution_options(yield_per=batch_size)
+
+        warmed = 0
+        current_id, courses, version = None, [], None
+        for course in query:
+            student_id = course.student_id
+            if student_id != current_id:
+                if current_id is not None:
+                    StudentTimetable._store(current_id, courses, semester, year, version)
+                    warmed += 1
+                current_id, courses = student_id, []
+                version = fragments.version(f'registrations:{student_id}')
+            courses.append(course)
+        if current_id is not None:
+            StudentTimetable._store(current_id, courses, semester, year, version)
+            warmed += 1
+        return warmed
+
+
 # THÊM: Hàm đồng bộ toàn hệ thống
 def sync_system_data():
     """Đồng bộ tất cả dữ liệu hệ thống - HIỆU SUẤT CAO"""
-    try:
-        # SỬA: Sử dụng batch update thay vì individual
-        Course.batch_update_registration_counts()
-        
-        # Đồng bộ GPA cho tất cả students
-        students = Student.query.all()
-        for student in students:
-            student.update_gpa()
-
-        db.session.commit()
-        logger.info("System data synchronized successfully")
-        return True
-    except Exception as e:
-        logger.error(f"Error syncing system data: {str(e)}")
-        db.session.rollback()
-        return False
+    return SystemSync.run() is not None
     
 class Attendance(db.Model):
     __tablename__ = 'attendances'
@@ -1068,19 +2703,79 @@ class Notification(db.Model):
     __tablename__ = 'notifications'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # active_history: giữ giá trị cũ để bộ đếm thông báo chưa đọc của User được cập nhật theo delta
+    user_id = db.column_property(db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False), active_history=True)
     title = db.Column(db.String(255), nullable=False)
     message = db.Column(db.Text, nullable=False)
     category = db.Column(db.String(50), nullable=False)  # academic, system, deadline, etc.
     priority = db.Column(db.String(20), default='normal')  # low, normal, high, urgent
-    is_read = db.Column(db.Boolean, default=False)
+    is_read = db.column_property(db.Column(db.Boolean, default=False), active_history=True)
     action_url = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime)
     
+    __table_args__ = (
+        # Đếm thông báo chưa đọc (mỗi lần kết nối socket)
+        db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+        # Danh sách thông báo mới nhất của người dùng
+        db.Index('ix_notifications_user_created', 'user_id', 'created_at'),
+    )
+    
     # Relationship
     user = db.relationship('User', backref=db.backref('notifications', lazy=True))
 
+    @staticmethod
+    def unread_counts(user_ids, connection=None):
+        """{user_id: số thông báo chưa đọc} đọc từ bộ đếm User.unread_notifications_count"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        users = User.__table__
+        stmt = db.select(users.c.id, users.c.unread_notifications_count).where(users.c.id.in_(user_ids))
+        rows = (connection or db.session).execute(stmt)
+        return {user_id: count or 0 for user_id, count in rows}
+
+    @staticmethod
+    def unread_count(user_id):
+        """Số thông báo chưa đọc của 1 người dùng - O(1), không COUNT bảng notifications"""
+        return Notification.unread_counts([user_id]).get(user_id, 0)
+
+    @staticmethod
+    def category_counts(user_id):
+        """{category: {'total', 'unread'}} của người dùng trong 1 truy vấn GROUP BY"""
+        rows = db.session.query(
+            Notification.category,
+            func.count(Notification.id),
+            func.count(case((Notification.is_read.isnot(True), 1)))
+        ).filter(Notification.user_id == user_id).group_by(Notification.category).all()
+        return {category: {'total': total, 'unread': unread} for category, total, unread in rows}
+
+    @staticmethod
+    def mark_all_read(user_id):
+        """Đánh dấu đã đọc toàn bộ thông báo của người dùng. Trả về số thông báo thay đổi.
+
+        UPDATE hàng loạt bỏ qua session events -> tự trừ bộ đếm. Không commit - hàm gọi tự commit.
+        """
+        table = Notification.__table__
+        changed = db.session.execute(table.update().where(
+            table.c.user_id == user_id, table.c.is_read.isnot(True)
+        ).values(is_read=True)).rowcount
+        if changed:
+            users = User.__table__
+            db.session.execute(users.update().where(users.c.id == user_id).values(
+                unread_notifications_count=users.c.unread_notifications_count - changed
+            ))
+            record_unread_push(db.session, Notification.unread_counts([user_id]), {user_id: -changed})
+            DataVersions.touch(db.session, 'notifications', f'notifications:{user_id}')
+            # Đối tượng đã nạp vào session không còn khớp với DB
+            for obj in list(db.session.identity_map.values()):
+                if isinstance(obj, Notification) and db.inspect(obj).dict.get('user_id') == user_id:
+                    db.session.expire(obj, ['is_read'])
+            user = db.session.identity_map.get(db.session.identity_key(User, user_id))
+            if user is not None:
+                db.session.expire(user, ['unread_notifications_count'])
+        return changed
+
 class SystemLog(db.Model):
     __tablename__ = 'system_logs'
     
@@ -1096,13 +2791,59 @@ class SystemLog(db.Model):
     # Relationship
     user = db.relationship('User', backref=db.backref('logs', lazy=True))
 
+class ExportJob(db.Model):
+    """Lượt export chạy nền (utils/export_jobs.py) - file kết quả nằm trong EXPORT_JOB_DIR tới expires_at"""
+    __tablename__ = 'export_jobs'
+
+    STATUSES = ('queued', 'running', 'done', 'failed', 'expired')
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex - nằm trong URL tải file
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)  # tên task đã đăng ký, vd teachers_pdf
+    params = db.Column(db.Text)  # JSON tham số của task
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    message = db.Column(db.String(255))
+    filename = db.Column(db.String(255))  # tên file khi tải về
+    mimetype = db.Column(db.String(100))
+    size = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Danh sách lượt export gần đây của người dùng
+        db.Index('ix_export_jobs_user_created', 'user_id', 'created_at'),
+        # Dọn file hết hạn
+        db.Index('ix_export_jobs_status_expires', 'status', 'expires_at'),
+    )
+
+    def to_dict(self, download_url=None):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'filename': self.filename,
+            'size': self.size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'download_url': download_url if self.status == 'done' else None
+        }
+
 def auto_register_students_to_class_courses(class_id, course_id, semester):
     """
     CHỈ tạo ClassCourse (quan hệ lớp-khóa học) 
     KHÔNG tự động đăng ký sinh viên
     """
-    class_obj = Class.query.get(class_id)
-    course = Course.query.get(course_id)
+    class_obj = loader.get(Class, class_id)
+    course = loader.get(Course, course_id)
     
     if not class_obj or not course:
         return 0
@@ -1216,34 +2957,9 @@ class StudentCourseCart(db.Model):
     )
 
 def check_prerequisites(student_id, course_id):
-    """Kiểm tra điều kiện tiên quyết"""
-    course = Course.query.get(course_id)
-    if not course or not course.subject or not course.subject.prerequisites:
-        return True, []
-    
-    # Lấy danh sách môn học đã hoàn thành
-    completed_scores = Score.query.filter_by(
-        student_id=student_id,
-        status='published'
-    ).filter(Score.final_score >= 5.0).all()
-    
-    completed_subject_ids = [score.course.subject_id for score in completed_scores if score.course]
-    
-    # Kiểm tra prerequisites
-    import json
-    try:
-        required_prereq_ids = json.loads(course.subject.prerequisites)
-        missing_prereqs = []
-        
-        for prereq_id in required_prereq_ids:
-            prereq_subject = Subject.query.get(prereq_id)
-            if prereq_subject and prereq_id not in completed_subject_ids:
-                missing_prereqs.append(prereq_subject.subject_name)
-        
-        return len(missing_prereqs) == 0, missing_prereqs
-        
-    except:
-        return True, []
+    """Kiểm tra điều kiện tiên quyết - trả về (đủ điều kiện, [tên môn còn thiếu])"""
+    missing = PrerequisiteGraph.get().check_cart(student_id, [course_id]).get(course_id, [])
+    return len(missing) == 0, missing
 
 # Create all tables
 def create_tables():
@@ -1594,34 +3310,208 @@ def create_sample_data():
 
 # THÊM VÀO CUỐI models.py
 class SystemSync:
-    """Class chứa các phương thức đồng bộ hệ thống"""
+    """Class chứa các phương thức đồng bộ hệ thống.
+    
+    Mọi bộ đếm phi chuẩn hóa được tính lại bằng vài câu
+    UPDATE ... FROM (SELECT ... GROUP BY), chỉ ghi các dòng thực sự lệch.
+    """
+    
+    # Cột bộ đếm -> cột tương ứng trong subquery tổng hợp
+    COURSE_COUNTERS = {
+        'total_registrations_count': 'total',
+        'approved_registrations_count': 'approved',
+        'current_students': 'approved'
+    }
+    CLASS_COUNTERS = {'current_students': 'total'}
+    USER_COUNTERS = {'unread_notifications_count': 'unread'}
+    STUDENT_COUNTERS = {'gpa_weighted_sum': 'weighted_sum', 'completed_credits': 'credit_sum'}
+    SCORE_STATS_COUNTERS = {column: column for column in CourseScoreStats.SUM_COLUMNS}
     
     @staticmethod
-    def update_all_counts():
-        """Cập nhật tất cả số lượng trong hệ thống"""
+    def _sync_counters(table, aggregate, key, columns, pk='id'):
+        """Ghi các cột bộ đếm của `table` từ subquery tổng hợp `aggregate`.
+        
+        columns: {tên cột trong table: tên cột trong aggregate}; pk: cột khóa của `table`.
+        Dòng không có trong aggregate được đưa về 0. Trả về số dòng thay đổi.
+        """
+        # So sánh có sai số: cột tổng kiểu float cộng theo delta có thể lệch SUM() ở chữ số cuối
+        matched = table.update().where(
+            table.c[pk] == aggregate.c[key]
+        ).where(or_(*[
+            func.abs(func.coalesce(table.c[target], -1) - aggregate.c[source]) > 1e-6
+            for target, source in columns.items()
+        ])).values({
+            target: aggregate.c[source] for target, source in columns.items()
+        })
+        
+        missing = table.update().where(
+            table.c[pk].notin_(db.select(aggregate.c[key]))
+        ).where(or_(*[
+            func.coalesce(table.c[target], -1) != 0 for target in columns
+        ])).values({target: 0 for target in columns})
+        
+        return db.session.execute(matched).rowcount + db.session.execute(missing).rowcount
+    
+    @staticmethod
+    def _find_mismatches(table, aggregate, key, columns, pk='id'):
+        """Các dòng của `table` có bộ đếm lệch so với `aggregate` (dòng thiếu trong aggregate = 0).
+        
+        Trả về list {'id', 'column', 'stored', 'expected'}.
+        """
+        expected = {target: func.coalesce(aggregate.c[source], 0) for target, source in columns.items()}
+        query = db.select(
+            table.c[pk].label('id'), *[table.c[target] for target in columns],
+            *[value.label(f'expected_{target}') for target, value in expected.items()]
+        ).select_from(
+            table.outerjoin(aggregate, table.c[pk] == aggregate.c[key])
+        ).where(or_(*[
+            func.abs(func.coalesce(table.c[target], -1) - value) > 1e-6
+            for target, value in expected.items()
+        ])).order_by(table.c[pk])
+        
+        mismatches = []
+        for row in db.session.execute(query).mappings():
+            for target in columns:
+                stored, wanted = row[target], row[f'expected_{target}']
+                if stored is None or abs(stored - wanted) > 1e-6:
+                    mismatches.append({'id': row['id'], 'column': target,
+                                       'stored': stored, 'expected': wanted})
+        return mismatches
+    
+    @staticmethod
+    def _course_aggregate():
+        approved = func.count(case((CourseRegistration.status == 'approved', 1)))
+        return db.session.query(
+            CourseRegistration.course_id.label('course_id'),
+            func.count(CourseRegistration.id).label('total'),
+            approved.label('approved')
+        ).group_by(CourseRegistration.course_id).subquery()
+    
+    @staticmethod
+    def _class_aggregate():
+        return db.session.query(
+            student_class.c.class_id.label('class_id'),
+            func.count().label('total')
+        ).group_by(student_class.c.class_id).subquery()
+    
+    @staticmethod
+    def _user_aggregate():
+        return db.session.query(
+            Notification.user_id.label('user_id'),
+            func.count(Notification.id).label('unread')
+        ).filter(Notification.is_read.isnot(True)).group_by(Notification.user_id).subquery()
+    
+    @staticmethod
+    def sync_course_counts():
+        """Số đăng ký (tổng / đã duyệt) và sĩ số của tất cả khóa học"""
+        return SystemSync._sync_counters(Course.__table__, SystemSync._course_aggregate(),
+                                         'course_id', SystemSync.COURSE_COUNTERS)
+    
+    @staticmethod
+    def sync_class_counts():
+        """Sĩ số của tất cả lớp theo bảng student_class"""
+        return SystemSync._sync_counters(Class.__table__, SystemSync._class_aggregate(),
+                                         'class_id', SystemSync.CLASS_COUNTERS)
+    
+    @staticmethod
+    def sync_user_counts():
+        """Số thông báo chưa đọc của tất cả người dùng"""
+        return SystemSync._sync_counters(User.__table__, SystemSync._user_aggregate(),
+                                         'user_id', SystemSync.USER_COUNTERS)
+    
+    @staticmethod
+    def _score_stats_missing(aggregate):
+        """SELECT các dòng của aggregate (thống kê điểm) chưa có dòng trong course_score_stats"""
+        table = CourseScoreStats.__table__
+        return db.select(aggregate).where(
+            aggregate.c.course_id.notin_(db.select(table.c.course_id))
+        )
+    
+    @staticmethod
+    def sync_score_stats():
+        """Thống kê điểm của tất cả khóa học: sửa dòng lệch, thêm dòng còn thiếu"""
+        table = CourseScoreStats.__table__
+        aggregate = CourseScoreStats.aggregate_select().subquery()
+        changed = SystemSync._sync_counters(table, aggregate, 'course_id',
+                                            SystemSync.SCORE_STATS_COUNTERS, pk='course_id')
+        inserted = db.session.execute(table.insert().from_select(
+            ['course_id'] + list(CourseScoreStats.SUM_COLUMNS),
+            SystemSync._score_stats_missing(aggregate)
+        )).rowcount
+        return changed + inserted
+    
+    @staticmethod
+    def verify_counters():
+        """So sánh bộ đếm đang lưu với giá trị tính lại từ dữ liệu gốc, KHÔNG ghi gì.
+        
+        Trả về {'courses': [...], 'classes': [...], 'students': [...], 'users': [...],
+        'course_score_stats': [...], 'total_mismatches': n}.
+        """
+        score_stats = CourseScoreStats.aggregate_select().subquery()
+        missing_stats = [
+            {'id': row.course_id, 'column': column, 'stored': None, 'expected': getattr(row, column)}
+            for row in db.session.execute(SystemSync._score_stats_missing(score_stats))
+            for column in CourseScoreStats.SUM_COLUMNS
+        ]
+        report = {
+            'courses': SystemSync._find_mismatches(Course.__table__, SystemSync._course_aggregate(),
+                                                   'course_id', SystemSync.COURSE_COUNTERS),
+            'classes': SystemSync._find_mismatches(Class.__table__, SystemSync._class_aggregate(),
+                                                   'class_id', SystemSync.CLASS_COUNTERS),
+            'students': SystemSync._find_mismatches(Student.__table__, gpa_aggregate_subquery(),
+                                                    'student_id', SystemSync.STUDENT_COUNTERS),
+            'users': SystemSync._find_mismatches(User.__table__, SystemSync._user_aggregate(),
+                                                 'user_id', SystemSync.USER_COUNTERS),
+            'course_score_stats': SystemSync._find_mismatches(
+                CourseScoreStats.__table__, score_stats, 'course_id', SystemSync.SCORE_STATS_COUNTERS,
+                pk='course_id'
+            ) + missing_stats,
+        }
+        report['total_mismatches'] = sum(len(rows) for rows in report.values())
+        return report
+    
+    @staticmethod
+    def sync_all():
+        """Đồng bộ toàn bộ bộ đếm và trả về báo cáo số dòng thay đổi theo bảng.
+        
+        Không commit - hàm gọi tự commit (hoặc rollback khi lỗi).
+        """
+        import time
+        
+        started = time.perf_counter()
+        report = {
+            'courses': SystemSync.sync_course_counts(),
+            'classes': SystemSync.sync_class_counts(),
+            'students': rebuild_gpa_aggregates(),
+            'users': SystemSync.sync_user_counts(),
+            'course_score_stats': SystemSync.sync_score_stats(),
+        }
+        db.session.expire_all()
+        
+        result = {
+            'changed_rows': report,
+            'total_changed': sum(report.values()),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+        logger.info(f"System sync: {result}")
+        return result
+    
+    @staticmethod
+    def run():
+        """Chạy sync_all trong 1 transaction. Trả về báo cáo, hoặc None nếu lỗi."""
         try:
-            # Đồng bộ courses
-            Course.batch_update_registration_counts()
-            
-            # Đồng bộ students count trong classes
-            classes = Class.query.all()
-            for class_obj in classes:
-                count = Student.query.filter_by(class_id=class_obj.id).count()
-                if class_obj.current_students != count:
-                    class_obj.current_students = count
-            
-            # Đồng bộ GPA students
-            students = Student.query.all()
-            for student in students:
-                student.update_gpa()
-            
+            result = SystemSync.sync_all()
             db.session.commit()
-            return True
-            
+            return result
         except Exception as e:
             db.session.rollback()
-            logger.error(f"Update counts error: {str(e)}")
-            return False
+            logger.error(f"System sync error: {str(e)}")
+            return None
+    
+    @staticmethod
+    def update_all_counts():
+        """Cập nhật tất cả số lượng trong hệ thống"""
+        return SystemSync.run() is not None
 
 # Schedule auto-sync mỗi 5 phút
 def start_auto_sync():
@@ -1,7 +1,8 @@
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import request, current_app
 from flask_login import current_user
-from models import db, Notification, User, Student
+from models import db, Notification, User, Student, UNREAD_PUSH_KEY
+from sqlalchemy import event
 from datetime import datetime
 import json
 import logging
@@ -60,9 +61,10 @@ class NotificationManager:
     @staticmethod
     def send_course_notification(course_id, title, message, priority='normal'):
         """Send notification to all students in a course"""
-        from models import CourseRegistration, Course
+        from models import CourseRegistration, Course, Student
+        from utils.loader import loader
         
-        course = Course.query.get(course_id)
+        course = loader.get(Course, course_id)
         if not course:
             logger.error(f"Course {course_id} not found")
             return
@@ -72,7 +74,9 @@ class NotificationManager:
             status='approved'
         ).all()
         
-        user_ids = [reg.student.user_id for reg in registrations]
+        # 1 truy vấn cho tất cả sinh viên thay vì lazy load reg.student từng dòng
+        students = loader.get_many(Student, [reg.student_id for reg in registrations])
+        user_ids = [student.user_id for student in students.values()]
         
         # Also notify the teacher
         user_ids.append(course.teacher.user_id)
@@ -182,13 +186,8 @@ def handle_connect():
         join_room(f'user_{current_user.id}')
         logger.info(f"User {current_user.id} connected to WebSocket")
         
-        # Send unread notifications count
-        unread_count = Notification.query.filter_by(
-            user_id=current_user.id, 
-            is_read=False
-        ).count()
-        
-        emit('notification_count', {'count': unread_count})
+        # Send unread notifications count (đọc từ bộ đếm, không COUNT bảng notifications)
+        emit('notification_count', {'count': Notification.unread_count(current_user.id), 'delta': 0})
     else:
         # Reject connection for unauthenticated users
         return False
@@ -216,16 +215,9 @@ def handle_mark_notification_read(data):
     ).first()
     
     if notification and not notification.is_read:
+        # Bộ đếm giảm khi flush, số mới được đẩy tới phòng user_<id> sau commit
         notification.is_read = True
         db.session.commit()
-        
-        # Update unread count
-        unread_count = Notification.query.filter_by(
-            user_id=current_user.id, 
-            is_read=False
-        ).count()
-        
-        emit('notification_count', {'count': unread_count})
         logger.info(f"User {current_user.id} marked notification {notification_id} as read")
 
 @socketio.on('mark_all_notifications_read')
@@ -234,14 +226,8 @@ def handle_mark_all_notifications_read():
     if not current_user.is_authenticated:
         return
     
-    Notification.query.filter_by(
-        user_id=current_user.id, 
-        is_read=False
-    ).update({'is_read': True})
-    
+    Notification.mark_all_read(current_user.id)
     db.session.commit()
-    
-    emit('notification_count', {'count': 0})
     logger.info(f"User {current_user.id} marked all notifications as read")
 
 @socketio.on('get_notifications')
@@ -283,6 +269,21 @@ def handle_get_notifications(data):
         'current_page': page
     })
 
+# Đẩy số thông báo chưa đọc sau mỗi commit làm thay đổi bộ đếm
+@event.listens_for(db.session, 'after_commit')
+def _push_unread_counts(session):
+    pending = session.info.pop(UNREAD_PUSH_KEY, None)
+    if not pending:
+        return
+    for user_id, (delta, count) in pending.items():
+        if not delta:
+            continue
+        try:
+            socketio.emit('notification_count', {'count': count, 'delta': delta}, room=f'user_{user_id}')
+        except Exception as e:
+            # Chưa gắn Socket.IO vào app (CLI, script) -> client nhận số mới khi kết nối lại
+            logger.debug(f"Skip notification_count push for user {user_id}: {e}")
+
 # Notification triggers
 def trigger_low_score_notifications(score, threshold=5.0):
     """
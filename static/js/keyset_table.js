@@ -0,0 +1,231 @@
+// Bảng phân trang keyset: tải thêm các dòng <tr> đã render sẵn từ API (?render=html)
+// khi cuộn tới cuối bảng, lọc/tìm kiếm phía server.
+
+class KeysetTable {
+    /**
+     * @param {Object} options
+     * @param {string} options.url        API danh sách (vd: /api/admin/students)
+     * @param {string} options.tbody      id của <tbody>
+     * @param {Object} options.filters    {tham số query: id của input/select}
+     * @param {string} options.nextCursor con trỏ trang kế tiếp do server render trang đầu
+     * @param {string} [options.loadMore] id nút "Tải thêm"
+     * @param {string} [options.counter]  id phần tử hiển thị số dòng đã tải
+     * @param {Function} [options.onRender] gọi lại sau mỗi lần thêm dòng
+     */
+    constructor(options) {
+        this.url = options.url;
+        this.tbody = document.getElementById(options.tbody);
+        this.filters = options.filters || {};
+        this.nextCursor = options.nextCursor || null;
+        this.loadMoreButton = options.loadMore ? document.getElementById(options.loadMore) : null;
+        this.counter = options.counter ? document.getElementById(options.counter) : null;
+        this.onRender = options.onRender || function() {};
+        this.loading = false;
+        this.requestId = 0;
+
+        this._bindFilters();
+        this._observeEnd();
+        this._updateControls();
+    }
+
+    get rowCount() {
+        return this.tbody ? this.tbody.querySelectorAll(':scope > tr').length : 0;
+    }
+
+    _params(extra) {
+        const params = new URLSearchParams({render: 'html'});
+        Object.entries(this.filters).forEach(([name, elementId]) => {
+            const element = document.getElementById(elementId);
+            if (element && element.value) params.set(name, element.value);
+        });
+        Object.entries(extra || {}).forEach(([name, value]) => {
+            if (value !== null && value !== undefined) params.set(name, value);
+        });
+        return params;
+    }
+
+    _bindFilters() {
+        let timer = null;
+        Object.values(this.filters).forEach(elementId => {
+            const element = document.getElementById(elementId);
+            if (!element) return;
+            const eventName = element.tagName === 'SELECT' || element.type === 'date' ? 'change' : 'input';
+            element.addEventListener(eventName, () => {
+                clearTimeout(timer);
+                timer = setTimeout(() => this.reload(), 300);
+            });
+        });
+        if (this.loadMoreButton) {
+            this.loadMoreButton.addEventListener('click', () => this.loadMore());
+        }
+    }
+
+    _observeEnd() {
+        if (!this.loadMoreButton || !('IntersectionObserver' in window)) return;
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) this.loadMore();
+        }, {rootMargin: '200px'});
+        observer.observe(this.loadMoreButton);
+    }
+
+    _updateControls() {
+        if (this.loadMoreButton) {
+            this.loadMoreButton.style.display = this.nextCursor ? '' : 'none';
+            this.loadMoreButton.disabled = this.loading;
+        }
+        if (this.counter) {
+            this.counter.textContent = this.rowCount;
+        }
+    }
+
+    async _fetch(cursor, rowOffset) {
+        const requestId = ++this.requestId;
+        this.loading = true;
+        this._updateControls();
+        try {
+            const response = await fetch(`${this.url}?${this._params({cursor: cursor, row_offset: rowOffset})}`);
+            const result = await response.json();
+            // Bỏ kết quả của request cũ nếu người dùng đã đổi bộ lọc
+            if (requestId !== this.requestId) return null;
+            if (!result.success) throw new Error(result.message || 'Lỗi tải dữ liệu');
+            return result;
+        } finally {
+            if (requestId === this.requestId) {
+                this.loading = false;
+            }
+        }
+    }
+
+    async loadMore() {
+        if (this.loading || !this.nextCursor) return;
+        try {
+            const result = await this._fetch(this.nextCursor, this.rowCount);
+            if (!result) return;
+            this.tbody.insertAdjacentHTML('beforeend', result.html);
+            this.nextCursor = result.next_cursor;
+            this.onRender();
+        } catch (error) {
+            console.error('Error loading rows:', error);
+        } finally {
+            this._updateControls();
+        }
+    }
+
+    async reload() {
+        try {
+            const result = await this._fetch(null, 0);
+            if (!result) return;
+            this.tbody.innerHTML = result.html;
+            this.nextCursor = result.next_cursor;
+            this.onRender();
+        } catch (error) {
+            console.error('Error loading rows:', error);
+        } finally {
+            this._updateControls();
+        }
+    }
+}
+
+// Danh sách chọn (vd: sinh viên có thể thêm vào lớp/khóa học) đọc API JSON keyset:
+// dòng do client render, dòng cuối "Tải thêm" gọi trang kế tiếp, ô tìm kiếm lọc phía server.
+class KeysetList {
+    /**
+     * @param {Object} options
+     * @param {string} options.url          API trả về {success, <itemsKey>, next_cursor}
+     * @param {string} options.tbody        id của <tbody>
+     * @param {Function} options.renderRow  item -> chuỗi HTML <tr>
+     * @param {string} [options.itemsKey]   khóa chứa danh sách trong JSON (mặc định 'items')
+     * @param {Function} [options.params]   () -> tham số lọc cố định (vd: exclude_class_id)
+     * @param {string} [options.search]     id ô tìm kiếm (gửi lên dưới dạng ?q=)
+     * @param {number} [options.colspan]    số cột cho dòng "Tải thêm"
+     * @param {Function} [options.onRender] gọi lại sau mỗi lần thêm dòng
+     */
+    constructor(options) {
+        this.url = options.url;
+        this.tbody = document.getElementById(options.tbody);
+        this.renderRow = options.renderRow;
+        this.itemsKey = options.itemsKey || 'items';
+        this.params = options.params || (() => ({}));
+        this.search = options.search ? document.getElementById(options.search) : null;
+        this.colspan = options.colspan || 5;
+        this.onRender = options.onRender || function() {};
+        this.nextCursor = null;
+        this.requestId = 0;
+
+        if (this.search) {
+            let timer = null;
+            this.search.addEventListener('input', () => {
+                clearTimeout(timer);
+                timer = setTimeout(() => this.reload(), 300);
+            });
+        }
+    }
+
+    async _fetch(cursor) {
+        const requestId = ++this.requestId;
+        const params = Object.assign({}, this.params(), {
+            q: this.search ? this.search.value.trim() : null,
+            cursor: cursor
+        });
+        const result = await fetchKeysetPage(this.url, params);
+        if (requestId !== this.requestId) return null;
+        if (!result.success) throw new Error(result.message || 'Lỗi tải dữ liệu');
+        return result;
+    }
+
+    _render(result, append) {
+        const moreRow = this.tbody.querySelector('tr.keyset-more');
+        if (moreRow) moreRow.remove();
+
+        const html = (result[this.itemsKey] || []).map(this.renderRow).join('');
+        if (append) {
+            this.tbody.insertAdjacentHTML('beforeend', html);
+        } else {
+            this.tbody.innerHTML = html;
+        }
+
+        this.nextCursor = result.next_cursor;
+        if (this.nextCursor) {
+            this.tbody.insertAdjacentHTML('beforeend', `
+                <tr class="keyset-more">
+                    <td colspan="${this.colspan}" class="text-center">
+                        <button type="button" class="btn btn-sm btn-link">
+                            <i class="fas fa-angle-double-down me-1"></i>Tải thêm
+                        </button>
+                    </td>
+                </tr>
+            `);
+            this.tbody.querySelector('tr.keyset-more button').addEventListener('click', () => this.loadMore());
+        }
+        this.onRender();
+    }
+
+    async reload() {
+        try {
+            const result = await this._fetch(null);
+            if (result) this._render(result, false);
+        } catch (error) {
+            console.error('Error loading list:', error);
+        }
+    }
+
+    async loadMore() {
+        if (!this.nextCursor) return;
+        try {
+            const result = await this._fetch(this.nextCursor);
+            if (result) this._render(result, true);
+        } catch (error) {
+            console.error('Error loading list:', error);
+        }
+    }
+}
+
+// Duyệt từng trang của API JSON keyset (không render HTML) - cho các danh sách chọn sinh viên
+async function fetchKeysetPage(url, params) {
+    const query = new URLSearchParams();
+    Object.entries(params || {}).forEach(([name, value]) => {
+        if (value !== null && value !== undefined && value !== '') query.set(name, value);
+    });
+    const response = await fetch(`${url}?${query}`);
+    return response.json();
+}
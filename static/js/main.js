@@ -30,6 +30,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // SocketIO connection for real-time notifications
     const socket = io();
+    exportSocket = socket;
     
     socket.on('connect', function() {
         console.log('Connected to server');
@@ -39,11 +40,113 @@ document.addEventListener('DOMContentLoaded', function() {
         showNotification(data);
     });
 
+    // Số thông báo chưa đọc do server đẩy sau mỗi thay đổi ({count, delta})
+    socket.on('notification_count', function(data) {
+        document.querySelectorAll('[data-notification-count]').forEach(element => {
+            element.textContent = data.count;
+        });
+    });
+
+    // Tiến độ các file đang xuất nền ({id, status, progress, message, download_url})
+    socket.on('export_job', function(job) {
+        updateExportJob(job);
+    });
+
     socket.on('disconnect', function() {
         console.log('Disconnected from server');
     });
 });
 
+// ======== EXPORT CHẠY NỀN ========
+// POST tới route export -> server trả về mã job ngay (202); tiến độ tới qua Socket.IO
+// ('export_job'), đồng thời hỏi lại status_url định kỳ phòng khi mất kết nối socket
+// (3 giây khi socket mất kết nối, 15 giây khi socket vẫn đang nhận sự kiện).
+const exportJobs = {};
+let exportSocket = null;
+
+function startExportJob(url) {
+    const csrfMeta = document.querySelector('meta[name="csrf-token"]');
+    return fetch(url, {
+        method: 'POST',
+        headers: {'X-CSRFToken': csrfMeta ? csrfMeta.content : ''},
+        credentials: 'same-origin'
+    })
+    .then(response => response.json().then(data => ({status: response.status, data: data})))
+    .then(({status, data}) => {
+        if (status !== 202 || !data.success) {
+            showExportToast('export-error', 'danger', data.message || 'Không thể xuất file');
+            return null;
+        }
+        exportJobs[data.job.id] = {statusUrl: data.status_url, downloaded: false};
+        updateExportJob(data.job);
+        pollExportJob(data.job.id);
+        return data.job;
+    })
+    .catch(error => {
+        console.error('Export error:', error);
+        showExportToast('export-error', 'danger', 'Không thể kết nối tới máy chủ');
+        return null;
+    });
+}
+
+function pollExportJob(jobId) {
+    const state = exportJobs[jobId];
+    if (!state || state.finished) return;
+    setTimeout(() => {
+        fetch(state.statusUrl, {credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) updateExportJob(data.job);
+                pollExportJob(jobId);
+            })
+            .catch(() => pollExportJob(jobId));
+    }, exportSocket && exportSocket.connected ? 15000 : 3000);
+}
+
+function updateExportJob(job) {
+    const state = exportJobs[job.id];
+    if (!state) return;  // job của tab khác
+    const toastId = `export-job-${job.id}`;
+
+    if (job.status === 'done') {
+        state.finished = true;
+        showExportToast(toastId, 'success',
+            `Đã xuất xong <strong>${job.filename}</strong> - <a href="${job.download_url}">tải lại</a>`);
+        if (!state.downloaded) {
+            state.downloaded = true;
+            window.location.href = job.download_url;
+        }
+    } else if (job.status === 'failed' || job.status === 'expired') {
+        state.finished = true;
+        showExportToast(toastId, 'danger', job.message || 'Xuất file thất bại');
+    } else {
+        showExportToast(toastId, 'info', `
+            <div class="mb-1">${job.message || 'Đang xuất file...'}</div>
+            <div class="progress" style="height: 6px;">
+                <div class="progress-bar progress-bar-striped progress-bar-animated" style="width: ${job.progress}%"></div>
+            </div>`, false);
+    }
+}
+
+function showExportToast(id, type, html, autoHide = true) {
+    let toast = document.getElementById(id);
+    if (!toast) {
+        toast = document.createElement('div');
+        toast.id = id;
+        toast.style.cssText = 'bottom: 20px; right: 20px; z-index: 9999; min-width: 320px;';
+        document.body.appendChild(toast);
+    }
+    toast.className = `alert alert-${type} alert-dismissible fade show position-fixed`;
+    toast.innerHTML = `${html}<button type="button" class="btn-close" data-bs-dismiss="alert"></button>`;
+    if (autoHide) {
+        setTimeout(() => {
+            if (toast.parentNode) {
+                toast.parentNode.removeChild(toast);
+            }
+        }, 8000);
+    }
+}
+
 // Notification function
 function showNotification(data) {
     // Create notification element
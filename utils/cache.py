@@ -0,0 +1,283 @@
+"""
+Lớp cache cho dữ liệu tham chiếu (môn học, giáo viên, lớp, khoa)
+
+Khóa có dạng "<họ khóa>:<phần còn lại>" (vd: "subjects:all", "teachers:all"); số lần
+hit/miss được đếm theo họ khóa. Hai backend:
+- MemoryCache: LRU + TTL trong tiến trình (mặc định). Mỗi worker có cache riêng,
+  TTL giới hạn thời gian dữ liệu cũ ở các worker không nhận được sự kiện xóa.
+- RedisCache: dùng chung giữa các worker. Nhận bất kỳ client nào có get/set/delete/scan_iter
+  (redis.Redis hoặc bản giả lập cục bộ khi test).
+
+Cấu hình: CACHE_TYPE = memory | redis | null, CACHE_DEFAULT_TIMEOUT (giây),
+CACHE_MAX_ENTRIES, CACHE_REDIS_URL (mặc định REDIS_URL).
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def key_family(key):
+    """Họ của khóa: phần trước dấu ':' đầu tiên"""
+    return key.split(':', 1)[0]
+
+
+class MemoryCache:
+    """LRU + TTL trong bộ nhớ tiến trình, an toàn đa luồng"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (hết hạn lúc, giá trị)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def add(self, key, value, timeout=None):
+        """Chỉ ghi nếu khóa chưa tồn tại (hoặc đã hết hạn). Trả về True nếu đã ghi."""
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                return False
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """Backend Redis: giá trị được pickle, mọi khóa mang tiền tố namespace"""
+
+    def __init__(self, client, namespace='sm:'):
+        self.client = client
+        self.namespace = namespace
+
+    def get(self, key):
+        raw = self.client.get(self.namespace + key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, timeout=None):
+        self.client.set(self.namespace + key, pickle.dumps(value), ex=timeout or None)
+
+    def add(self, key, value, timeout=None):
+        return bool(self.client.set(self.namespace + key, pickle.dumps(value), ex=timeout or None, nx=True))
+
+    def delete(self, key):
+        self.client.delete(self.namespace + key)
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=f'{self.namespace}{prefix}*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.delete_prefix('')
+
+
+class NullCache:
+    """Tắt cache (luôn miss) - dùng khi test hoặc để so sánh hiệu năng"""
+
+    def get(self, key):
+        return _MISSING
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def add(self, key, value, timeout=None):
+        return True
+
+    def delete(self, key):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def clear(self):
+        pass
+
+
+class Cache:
+    """Mặt tiền chung: chọn backend theo config, đếm hit/miss theo họ khóa"""
+
+    def __init__(self, backend=None, default_timeout=300):
+        self.backend = backend or MemoryCache()
+        self.default_timeout = default_timeout
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+        self._invalidations = defaultdict(int)
+
+    def init_app(self, app):
+        config = app.config
+        cache_type = config.get('CACHE_TYPE', 'memory')
+        self.default_timeout = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+
+        if cache_type == 'redis':
+            self.backend = self._redis_backend(config.get('CACHE_REDIS_URL') or config.get('REDIS_URL'))
+        elif cache_type == 'null':
+            self.backend = NullCache()
+        else:
+            self.backend = MemoryCache(config.get('CACHE_MAX_ENTRIES', 1024))
+
+        app.extensions['cache'] = self
+        logger.info(f"Cache backend: {type(self.backend).__name__}")
+
+    def _redis_backend(self, url):
+        """Kết nối Redis; không được thì quay về MemoryCache thay vì làm hỏng request"""
+        try:
+            import redis
+            client = redis.Redis.from_url(url)
+            client.ping()
+            return RedisCache(client)
+        except Exception as e:
+            logger.warning(f"Không kết nối được Redis cache ({e}), dùng MemoryCache")
+            return MemoryCache()
+
+    # ---------- đọc / ghi ----------
+
+    def get(self, key, default=None):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Cache get lỗi ({key}): {e}")
+            value = _MISSING
+        family = key_family(key)
+        if value is _MISSING:
+            self._misses[family] += 1
+            return default
+        self._hits[family] += 1
+        return value
+
+    def set(self, key, value, timeout=None):
+        try:
+            self.backend.set(key, value, timeout or self.default_timeout)
+        except Exception as e:
+            logger.warning(f"Cache set lỗi ({key}): {e}")
+
+    def add(self, key, value, timeout=None):
+        """Ghi nếu khóa chưa có - dùng làm khóa "chỉ 1 tiến trình làm" (single-flight).
+
+        Backend lỗi -> coi như giành được khóa để hàm gọi vẫn tự làm việc của mình.
+        """
+        try:
+            return self.backend.add(key, value, timeout or self.default_timeout)
+        except Exception as e:
+            logger.warning(f"Cache add lỗi ({key}): {e}")
+            return True
+
+    def get_or_set(self, key, loader, timeout=None):
+        """Trả về giá trị trong cache, nếu không có thì gọi loader() và lưu lại"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, timeout)
+        return value
+
+    def cached(self, family, timeout=None):
+        """Decorator: cache kết quả hàm theo (họ khóa, tham số)"""
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args):
+                key = ':'.join([family, f.__name__] + [str(arg) for arg in args])
+                return self.get_or_set(key, lambda: f(*args), timeout)
+            return wrapper
+        return decorator
+
+    # ---------- xóa ----------
+
+    def delete(self, key):
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            logger.warning(f"Cache delete lỗi ({key}): {e}")
+
+    def invalidate(self, *families):
+        """Xóa toàn bộ khóa của các họ"""
+        for family in families:
+            try:
+                self.backend.delete_prefix(f'{family}:')
+            except Exception as e:
+                logger.warning(f"Cache invalidate lỗi ({family}): {e}")
+            self._invalidations[family] += 1
+
+    def invalidates(self, *families):
+        """Decorator cho route ghi dữ liệu: xóa các họ khóa sau khi view chạy xong (trừ GET).
+
+        Bổ sung cho sự kiện after_commit - bắt cả các thay đổi ghi bằng SQL thô.
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    if request.method not in ('GET', 'HEAD'):
+                        self.invalidate(*families)
+            return wrapper
+        return decorator
+
+    def clear(self):
+        self.backend.clear()
+
+    # ---------- thống kê ----------
+
+    def stats(self):
+        """{họ khóa: {'hits', 'misses', 'hit_rate', 'invalidations'}}"""
+        families = set(self._hits) | set(self._misses) | set(self._invalidations)
+        report = {}
+        for family in sorted(families):
+            hits, misses = self._hits[family], self._misses[family]
+            report[family] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+                'invalidations': self._invalidations[family]
+            }
+        return report
+
+    def reset_stats(self):
+        self._hits.clear()
+        self._misses.clear()
+        self._invalidations.clear()
+
+
+cache = Cache()
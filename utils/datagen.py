@@ -0,0 +1,462 @@
+"""
+Sinh bộ dữ liệu lớn, tái lập được (cùng seed -> cùng dữ liệu) để đo hiệu năng
+
+Chạy: flask generate-data --students 100000 --courses 2000 --semesters 8 --seed 42
+
+Khác với create_sample_data (vài dòng tạo tay qua ORM), mọi bảng được ghi bằng
+INSERT nhiều dòng (executemany) theo lô, id của các bảng cha được cấp trước từ MAX(id) + 1
+nên không cần đọc lại sau khi insert. Bộ đếm phi chuẩn hóa, GPA và thống kê điểm được tính
+lại 1 lần ở cuối bằng SystemSync.sync_all() thay vì theo từng dòng.
+"""
+import json
+import logging
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from models import (
+    db, User, UserRole, Student, Teacher, Class, Subject, Course, CourseRegistration,
+    Score, Attendance, Notification, SystemSync, PrerequisiteGraph,
+    student_class, teacher_subject
+)
+from utils import schedule as schedule_utils
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PASSWORD = 'password123'
+BASE_YEAR = 2020
+
+LAST_NAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng',
+              'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương', 'Lý']
+MIDDLE_NAMES = ['Văn', 'Thị', 'Hữu', 'Đức', 'Minh', 'Thanh', 'Ngọc', 'Quốc', 'Gia', 'Hoài',
+                'Thu', 'Xuân', 'Anh', 'Bảo']
+FIRST_NAMES = ['An', 'Bình', 'Châu', 'Dũng', 'Giang', 'Hà', 'Hải', 'Hạnh', 'Hiếu', 'Hoa',
+               'Huy', 'Khánh', 'Lan', 'Linh', 'Long', 'Mai', 'Nam', 'Nga', 'Phong', 'Phúc',
+               'Quân', 'Quỳnh', 'Sơn', 'Tâm', 'Thảo', 'Trang', 'Trung', 'Tuấn', 'Vy', 'Yến']
+
+DEPARTMENTS = {
+    'cntt': ['Lập trình', 'Cơ sở dữ liệu', 'Mạng máy tính', 'Hệ điều hành', 'Trí tuệ nhân tạo',
+             'Phát triển Web', 'An toàn thông tin', 'Kiến trúc máy tính'],
+    'kinhte': ['Kinh tế vi mô', 'Kinh tế vĩ mô', 'Kế toán', 'Tài chính doanh nghiệp', 'Marketing'],
+    'ngoaingu': ['Tiếng Anh', 'Ngữ pháp', 'Biên dịch', 'Phiên dịch', 'Văn hóa Anh - Mỹ'],
+    'toan': ['Giải tích', 'Đại số tuyến tính', 'Xác suất thống kê', 'Toán rời rạc', 'Tối ưu hóa'],
+}
+SUBJECT_TYPES = ['general', 'major', 'major', 'elective']
+POSITIONS = ['Giảng viên', 'Giảng viên chính', 'Phó giáo sư', 'Trợ giảng']
+QUALIFICATIONS = ['Thạc sĩ', 'Tiến sĩ', 'Cử nhân']
+BUILDINGS = ['A', 'B', 'C', 'D']
+
+# (category, priority, tiêu đề)
+NOTIFICATION_TEMPLATES = [
+    ('academic', 'normal', 'Điểm học phần đã được công bố'),
+    ('academic', 'high', 'Cảnh báo học vụ'),
+    ('deadline', 'high', 'Sắp hết hạn đăng ký học phần'),
+    ('system', 'low', 'Hệ thống bảo trì định kỳ'),
+    ('schedule', 'normal', 'Thay đổi lịch học'),
+]
+
+
+def semester_of(index):
+    """Chỉ số học kỳ (0, 1, 2, ...) -> (học kỳ 1/2, năm học 'YYYY-YYYY', ngày bắt đầu)"""
+    year = BASE_YEAR + index // 2
+    semester = index % 2 + 1
+    start = date(year, 9, 1) if semester == 1 else date(year + 1, 2, 1)
+    return semester, f'{year}-{year + 1}', start
+
+
+class DatasetGenerator:
+    """Sinh dữ liệu theo từng bảng; mỗi bảng được ghi theo lô batch_size dòng"""
+
+    def __init__(self, students=1000, courses=100, semesters=4, teachers=None, subjects=None,
+                 class_size=50, courses_per_semester=4, attendance_sessions=5,
+                 notifications_per_user=3, batch_size=5000, seed=42):
+        if semesters < 1 or students < 1 or courses < semesters:
+            raise ValueError('Cần ít nhất 1 sinh viên, 1 học kỳ và mỗi học kỳ ít nhất 1 khóa học')
+        self.n_students = students
+        self.n_courses = courses
+        self.n_semesters = semesters
+        self.n_teachers = teachers or max(5, courses // 10)
+        self.n_subjects = subjects or max(10, min(courses, courses // semesters * 2))
+        self.class_size = class_size
+        self.courses_per_semester = courses_per_semester
+        self.attendance_sessions = attendance_sessions
+        self.notifications_per_user = notifications_per_user
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+
+        self.counts = {}
+        self.timings = {}
+        # Băm mật khẩu 1 lần cho tất cả tài khoản sinh ra (băm từng tài khoản tốn hàng giờ)
+        self.password_hash = generate_password_hash(DEFAULT_PASSWORD)
+        self.now = datetime.utcnow()
+
+    # ---------- hạ tầng ghi theo lô ----------
+
+    def _next_id(self, model):
+        return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+    def _insert(self, table, rows):
+        """INSERT nhiều dòng (executemany), cộng dồn số dòng theo bảng"""
+        if not rows:
+            return
+        db.session.execute(table.insert(), rows)
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+
+    def _writer(self, table):
+        """Trả về (add, flush): add(row) gom dòng, tự ghi khi đủ batch_size"""
+        buffer = []
+
+        def add(row):
+            buffer.append(row)
+            if len(buffer) >= self.batch_size:
+                flush()
+
+        def flush():
+            self._insert(table, buffer)
+            buffer.clear()
+
+        return add, flush
+
+    def _timed(self, name, step):
+        started = time.perf_counter()
+        step()
+        db.session.commit()
+        self.timings[name] = round(time.perf_counter() - started, 2)
+        logger.info(f"datagen {name}: {self.timings[name]}s")
+
+    def _full_name(self):
+        return f'{self.rng.choice(LAST_NAMES)} {self.rng.choice(MIDDLE_NAMES)} {self.rng.choice(FIRST_NAMES)}'
+
+    def _user_row(self, user_id, prefix, role):
+        return {
+            'id': user_id,
+            'username': f'{prefix}{user_id}',
+            'email': f'{prefix}{user_id}@gen.school.edu.vn',
+            'password_hash': self.password_hash,
+            'role': role,
+            'full_name': self._full_name(),
+            'phone': f'09{self.rng.randrange(10 ** 8):08d}',
+            'is_active': self.rng.random() > 0.02,
+            'created_at': self.now - timedelta(days=self.rng.randrange(1, 365 * 4)),
+        }
+
+    # ---------- từng bảng ----------
+
+    def _generate_teachers(self):
+        user_id, teacher_id = self._next_id(User), self._next_id(Teacher)
+        departments = list(DEPARTMENTS)
+        users, teachers = [], []
+        self.teacher_ids = {department: [] for department in departments}
+
+        for i in range(self.n_teachers):
+            department = departments[i % len(departments)]
+            users.append(self._user_row(user_id + i, 'gen_gv', UserRole.TEACHER))
+            teachers.append({
+                'id': teacher_id + i,
+                'user_id': user_id + i,
+                'teacher_code': f'GGV{teacher_id + i:06d}',
+                'department': department,
+                'position': self.rng.choice(POSITIONS),
+                'qualification': self.rng.choice(QUALIFICATIONS),
+                'join_date': date(BASE_YEAR - self.rng.randrange(0, 15), 8, 1),
+                'status': 'active',
+            })
+            self.teacher_ids[department].append(teacher_id + i)
+
+        for start in range(0, len(users), self.batch_size):
+            self._insert(User.__table__, users[start:start + self.batch_size])
+            self._insert(Teacher.__table__, teachers[start:start + self.batch_size])
+
+    def _generate_subjects(self):
+        subject_id = self._next_id(Subject)
+        departments = list(DEPARTMENTS)
+        rows = []
+        self.subjects = []  # (id, department, credits)
+
+        for i in range(self.n_subjects):
+            department = departments[i % len(departments)]
+            topics = DEPARTMENTS[department]
+            k = i // len(departments)  # thứ tự của môn trong khoa
+            level = k // len(topics) + 1
+            name = f'{topics[k % len(topics)]} {level}'
+            credits = self.rng.choice([2, 3, 3, 4])
+            # Môn cấp > 1 cần môn cùng tên cấp trước -> đồ thị tiên quyết có chuỗi nhiều bậc
+            previous = (k - len(topics)) * len(departments) + i % len(departments)
+            prerequisites = json.dumps([subject_id + previous]) if level > 1 else None
+            rows.append({
+                'id': subject_id + i,
+                'subject_code': f'GS{subject_id + i:05d}',
+                'subject_name': name,
+                'credits': credits,
+                'department': department,
+                'type': self.rng.choice(SUBJECT_TYPES),
+                'semester': min(level, 8),
+                'prerequisites': prerequisites,
+            })
+            self.subjects.append((subject_id + i, department, credits))
+
+        self._insert(Subject.__table__, rows)
+
+    def _random_schedule(self):
+        """1-2 buổi/tuần, mỗi buổi 2-3 tiết bắt đầu ở tiết 1/4/7/10"""
+        mask = 0
+        for day in self.rng.sample(range(len(schedule_utils.DAY_CODES)), self.rng.choice([1, 1, 2])):
+            start = self.rng.choice([1, 4, 7, 10])
+            mask |= schedule_utils.period_range_mask(day, start, start + self.rng.choice([1, 2]))
+        return mask
+
+    def _generate_courses(self):
+        course_id = self._next_id(Course)
+        rows, pairs = [], set()
+        self.courses_by_semester = [[] for _ in range(self.n_semesters)]  # [(id, mask)]
+
+        for i in range(self.n_courses):
+            index = i % self.n_semesters
+            semester, year, start = semester_of(index)
+            subject_id, department, _ = self.rng.choice(self.subjects)
+            teacher_id = self.rng.choice(self.teacher_ids[department])
+            mask = self._random_schedule()
+            is_current = index == self.n_semesters - 1
+            rows.append({
+                'id': course_id + i,
+                'course_code': f'GC{course_id + i:06d}',
+                'subject_id': subject_id,
+                'teacher_id': teacher_id,
+                'semester': semester,
+                'year': year,
+                'max_students': self.rng.choice([40, 60, 80, 120]),
+                'current_students': 0,
+                'room': f'{self.rng.choice(BUILDINGS)}{self.rng.randrange(1, 6)}{self.rng.randrange(1, 20):02d}',
+                'schedule': schedule_utils.format_mask(mask),
+                'schedule_mask': schedule_utils.mask_to_hex(mask),
+                'start_date': start,
+                'end_date': start + timedelta(weeks=15),
+                'status': 'active' if is_current else 'completed',
+                'total_registrations_count': 0,
+                'approved_registrations_count': 0,
+            })
+            pairs.add((teacher_id, subject_id))
+            self.courses_by_semester[index].append((course_id + i, mask))
+
+        for start in range(0, len(rows), self.batch_size):
+            self._insert(Course.__table__, rows[start:start + self.batch_size])
+        self._insert(teacher_subject, [
+            {'teacher_id': teacher_id, 'subject_id': subject_id, 'assigned_at': self.now}
+            for teacher_id, subject_id in sorted(pairs)
+        ])
+
+    def _generate_students(self):
+        """Sinh viên chia đều theo khóa (mỗi năm học 1 khóa), mỗi khóa chia lớp class_size người"""
+        user_id, student_id, class_id = self._next_id(User), self._next_id(Student), self._next_id(Class)
+        cohorts = max(1, (self.n_semesters + 1) // 2)
+        departments = list(DEPARTMENTS)
+
+        # 1. Lớp của từng khóa (ghi trước vì student_class tham chiếu tới)
+        cohort_of = [i * cohorts // self.n_students for i in range(self.n_students)]
+        cohort_first = {}
+        for i, cohort in enumerate(cohort_of):
+            cohort_first.setdefault(cohort, i)
+
+        classes, class_of = [], {}
+        for i, cohort in enumerate(cohort_of):
+            position = i - cohort_first[cohort]
+            if position % self.class_size == 0:
+                department = departments[len(classes) % len(departments)]
+                classes.append({
+                    'id': class_id + len(classes),
+                    'class_code': f'GL{class_id + len(classes):05d}',
+                    'class_name': f'{department.upper()}{BASE_YEAR + cohort}-{position // self.class_size + 1}',
+                    'course': f'K{BASE_YEAR + cohort}',
+                    'faculty': department,
+                    'teacher_id': self.rng.choice(self.teacher_ids[department]),
+                    'max_students': self.class_size,
+                    'current_students': 0,
+                    'status': 'active',
+                    'created_at': datetime(BASE_YEAR + cohort, 8, 15),
+                })
+            class_of[i] = classes[-1]['id']
+        for start in range(0, len(classes), self.batch_size):
+            self._insert(Class.__table__, classes[start:start + self.batch_size])
+
+        # 2. User -> Student -> student_class (các bộ đệm đầy cùng lúc nên luôn ghi đúng thứ tự khóa ngoại)
+        add_user, flush_users = self._writer(User.__table__)
+        add_student, flush_students = self._writer(Student.__table__)
+        add_link, flush_links = self._writer(student_class)
+        self.student_cohorts = []  # (student id, user id, học kỳ nhập học)
+
+        for i, cohort in enumerate(cohort_of):
+            user = self._user_row(user_id + i, 'gen_sv', UserRole.STUDENT)
+            user['created_at'] = datetime(BASE_YEAR + cohort, 8, 20)
+            add_user(user)
+            add_student({
+                'id': student_id + i,
+                'user_id': user_id + i,
+                'student_id': f'G{student_id + i:08d}',
+                'course': f'K{BASE_YEAR + cohort}',
+                'birth_date': date(BASE_YEAR + cohort - 18, self.rng.randrange(1, 13), self.rng.randrange(1, 29)),
+                'gender': self.rng.choice(['Nam', 'Nữ']),
+                'enrollment_date': date(BASE_YEAR + cohort, 9, 1),
+                'status': 'active' if self.rng.random() > 0.03 else self.rng.choice(['inactive', 'warning']),
+                'gpa': 0.0,
+                'total_credits': 0,
+                'completed_credits': 0,
+                'gpa_weighted_sum': 0.0,
+            })
+            add_link({
+                'student_id': student_id + i,
+                'class_id': class_of[i],
+                'joined_at': datetime(BASE_YEAR + cohort, 9, 1),
+                'is_active': True,
+            })
+            self.student_cohorts.append((student_id + i, user_id + i, cohort * 2))
+
+        flush_users()
+        flush_students()
+        flush_links()
+
+    def _pick_courses(self, offered):
+        """Chọn tối đa courses_per_semester khóa không trùng lịch (so khớp bitmask)"""
+        chosen, occupied = [], 0
+        attempts = 0
+        while len(chosen) < self.courses_per_semester and attempts < self.courses_per_semester * 3:
+            attempts += 1
+            course_id, mask = offered[self.rng.randrange(len(offered))]
+            if mask & occupied or course_id in chosen:
+                continue
+            chosen.append(course_id)
+            occupied |= mask
+        return chosen
+
+    def _generate_enrollments(self):
+        """Đăng ký học phần + điểm (học kỳ đã qua) + điểm danh (học kỳ hiện tại)"""
+        add_registration, flush_registrations = self._writer(CourseRegistration.__table__)
+        add_attendance, flush_attendances = self._writer(Attendance.__table__)
+        current = self.n_semesters - 1
+        _, _, current_start = semester_of(current)
+        pending_scores = []
+
+        def flush_scores():
+            if not pending_scores:
+                return
+            finals, grades = Score.compute_final_scores(
+                [row['process_score'] for row in pending_scores],
+                [row['exam_score'] for row in pending_scores]
+            )
+            for row, final_score, grade in zip(pending_scores, finals, grades):
+                row['final_score'], row['grade'] = final_score, grade
+            self._insert(Score.__table__, pending_scores)
+            pending_scores.clear()
+
+        for student_id, _, first_semester in self.student_cohorts:
+            for index in range(first_semester, self.n_semesters):
+                offered = self.courses_by_semester[index]
+                _, _, start = semester_of(index)
+                for course_id in self._pick_courses(offered):
+                    roll = self.rng.random()
+                    if index < current:
+                        status = 'approved' if roll < 0.97 else 'cancelled'
+                    else:
+                        status = 'approved' if roll < 0.8 else ('pending' if roll < 0.95 else 'rejected')
+                    add_registration({
+                        'student_id': student_id,
+                        'course_id': course_id,
+                        'registration_date': datetime.combine(start, datetime.min.time()) - timedelta(
+                            days=self.rng.randrange(1, 21), minutes=self.rng.randrange(24 * 60)
+                        ),
+                        'status': status,
+                    })
+                    if status != 'approved':
+                        continue
+
+                    # Học kỳ đã qua: điểm đã công bố; học kỳ hiện tại: 1 phần có điểm quá trình (nháp)
+                    ability = self.rng.gauss(6.8, 1.5)
+                    if index < current:
+                        pending_scores.append(self._score_row(student_id, course_id, ability, True))
+                    elif self.rng.random() < 0.3:
+                        pending_scores.append(self._score_row(student_id, course_id, ability, False))
+                    if len(pending_scores) >= self.batch_size:
+                        flush_scores()
+
+                    if index == current:
+                        for session in range(1, self.attendance_sessions + 1):
+                            roll = self.rng.random()
+                            add_attendance({
+                                'student_id': student_id,
+                                'course_id': course_id,
+                                'date': current_start + timedelta(weeks=session - 1),
+                                'session': session,
+                                'status': 'present' if roll < 0.85 else (
+                                    'late' if roll < 0.92 else ('absent' if roll < 0.98 else 'excused')
+                                ),
+                            })
+
+        flush_registrations()
+        flush_scores()
+        flush_attendances()
+
+    def _score_row(self, student_id, course_id, ability, published):
+        def clamp(value):
+            return round(min(10.0, max(0.0, value)) * 4) / 4
+
+        return {
+            'student_id': student_id,
+            'course_id': course_id,
+            'process_score': clamp(ability + self.rng.gauss(0.5, 1.0)),
+            'exam_score': clamp(ability + self.rng.gauss(0, 1.5)) if published else None,
+            'status': 'published' if published else 'draft',
+            'updated_at': self.now,
+        }
+
+    def _generate_notifications(self):
+        add, flush = self._writer(Notification.__table__)
+        user_ids = [user_id for _, user_id, _ in self.student_cohorts]
+        for user_id in user_ids:
+            for _ in range(self.rng.randrange(self.notifications_per_user * 2 + 1)):
+                category, priority, title = self.rng.choice(NOTIFICATION_TEMPLATES)
+                created_at = self.now - timedelta(minutes=self.rng.randrange(90 * 24 * 60))
+                add({
+                    'user_id': user_id,
+                    'title': title,
+                    'message': f'{title}. Vui lòng kiểm tra chi tiết trên hệ thống.',
+                    'category': category,
+                    'priority': priority,
+                    'is_read': self.rng.random() < 0.6,
+                    'created_at': created_at,
+                    'expires_at': created_at + timedelta(days=30),
+                })
+        flush()
+
+    def _rebuild_aggregates(self):
+        """Bộ đếm, GPA và thống kê điểm được bỏ qua khi insert hàng loạt -> tính lại 1 lần bằng GROUP BY"""
+        SystemSync.sync_all()
+        PrerequisiteGraph.invalidate()
+        cache.invalidate('subjects', 'teachers', 'classes', 'departments', 'versions')
+
+    def run(self):
+        """Sinh toàn bộ dữ liệu. Trả về {'counts': {bảng: số dòng}, 'timings': {bước: giây}, 'elapsed'}"""
+        started = time.perf_counter()
+        try:
+            self._timed('teachers', self._generate_teachers)
+            self._timed('subjects', self._generate_subjects)
+            self._timed('courses', self._generate_courses)
+            self._timed('students', self._generate_students)
+            self._timed('enrollments', self._generate_enrollments)
+            self._timed('notifications', self._generate_notifications)
+            self._timed('aggregates', self._rebuild_aggregates)
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {
+            'counts': self.counts,
+            'timings': self.timings,
+            'elapsed': round(time.perf_counter() - started, 2)
+        }
+
+
+def generate_dataset(**options):
+    """Sinh bộ dữ liệu lớn (xem DatasetGenerator để biết các tham số)"""
+    return DatasetGenerator(**options).run()
@@ -0,0 +1,127 @@
+"""
+Các tập dữ liệu export cho công cụ xử lý dữ liệu (CSV / NDJSON)
+
+Mỗi tập là 1 câu select chỉ gồm các cột cần xuất (không dựng đối tượng ORM), đọc theo lô bằng
+yield_per. Giá trị giữ dạng thô để máy đọc: khóa tiếng Anh ổn định, null thay cho 'N/A',
+ngày giờ ISO 8601, enum -> giá trị. Route: /admin/export/<tập>.<csv|ndjson> (GET: stream trực
+tiếp, POST: job nền qua utils/export_jobs.py, thêm định dạng xlsx).
+"""
+import enum
+from datetime import date, datetime
+
+from sqlalchemy import func
+
+from models import db, User, Student, Course, Subject, CourseRegistration, Score
+from utils.export_jobs import export_jobs, ExportFile
+from utils.export_stream import (DEFAULT_CHUNK_SIZE, CSV_MIMETYPE, NDJSON_MIMETYPE, XLSX_MIMETYPE,
+                                 iter_partitions, iter_csv, iter_ndjson, XlsxStreamWriter)
+
+
+def _converter(column):
+    """Hàm chuyển giá trị của 1 cột sang dạng thô (None nếu giữ nguyên)"""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+    if issubclass(python_type, enum.Enum):
+        return lambda value: value.value if value is not None else None
+    if issubclass(python_type, (date, datetime)):
+        return lambda value: value.isoformat() if value is not None else None
+    return None
+
+
+class ExportDataset:
+    """1 tập dữ liệu export: khóa cột + câu select.
+
+    Mọi cột (kể cả cột gộp như tên lớp) nằm trong chính câu select: khi đang stream bằng yield_per
+    không được chạy truy vấn khác trên cùng kết nối (pymysql sẽ bỏ dở result set đang đọc).
+    """
+
+    def __init__(self, name, statement):
+        self.name = name
+        self._statement = statement
+
+    def statement(self):
+        return self._statement()
+
+    @property
+    def keys(self):
+        return [column.key for column in self.statement().selected_columns]
+
+    def count(self, session):
+        statement = self.statement().order_by(None)
+        return session.execute(db.select(func.count()).select_from(statement.subquery())).scalar()
+
+    def batches(self, session, size=DEFAULT_CHUNK_SIZE):
+        """Các lô dòng (list các tuple/list giá trị) theo thứ tự của keys"""
+        statement = self.statement()
+        converters = [(index, convert) for index, convert in
+                      enumerate(map(_converter, statement.selected_columns)) if convert]
+        for rows in iter_partitions(session, statement, size):
+            if converters:
+                converted = []
+                for row in rows:
+                    values = list(row)
+                    for index, convert in converters:
+                        values[index] = convert(values[index])
+                    converted.append(values)
+                yield converted
+            else:
+                yield rows
+
+
+DATASETS = {
+    'students': ExportDataset('students', lambda: db.select(
+        Student.id, Student.student_id.label('student_code'), User.full_name, User.email, User.phone,
+        Student.course.label('cohort'), Student.gender, Student.birth_date, Student.enrollment_date,
+        Student.status, Student.gpa, Student.total_credits, Student.completed_credits,
+        Student.class_names_column('; ').label('classes')
+    ).join(User, Student.user_id == User.id).order_by(Student.id)),
+
+    'registrations': ExportDataset('registrations', lambda: db.select(
+        CourseRegistration.id, Student.student_id.label('student_code'), User.full_name,
+        Course.course_code, Course.semester, Course.year, CourseRegistration.status,
+        CourseRegistration.registration_date, CourseRegistration.notes
+    ).join(Student, CourseRegistration.student_id == Student.id).join(
+        User, Student.user_id == User.id
+    ).join(Course, CourseRegistration.course_id == Course.id).order_by(CourseRegistration.id)),
+
+    'scores': ExportDataset('scores', lambda: db.select(
+        Score.id, Student.student_id.label('student_code'), User.full_name, Course.course_code,
+        Subject.subject_code, Subject.credits, Course.semester, Course.year, Score.process_score,
+        Score.exam_score, Score.final_score, Score.grade, Score.status, Score.updated_at
+    ).join(Student, Score.student_id == Student.id).join(User, Student.user_id == User.id).join(
+        Course, Score.course_id == Course.id
+    ).join(Subject, Course.subject_id == Subject.id).order_by(Score.id)),
+
+    'users': ExportDataset('users', lambda: db.select(
+        User.id, User.username, User.full_name, User.email, User.phone, User.role, User.is_active,
+        User.created_at, User.last_login
+    ).order_by(User.id)),
+}
+
+
+FORMATS = {
+    'csv': (CSV_MIMETYPE, iter_csv),
+    'ndjson': (NDJSON_MIMETYPE, iter_ndjson),
+    'xlsx': (XLSX_MIMETYPE, lambda keys, batches: XlsxStreamWriter('data', keys).iter_bytes(batches)),
+}
+
+
+@export_jobs.task('dataset')
+def export_dataset_file(dataset, fmt, progress=None):
+    """Job nền: ghi cả tập dữ liệu ra file theo từng lô, báo tiến độ theo số dòng"""
+    export = DATASETS[dataset]
+    mimetype, writer = FORMATS[fmt]
+    total = export.count(db.session)
+
+    def batches():
+        done = 0
+        for batch in export.batches(db.session):
+            yield batch
+            done += len(batch)
+            if progress:
+                progress(done, total, f'{done}/{total} dòng')
+
+    filename = f"{export.name}_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}"
+    return ExportFile(filename, mimetype, writer(export.keys, batches()))
@@ -0,0 +1,336 @@
+"""
+Hàng đợi export chạy nền: bảng export_jobs + tác vụ nền của Socket.IO + tiến độ qua Socket.IO
+
+Các export PDF / Excel lớn chạy ngay trong request giữ 1 worker eventlet trong nhiều giây. Ở đây
+route chỉ ghi 1 dòng ExportJob rồi trả về ngay mã job (HTTP 202); task chạy bằng
+socketio.start_background_task (green thread của eventlet, tối đa EXPORT_JOB_WORKERS job cùng lúc,
+job dư chờ trong hàng đợi của tiến trình), báo tiến độ bằng sự kiện 'export_job' tới phòng
+user_<id> và ghi file kết quả vào EXPORT_JOB_DIR. Client vào phòng user_<id> khi kết nối
+(notifications/websocket_handler.handle_connect, cùng instance SocketIO được init_app trong app).
+Job chạy trên hub của Socket.IO nên emit an toàn (không emit từ luồng hệ điều hành khi app không
+monkey_patch); phần render PDF nặng CPU đã nằm trong pool tiến trình của pdf_render.
+File được tải qua /exports/jobs/<id>/download tới hết EXPORT_JOB_TTL giây, sau đó cleanup() xóa
+file và chuyển job sang 'expired'.
+
+Đăng ký task:
+
+    @export_jobs.task('teachers_pdf')
+    def teachers_pdf(progress=None, **params):
+        ...
+        return ExportFile(filename, mimetype, data)   # data: bytes hoặc iterable các đoạn bytes
+
+Trạng thái job được ghi bằng kết nối riêng (db.engine.begin()) nên không commit / expire các
+đối tượng mà task đang dùng trong db.session. Job đang chạy khi tiến trình dừng không được chạy
+lại (hàng đợi cục bộ) - cleanup() đánh dấu 'failed' sau EXPORT_JOB_TIMEOUT giây.
+
+Dọn file: tự chạy nền tối đa 1 lần / EXPORT_JOB_CLEANUP_INTERVAL giây khi có job mới,
+hoặc `flask cleanup-exports`.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app, has_request_context, url_for
+
+from models import db, ExportJob
+
+logger = logging.getLogger(__name__)
+
+# Kết quả của 1 task export
+ExportFile = namedtuple('ExportFile', ['filename', 'mimetype', 'data'])
+
+
+class ExportJobLimitError(Exception):
+    """Người dùng đã có quá nhiều job đang chờ / đang chạy"""
+
+
+class _Progress:
+    """Hàm báo tiến độ truyền cho task: progress(đã xong, tổng, thông báo)"""
+
+    MIN_INTERVAL = 0.5  # giây giữa 2 lần ghi / đẩy tiến độ
+
+    def __init__(self, queue, job_id, user_id, download_url):
+        self._queue = queue
+        self._job_id = job_id
+        self._user_id = user_id
+        self._download_url = download_url
+        self._percent = 0
+        self._reported_at = 0.0
+
+    def __call__(self, done, total=None, message=None):
+        if total:
+            percent = int(min(max(done / total, 0), 1) * 100)
+        else:
+            percent = int(min(max(done, 0), 100))
+        percent = min(percent, 99)  # 100% chỉ khi file đã ghi xong
+        now = time.monotonic()
+        if percent <= self._percent and not message:
+            return
+        if now - self._reported_at < self.MIN_INTERVAL and percent - self._percent < 10:
+            return
+        self._percent, self._reported_at = max(percent, self._percent), now
+        values = {'progress': self._percent}
+        if message:
+            values['message'] = message[:255]
+        self._queue._update(self._job_id, self._user_id, self._download_url, **values)
+
+
+class ExportJobQueue:
+    """Đăng ký task export và chạy chúng bằng tác vụ nền của Socket.IO trong tiến trình"""
+
+    def __init__(self):
+        self._tasks = {}
+        self._pending = deque()  # (app, job_id, download_url) chờ tới lượt chạy
+        self._running = 0
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    def init_app(self, app):
+        app.config.setdefault('EXPORT_JOB_WORKERS', 2)
+        if not app.config.get('EXPORT_JOB_DIR'):
+            app.config['EXPORT_JOB_DIR'] = os.path.join(app.instance_path, 'exports')
+        app.config.setdefault('EXPORT_JOB_TTL', 24 * 3600)
+        app.config.setdefault('EXPORT_JOB_TIMEOUT', 3600)
+        app.config.setdefault('EXPORT_JOB_MAX_ACTIVE', 3)
+        app.config.setdefault('EXPORT_JOB_CLEANUP_INTERVAL', 600)
+        app.extensions['export_jobs'] = self
+
+    # ---------- đăng ký ----------
+
+    def task(self, kind):
+        """Decorator đăng ký hàm export: fn(progress=None, **params) -> ExportFile"""
+        def decorator(fn):
+            self._tasks[kind] = fn
+            return fn
+        return decorator
+
+    @property
+    def kinds(self):
+        return sorted(self._tasks)
+
+    def run(self, kind, params=None):
+        """Chạy task ngay trong luồng hiện tại (route tải trực tiếp) -> ExportFile"""
+        return self._tasks[kind](**(params or {}))
+
+    # ---------- gửi job ----------
+
+    @staticmethod
+    def _get_socketio(app):
+        """SocketIO của app nếu chạy nền được (EXPORT_JOB_WORKERS > 0), ngược lại None"""
+        if app.config['EXPORT_JOB_WORKERS'] <= 0:
+            return None
+        return app.extensions.get('socketio')
+
+    def _dispatch(self, app):
+        """Khởi chạy các job đang chờ cho tới khi đủ EXPORT_JOB_WORKERS job đang chạy"""
+        socketio = app.extensions['socketio']
+        while True:
+            with self._lock:
+                if not self._pending or self._running >= app.config['EXPORT_JOB_WORKERS']:
+                    return
+                item = self._pending.popleft()
+                self._running += 1
+            socketio.start_background_task(self._run_queued, *item)
+
+    def _run_queued(self, app, job_id, download_url):
+        try:
+            self._run(app, job_id, download_url)
+        except Exception as e:
+            logger.error(f"Export job {job_id} crashed: {e}")
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._dispatch(app)
+
+    def submit(self, kind, user_id, params=None):
+        """Tạo job (commit ngay) và đưa vào hàng đợi chạy nền. Trả về ExportJob.
+
+        EXPORT_JOB_WORKERS = 0: chạy luôn trong luồng hiện tại (test / CLI).
+        """
+        if kind not in self._tasks:
+            raise KeyError(f"Chưa đăng ký task export '{kind}'")
+        app = current_app._get_current_object()
+        active = ExportJob.query.filter(
+            ExportJob.user_id == user_id, ExportJob.status.in_(ExportJob.ACTIVE_STATUSES)
+        ).count()
+        if active >= app.config['EXPORT_JOB_MAX_ACTIVE']:
+            raise ExportJobLimitError(f"Bạn đang có {active} file đang xuất, vui lòng chờ hoàn thành")
+
+        job = ExportJob(id=uuid.uuid4().hex, user_id=user_id, kind=kind,
+                        params=json.dumps(params or {}, ensure_ascii=False, default=str),
+                        status='queued', progress=0, message='Đang chờ xử lý')
+        db.session.add(job)
+        db.session.commit()
+
+        download_url = self.download_url(job.id)
+        if self._get_socketio(app) is None:
+            self._run(app, job.id, download_url)
+            db.session.refresh(job)
+        else:
+            self._emit(app, user_id, job.to_dict(download_url))
+            with self._lock:
+                self._pending.append((app, job.id, download_url))
+            self._dispatch(app)
+            self.maybe_cleanup(app)
+        return job
+
+    @staticmethod
+    def download_url(job_id):
+        if has_request_context():
+            return url_for('export_job_download', job_id=job_id)
+        return f'/exports/jobs/{job_id}/download'
+
+    # ---------- chạy job ----------
+
+    def file_path(self, job_id, app=None):
+        return os.path.join((app or current_app).config['EXPORT_JOB_DIR'], job_id)
+
+    def _run(self, app, job_id, download_url):
+        with app.app_context():
+            job = db.session.get(ExportJob, job_id)
+            if job is None or job.status != 'queued':
+                return
+            user_id, kind = job.user_id, job.kind
+            params = json.loads(job.params or '{}')
+            db.session.rollback()  # không giữ transaction đọc trong lúc task chạy
+
+            self._update(job_id, user_id, download_url, status='running', started_at=datetime.utcnow(),
+                         progress=1, message='Đang xử lý')
+            path = self.file_path(job_id, app)
+            started = time.perf_counter()
+            try:
+                result = self._tasks[kind](progress=_Progress(self, job_id, user_id, download_url), **params)
+                size = self._write(path, result.data)
+            except Exception as e:
+                logger.error(f"Export job {job_id} ({kind}) failed: {e}")
+                db.session.rollback()
+                if os.path.exists(path + '.part'):
+                    os.remove(path + '.part')
+                self._update(job_id, user_id, download_url, status='failed', finished_at=datetime.utcnow(),
+                             expires_at=datetime.utcnow() + timedelta(seconds=app.config['EXPORT_JOB_TTL']),
+                             message='Xuất file thất bại', error=str(e)[:2000])
+                return
+
+            finished = datetime.utcnow()
+            self._update(job_id, user_id, download_url, status='done', progress=100, finished_at=finished,
+                         expires_at=finished + timedelta(seconds=app.config['EXPORT_JOB_TTL']),
+                         filename=result.filename, mimetype=result.mimetype, size=size,
+                         message='Đã xuất xong')
+            logger.info(f"Export job {job_id} ({kind}) done: {size} bytes in "
+                        f"{time.perf_counter() - started:.2f}s")
+
+    @staticmethod
+    def _write(path, data):
+        """Ghi file kết quả (bytes hoặc các đoạn bytes) qua file tạm -> không ai tải được file dở dang"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = 0
+        with open(path + '.part', 'wb') as output:
+            chunks = (data,) if isinstance(data, (bytes, bytearray)) else data
+            for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        os.replace(path + '.part', path)
+        return size
+
+    def _update(self, job_id, user_id, download_url, **values):
+        """Ghi trạng thái job (kết nối riêng, commit ngay) rồi đẩy tới phòng user_<id>"""
+        table = ExportJob.__table__
+        with db.engine.begin() as connection:
+            connection.execute(table.update().where(table.c.id == job_id).values(**values))
+            row = connection.execute(table.select().where(table.c.id == job_id)).mappings().first()
+        if row is not None:
+            self._emit(current_app, user_id, ExportJob(**row).to_dict(download_url))
+
+    @staticmethod
+    def _emit(app, user_id, payload):
+        socketio = app.extensions.get('socketio')
+        if socketio is None:
+            return
+        try:
+            socketio.emit('export_job', payload, room=f'user_{user_id}')
+        except Exception as e:
+            # Client vẫn hỏi được trạng thái qua /exports/jobs/<id>
+            logger.debug(f"Skip export_job push for user {user_id}: {e}")
+
+    # ---------- dọn dẹp ----------
+
+    def maybe_cleanup(self, app):
+        """Chạy cleanup() trong tác vụ nền nếu lần dọn trước đã quá EXPORT_JOB_CLEANUP_INTERVAL giây"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_cleanup < app.config['EXPORT_JOB_CLEANUP_INTERVAL']:
+                return
+            self._last_cleanup = now
+        socketio = self._get_socketio(app)
+        if socketio is not None:
+            socketio.start_background_task(self._cleanup_in_context, app)
+
+    def _cleanup_in_context(self, app):
+        with app.app_context():
+            try:
+                self.cleanup()
+            except Exception as e:
+                logger.error(f"Export job cleanup failed: {e}")
+
+    def cleanup(self, now=None):
+        """Xóa file hết hạn, đánh dấu job treo là 'failed', xóa file mồ côi.
+
+        Trả về {'expired', 'interrupted', 'orphans'}.
+        """
+        app = current_app
+        now = now or datetime.utcnow()
+        table = ExportJob.__table__
+        directory = app.config['EXPORT_JOB_DIR']
+
+        with db.engine.begin() as connection:
+            expired_ids = [row.id for row in connection.execute(db.select(table.c.id).where(
+                table.c.status.in_(('done', 'failed')), table.c.expires_at < now
+            ))]
+            for start in range(0, len(expired_ids), 500):
+                chunk = expired_ids[start:start + 500]
+                connection.execute(table.update().where(table.c.id.in_(chunk)).values(status='expired'))
+            interrupted = connection.execute(table.update().where(
+                table.c.status.in_(ExportJob.ACTIVE_STATUSES),
+                table.c.created_at < now - timedelta(seconds=app.config['EXPORT_JOB_TIMEOUT'])
+            ).values(status='failed', finished_at=now, message='Quá thời gian xử lý',
+                     expires_at=now + timedelta(seconds=app.config['EXPORT_JOB_TTL']))).rowcount
+
+        for job_id in expired_ids:
+            self._remove(os.path.join(directory, job_id))
+
+        # File không còn dòng job tương ứng (bảng bị dọn tay, .part của tiến trình đã dừng)
+        orphans = 0
+        if os.path.isdir(directory):
+            cutoff = time.time() - app.config['EXPORT_JOB_TTL']
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if os.path.getmtime(path) < cutoff:
+                    job = db.session.get(ExportJob, name.split('.')[0])
+                    if job is None or job.status != 'done':
+                        self._remove(path)
+                        orphans += 1
+            db.session.rollback()
+
+        if expired_ids or interrupted or orphans:
+            logger.info(f"Export cleanup: {len(expired_ids)} expired, {interrupted} interrupted, "
+                        f"{orphans} orphan files")
+        return {'expired': len(expired_ids), 'interrupted': interrupted, 'orphans': orphans}
+
+    @staticmethod
+    def _remove(path):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Không xóa được file export {path}: {e}")
+
+
+export_jobs = ExportJobQueue()
@@ -0,0 +1,281 @@
+"""
+Các báo cáo PDF danh sách (giáo viên, môn học, lớp / sinh viên của giáo viên)
+
+Mỗi báo cáo là 1 hàm nhận tham số thuần (không đọc request / current_user) và trả về ExportFile,
+nên cùng 1 hàm được dùng cho cả route tải trực tiếp (GET) lẫn job chạy nền (POST -> export_jobs).
+progress(đã xong, tổng, thông báo) là tùy chọn - chỉ job nền truyền vào.
+"""
+from datetime import datetime
+
+from models import db, User, Teacher, Student, Subject, Course, Class, ClassCourse, CourseRegistration, CourseScoreStats
+from utils.export_jobs import export_jobs, ExportFile
+from utils.pdf_render import pdf_renderer
+from utils import pdf_generator  # đăng ký các hàm render (render_table, ...) với pdf_renderer
+
+PDF_MIMETYPE = 'application/pdf'
+
+
+def _noop_progress(done, total=None, message=None):
+    pass
+
+
+def render_table_pdf(title, info, data, col_widths, striped=False, encoding=None):
+    """PDF 1 bảng: tiêu đề + dòng thông tin + bảng (dòng đầu là header) -> bytes.
+
+    Render trong pool tiến trình (utils/pdf_render.py), tiến trình web chỉ chờ cộng tác.
+    """
+    return pdf_renderer.render('table', {
+        'title': title, 'info': info, 'rows': data, 'col_widths': col_widths,
+        'striped': striped, 'encoding': encoding
+    })
+
+
+def _timestamp():
+    return datetime.now().strftime("%Y%m%d_%H%M")
+
+
+# ======== ADMIN ========
+
+@export_jobs.task('teachers_pdf')
+def teachers_pdf(search='', department='', status='', progress=None):
+    """Danh sách giáo viên theo bộ lọc của trang quản lý giáo viên"""
+    progress = progress or _noop_progress
+    query = Teacher.query.options(db.joinedload(Teacher.user), db.selectinload(Teacher.assigned_subjects))
+
+    if search:
+        query = query.join(User).filter(
+            db.or_(
+                User.full_name.ilike(f'%{search}%'),
+                Teacher.teacher_code.ilike(f'%{search}%'),
+                User.email.ilike(f'%{search}%')
+            )
+        )
+
+    if department:
+        query = query.filter(Teacher.department == department)
+
+    if status:
+        query = query.filter(Teacher.status == status)
+
+    teachers = query.all()
+    progress(20, message=f'Đã tải {len(teachers)} giáo viên')
+
+    status_map = {
+        'active': 'Đang làm việc',
+        'busy': 'Bận',
+        'inactive': 'Nghỉ việc'
+    }
+    data = [['STT', 'Mã GV', 'Họ tên', 'Bộ môn', 'Môn phụ trách', 'Trạng thái', 'Email']]
+    for i, teacher in enumerate(teachers, 1):
+        subjects = ", ".join([subj.subject_name for subj in teacher.assigned_subjects[:3]])
+        if len(teacher.assigned_subjects) > 3:
+            subjects += f" (+{len(teacher.assigned_subjects) - 3})"
+
+        data.append([
+            str(i),
+            teacher.teacher_code,
+            teacher.full_name,
+            teacher.department_display,
+            subjects or 'Chưa phân công',
+            status_map.get(teacher.status, teacher.status),
+            teacher.user.email
+        ])
+    progress(50, message='Đang tạo file PDF')
+
+    pdf = render_table_pdf(
+        "DANH SÁCH GIÁO VIÊN",
+        f"Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')} | Tổng số: {len(teachers)} giáo viên",
+        data, [30, 60, 100, 80, 120, 70, 120], striped=True, encoding='utf-8'
+    )
+    return ExportFile(f'danh_sach_giao_vien_{_timestamp()}.pdf', PDF_MIMETYPE, pdf)
+
+
+@export_jobs.task('subjects_pdf')
+def subjects_pdf(search='', department='', type='', semester='', progress=None):
+    """Danh sách môn học theo bộ lọc của trang quản lý môn học"""
+    progress = progress or _noop_progress
+    query = Subject.query.options(db.selectinload(Subject.courses))
+
+    if search:
+        query = query.filter(
+            db.or_(
+                Subject.subject_name.ilike(f'%{search}%'),
+                Subject.subject_code.ilike(f'%{search}%')
+            )
+        )
+
+    if department:
+        query = query.filter(Subject.department == department)
+
+    if type:
+        query = query.filter(Subject.type == type)
+
+    if semester:
+        query = query.filter(Subject.semester == int(semester))
+
+    subjects = query.all()
+    progress(20, message=f'Đã tải {len(subjects)} môn học')
+
+    type_map = {
+        'general': 'Đại cương',
+        'major': 'Chuyên ngành',
+        'elective': 'Tự chọn'
+    }
+    data = [['STT', 'Mã MH', 'Tên môn học', 'Tín chỉ', 'Bộ môn', 'Loại', 'HK', 'Số GV']]
+    for i, subject in enumerate(subjects, 1):
+        teacher_count = len({course.teacher_id for course in subject.courses if course.teacher_id})
+        data.append([
+            str(i),
+            subject.subject_code,
+            subject.subject_name,
+            str(subject.credits),
+            subject.department_name,
+            type_map.get(subject.type, subject.type),
+            str(subject.semester),
+            str(teacher_count)
+        ])
+    progress(50, message='Đang tạo file PDF')
+
+    pdf = render_table_pdf(
+        "DANH SÁCH MÔN HỌC",
+        f"Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')} | Tổng số: {len(subjects)} môn học",
+        data, [30, 60, 150, 40, 80, 70, 30, 40], striped=True, encoding='utf-8'
+    )
+    return ExportFile(f'danh_sach_mon_hoc_{_timestamp()}.pdf', PDF_MIMETYPE, pdf)
+
+
+# ======== GIÁO VIÊN ========
+
+@export_jobs.task('teacher_classes_pdf')
+def teacher_classes_pdf(teacher_id, teacher_name, progress=None):
+    """Các lớp có khóa học do giáo viên dạy, kèm điểm TB các khóa của giáo viên trong lớp"""
+    progress = progress or _noop_progress
+    class_courses = ClassCourse.query.join(
+        Course, ClassCourse.course_id == Course.id
+    ).filter(
+        Course.teacher_id == teacher_id
+    ).options(
+        db.joinedload(ClassCourse.class_),
+        db.joinedload(ClassCourse.course).joinedload(Course.subject),
+    ).all()
+    course_stats = CourseScoreStats.summaries(cc.course_id for cc in class_courses)
+    progress(20, message=f'Đã tải {len(class_courses)} lớp - khóa học')
+
+    unique_classes = {}
+    for class_course in class_courses:
+        class_obj = class_course.class_
+        course = class_course.course
+
+        if not class_obj or class_obj.id in unique_classes:
+            continue
+
+        # Điểm trung bình các khóa của giáo viên trong lớp (đọc từ CourseScoreStats)
+        course_avgs = [
+            course_stats.get(cc.course_id, {}).get('avg_score', 0.0)
+            for cc in class_obj.class_courses if cc.course.teacher_id == teacher_id
+        ]
+        course_avgs = [avg for avg in course_avgs if avg > 0]
+        avg_score = round(sum(course_avgs) / len(course_avgs), 2) if course_avgs else 0.0
+
+        unique_classes[class_obj.id] = {
+            'class_name': class_obj.class_name,
+            'class_code': class_obj.class_code,
+            'course_name': course.subject.subject_name if course and course.subject else 'N/A',
+            'semester': course.semester if course else 1,
+            'student_count': Student.query.filter(Student.classes.any(id=class_obj.id)).count(),
+            'avg_score': avg_score,
+            'status': course.status if course else 'unknown'
+        }
+        progress(20 + 30 * len(unique_classes) // max(len(class_courses), 1))
+
+    status_map = {
+        'active': 'Đang học',
+        'upcoming': 'Sắp bắt đầu',
+        'completed': 'Đã kết thúc'
+    }
+    data = [['STT', 'Mã lớp', 'Tên lớp', 'Môn học', 'Học kỳ', 'Số SV', 'Điểm TB', 'Trạng thái']]
+    for i, class_data in enumerate(unique_classes.values(), 1):
+        data.append([
+            str(i),
+            class_data['class_code'],
+            class_data['class_name'],
+            class_data['course_name'],
+            f"HK{class_data['semester']}",
+            str(class_data['student_count']),
+            f"{class_data['avg_score']:.2f}",
+            status_map.get(class_data['status'], class_data['status'])
+        ])
+    progress(50, message='Đang tạo file PDF')
+
+    pdf = render_table_pdf(
+        "DANH SÁCH LỚP HỌC - GIÁO VIÊN",
+        f"Giáo viên: {teacher_name} | Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')}",
+        data, [30, 60, 100, 120, 40, 50, 50, 60]
+    )
+    return ExportFile(f'danh_sach_lop_hoc_giao_vien_{_timestamp()}.pdf', PDF_MIMETYPE, pdf)
+
+
+@export_jobs.task('teacher_students_pdf')
+def teacher_students_pdf(teacher_id, teacher_name, course_id=None, class_id=None, progress=None):
+    """Sinh viên của 1 khóa học / 1 lớp / mọi khóa học của giáo viên"""
+    progress = progress or _noop_progress
+    students_data = []
+    title = "Danh sách sinh viên"
+
+    if course_id:
+        result = Course.get_course_with_students(course_id, teacher_id)
+        if result:
+            students_data = result['students']
+            title = f"Danh sách sinh viên - {result['course'].course_code}"
+
+    elif class_id:
+        class_obj = db.session.get(Class, int(class_id))
+        if class_obj:
+            for student in class_obj.students:
+                students_data.append({
+                    'student_id': student.student_id,
+                    'full_name': student.user.full_name,
+                    'email': student.user.email,
+                    'class_name': class_obj.class_name
+                })
+            title = f"Danh sách sinh viên - {class_obj.class_name}"
+    else:
+        registrations = CourseRegistration.query.join(
+            Course, CourseRegistration.course_id == Course.id
+        ).filter(
+            Course.teacher_id == teacher_id,
+            CourseRegistration.status == 'approved'
+        ).options(
+            db.joinedload(CourseRegistration.student).joinedload(Student.user),
+            db.joinedload(CourseRegistration.student).selectinload(Student.classes),
+        ).order_by(Course.id, CourseRegistration.id).all()
+        for reg in registrations:
+            student = reg.student
+            class_names = ', '.join([cls.class_name for cls in student.classes]) if student.classes else 'N/A'
+            students_data.append({
+                'student_id': student.student_id,
+                'full_name': student.user.full_name,
+                'email': student.user.email,
+                'class_name': class_names
+            })
+        title = "Danh sách sinh viên - Tất cả khóa học"
+    progress(30, message=f'Đã tải {len(students_data)} sinh viên')
+
+    data = [['STT', 'Mã SV', 'Họ tên', 'Lớp', 'Email']]
+    for i, student in enumerate(students_data, 1):
+        data.append([
+            str(i),
+            student['student_id'],
+            student['full_name'],
+            student['class_name'],
+            student['email']
+        ])
+    progress(50, message='Đang tạo file PDF')
+
+    pdf = render_table_pdf(
+        title,
+        f"Giáo viên: {teacher_name} | Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')} | "
+        f"Tổng số: {len(students_data)} sinh viên",
+        data, [30, 80, 120, 80, 150]
+    )
+    return ExportFile(f'danh_sach_sinh_vien_{_timestamp()}.pdf', PDF_MIMETYPE, pdf)
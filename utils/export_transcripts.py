@@ -0,0 +1,173 @@
+"""
+Xuất bảng điểm hàng loạt: mọi sinh viên của 1 lớp / khoa / khóa tuyển sinh -> 1 file ZIP
+(mỗi sinh viên 1 PDF, tên file theo mã sinh viên)
+
+Pipeline chạy trong job nền (export_jobs, kind 'cohort_transcripts'), 3 tầng nối nhau bằng generator:
+1. 1 câu select Core duy nhất: sinh viên của nhóm LEFT JOIN điểm -> khóa học -> môn học, sắp theo
+   sinh viên rồi groupby thành từng bảng điểm (không dựng đối tượng ORM, không truy vấn thêm theo
+   từng sinh viên). Các dòng (chỉ vài cột giá trị) được đọc hết rồi đóng transaction ngay: không giữ
+   transaction / khóa đọc trong suốt thời gian render, trong khi job vẫn ghi tiến độ vào export_jobs.
+2. pdf_renderer.render_many(): render song song trong pool tiến trình, gửi worker theo lô.
+3. zipfile ghi vào ChunkSink: mỗi PDF xong là thành 1 đoạn bytes của ZIP, export_jobs ghi thẳng ra
+   đĩa -> bộ nhớ chỉ giữ vài lô PDF, không giữ cả file ZIP.
+
+Chạy tay / đo tốc độ: `flask export-transcripts --class-id 1 --output bang_diem.zip`.
+"""
+import logging
+import time
+import zipfile
+from collections import deque
+from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
+
+from sqlalchemy import func, select
+from werkzeug.utils import secure_filename
+
+from models import db, User, Student, Class, Course, Subject, Score, student_class
+from utils.export_jobs import export_jobs, ExportFile
+from utils.export_stream import ZIP_MIMETYPE, ChunkSink
+from utils.pdf_generator import PDFGenerator, score_cells
+from utils.pdf_render import pdf_renderer
+
+logger = logging.getLogger(__name__)
+
+# PDF của ReportLab đã nén sẵn nội dung trang: nén thêm mức thấp nhất chỉ để gọn phần font / metadata
+ZIP_COMPRESSLEVEL = 1
+
+
+def _noop_progress(done, total=None, message=None):
+    pass
+
+
+def normalize_intake(intake):
+    """'2024' -> 'K2024' (Student.course lưu dạng 'K2024')"""
+    intake = (intake or '').strip().upper()
+    return f'K{intake}' if intake.isdigit() else intake
+
+
+def cohort_conditions(class_id=None, faculty=None, intake=None):
+    """Điều kiện lọc sinh viên của nhóm; các tiêu chí được kết hợp AND, cần ít nhất 1"""
+    conditions = []
+    if class_id:
+        conditions.append(Student.classes.any(Class.id == int(class_id)))
+    if faculty:
+        conditions.append(Student.classes.any(Class.faculty == faculty))
+    if intake:
+        conditions.append(Student.course == normalize_intake(intake))
+    if not conditions:
+        raise ValueError('Cần chọn lớp, khoa hoặc khóa tuyển sinh')
+    return conditions
+
+
+def cohort_score_statement(class_id=None, faculty=None, intake=None):
+    """1 dòng / (sinh viên, điểm); sinh viên chưa có điểm vẫn có 1 dòng với cột môn học = NULL"""
+    conditions = cohort_conditions(class_id, faculty, intake)
+
+    # Tên lớp in trên bảng điểm: lớp đang xuất, hoặc lớp đầu tiên của sinh viên (như Student.class_)
+    class_name = select(Class.class_name).join(
+        student_class, student_class.c.class_id == Class.id
+    ).where(student_class.c.student_id == Student.id)
+    if class_id:
+        class_name = class_name.where(Class.id == int(class_id))
+    class_name = class_name.order_by(Class.id).limit(1).correlate(Student).scalar_subquery()
+
+    return select(
+        Student.id.label('student_pk'), Student.student_id, User.full_name,
+        class_name.label('class_name'), Student.course.label('intake'),
+        Student.gpa, Student.completed_credits,
+        Subject.subject_code, Subject.subject_name, Subject.credits,
+        Score.process_score, Score.exam_score, Score.final_score, Score.grade
+    ).join(
+        User, User.id == Student.user_id
+    ).outerjoin(
+        Score, Score.student_id == Student.id
+    ).outerjoin(
+        Course, Course.id == Score.course_id
+    ).outerjoin(
+        Subject, Subject.id == Course.subject_id
+    ).where(
+        *conditions
+    ).order_by(
+        Student.student_id, Student.id, Course.year, Course.semester, Subject.subject_code
+    )
+
+
+def count_cohort(class_id=None, faculty=None, intake=None):
+    return db.session.scalar(
+        select(func.count(Student.id)).where(*cohort_conditions(class_id, faculty, intake))
+    )
+
+
+def iter_transcripts(session, statement, generator=None, printed_at=None):
+    """(mã sinh viên, dữ liệu render_transcript) theo thứ tự của câu select"""
+    generator = generator or PDFGenerator()
+    printed_at = printed_at or datetime.now()
+    rows = session.connection().execute(statement).all()
+    session.rollback()
+    for _, group in groupby(rows, key=attrgetter('student_pk')):
+        group = list(group)
+        first = group[0]
+        yield first.student_id, generator.transcript_payload(
+            first.student_id, first.full_name, first.class_name, first.intake,
+            first.gpa, first.completed_credits,
+            [
+                [row.subject_code, row.subject_name, str(row.credits)] + score_cells(row)
+                for row in group if row.subject_code is not None
+            ],
+            printed_at
+        )
+
+
+def iter_transcripts_zip(transcripts, total=None, progress=None):
+    """Các đoạn bytes của file ZIP chứa bảng điểm PDF của từng sinh viên"""
+    progress = progress or _noop_progress
+    names = deque()
+
+    def payloads():
+        # render_many trả PDF đúng thứ tự đầu vào -> lấy tên file theo cùng thứ tự
+        for student_code, data in transcripts:
+            names.append(f'bang_diem_{secure_filename(student_code) or "sinh_vien"}.pdf')
+            yield data
+
+    started = time.perf_counter()
+    done = 0
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=ZIP_COMPRESSLEVEL) as archive:
+        for pdf in pdf_renderer.render_many('transcript', payloads()):
+            archive.writestr(names.popleft(), pdf)
+            done += 1
+            progress(done, total, f'Đã tạo {done}/{total or "?"} bảng điểm')
+            yield sink.drain()
+    yield sink.drain()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Cohort transcripts: {done} PDFs in {elapsed:.2f}s "
+                f"({done / elapsed * 60 if elapsed else 0:.0f}/min, {pdf_renderer.workers} render workers)")
+
+
+def cohort_label(class_id=None, faculty=None, intake=None):
+    parts = []
+    if class_id:
+        class_obj = db.session.get(Class, int(class_id))
+        parts.append(class_obj.class_code if class_obj else f'lop{class_id}')
+    if faculty:
+        parts.append(faculty)
+    if intake:
+        parts.append(normalize_intake(intake))
+    return secure_filename('_'.join(parts)) or 'nhom'
+
+
+@export_jobs.task('cohort_transcripts')
+def cohort_transcripts(class_id=None, faculty=None, intake=None, progress=None):
+    """ZIP bảng điểm của mọi sinh viên thuộc lớp / khoa / khóa tuyển sinh (các tiêu chí kết hợp AND)"""
+    progress = progress or _noop_progress
+    total = count_cohort(class_id, faculty, intake)
+    if not total:
+        raise ValueError('Không có sinh viên nào thuộc nhóm đã chọn')
+    progress(0, total, f'Đang tạo bảng điểm cho {total} sinh viên')
+
+    statement = cohort_score_statement(class_id, faculty, intake)
+    filename = f'bang_diem_{cohort_label(class_id, faculty, intake)}_{datetime.now().strftime("%Y%m%d_%H%M")}.zip'
+    return ExportFile(filename, ZIP_MIMETYPE,
+                      iter_transcripts_zip(iter_transcripts(db.session, statement), total, progress))
@@ -0,0 +1,137 @@
+"""
+Cache fragment (widget) của các trang dashboard - stale-while-revalidate
+
+Mỗi fragment có khóa "fragments:<tên>:<phạm vi>" (phạm vi: 'all' hoặc id người dùng) và phụ thuộc
+vào 1 danh sách phiên bản dữ liệu, vd 'students', 'scores', 'student:42', 'notifications:7'.
+Phiên bản là 1 token lưu ở khóa "versions:<tên>"; ghi dữ liệu (session events trong models.py)
+xóa token -> lần đọc sau sinh token mới -> fragment đang lưu trở thành "cũ".
+
+Khi đọc 1 fragment:
+- Cùng phiên bản và chưa quá FRAGMENT_CACHE_TTL giây: trả về ngay.
+- Cũ nhưng chưa quá FRAGMENT_CACHE_MAX_STALE giây: trả về bản cũ, đúng 1 request (khóa add())
+  kích hoạt render lại ở luồng nền -> đợt đăng nhập dồn dập chỉ tốn vài lần render.
+- Không có / quá cũ: render ngay trong request.
+
+Cùng các phiên bản đó tạo ETag cho API JSON (decorators.conditional_get): poll không đổi
+chỉ tốn vài lần đọc cache rồi trả 304.
+
+Hàm tính fragment có thể chạy ở luồng nền: không được dùng current_user hay đối tượng ORM
+của request, chỉ dùng id truyền vào.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from flask import current_app
+
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class FragmentCache:
+    """Cache giá trị (thường là HTML đã render) theo phiên bản dữ liệu, có stale-while-revalidate"""
+
+    LOCK_TIMEOUT = 30  # giây - tối đa 1 lần render lại mỗi fragment trong khoảng này
+    VERSION_TIMEOUT = 7 * 24 * 3600  # token hết hạn = coi như dữ liệu đã đổi; giữ lâu cho cache tính sẵn
+
+    def __init__(self, cache, ttl=60, max_stale=900, background=True):
+        self.cache = cache
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.background = background
+
+    def init_app(self, app):
+        config = app.config
+        self.ttl = config.get('FRAGMENT_CACHE_TTL', 60)
+        self.max_stale = config.get('FRAGMENT_CACHE_MAX_STALE', 900)
+        self.background = config.get('FRAGMENT_CACHE_BACKGROUND', True)
+        app.extensions['fragments'] = self
+
+    # ---------- phiên bản dữ liệu ----------
+
+    def version(self, dependency):
+        """Token phiên bản hiện tại của 1 phụ thuộc (tạo mới nếu chưa có)"""
+        key = f'versions:{dependency}'
+        token = self.cache.get(key)
+        if token is None:
+            # add(): nhiều worker cùng tạo thì token của worker đầu tiên được giữ
+            self.cache.add(key, f'{time.time_ns():x}', timeout=self.VERSION_TIMEOUT)
+            token = self.cache.get(key)
+        return token
+
+    def versions(self, dependencies):
+        return tuple(self.version(dependency) for dependency in dependencies)
+
+    def etag(self, dependencies, *extra):
+        """ETag mạnh từ phiên bản của các phụ thuộc (+ giá trị phân biệt như id người dùng).
+
+        Trả về None nếu backend không giữ được phiên bản (NullCache) - khi đó không dùng 304.
+        """
+        versions = self.versions(dependencies)
+        if any(version is None for version in versions):
+            return None
+        raw = '|'.join([*map(str, extra), *dependencies, *versions])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def bump(self, *dependencies):
+        """Đánh dấu dữ liệu đã đổi: các fragment phụ thuộc trở thành "cũ" """
+        for dependency in dependencies:
+            self.cache.delete(f'versions:{dependency}')
+
+    # ---------- đọc / ghi ----------
+
+    def get(self, name, scope, dependencies, compute):
+        """Giá trị của fragment, tính bằng compute() khi chưa có hoặc đã quá cũ"""
+        key = f'fragments:{name}:{scope}'
+        versions = self.versions(dependencies)
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            age = time.time() - entry['rendered_at']
+            if entry['versions'] == versions and age < self.ttl:
+                return entry['value']
+            if age < self.max_stale:
+                if self.cache.add(f'fragment-locks:{name}:{scope}', 1, timeout=self.LOCK_TIMEOUT):
+                    self._revalidate(key, name, scope, dependencies, compute)
+                return entry['value']
+
+        return self._store(key, versions, compute())
+
+    def _store(self, key, versions, value):
+        # Lưu lâu hơn max_stale 1 chút để còn bản cũ mà phục vụ
+        self.cache.set(key, {'versions': versions, 'rendered_at': time.time(), 'value': value},
+                       timeout=self.max_stale + self.LOCK_TIMEOUT)
+        return value
+
+    def _revalidate(self, key, name, scope, dependencies, compute):
+        lock_key = f'fragment-locks:{name}:{scope}'
+
+        def refresh():
+            try:
+                # Đọc phiên bản TRƯỚC khi tính: có ghi xen giữa thì lần sau vẫn thấy là cũ
+                self._store(key, self.versions(dependencies), compute())
+            except Exception as e:
+                logger.warning(f"Render lại fragment {name}:{scope} lỗi: {e}")
+            finally:
+                self.cache.delete(lock_key)
+
+        if not self.background:
+            refresh()
+            return
+
+        app = current_app._get_current_object()
+
+        def worker():
+            # render_template / url_for cần request context; session DB riêng của luồng
+            with app.test_request_context():
+                refresh()
+
+        threading.Thread(target=worker, name=f'fragment-{name}', daemon=True).start()
+
+    def delete(self, name, scope):
+        self.cache.delete(f'fragments:{name}:{scope}')
+
+
+fragments = FragmentCache(cache)
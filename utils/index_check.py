@@ -0,0 +1,119 @@
+"""
+Kiểm tra các truy vấn nóng có dùng index hay không bằng EXPLAIN (MySQL / SQLite)
+
+Chạy: flask check-indexes   (mã thoát 1 nếu có truy vấn quét bảng / quét cả index hoặc không dùng
+index mong đợi)
+"""
+from datetime import datetime
+
+from sqlalchemy import func
+
+from models import db, Score, CourseRegistration, Notification, student_class
+
+
+def hot_queries():
+    """[(tên, bảng cần kiểm tra, index mong đợi, câu SELECT)] - tham số mẫu chỉ để lấy kế hoạch thực thi"""
+    week_ago = datetime(2024, 1, 1)
+
+    return [
+        ('low_scores', 'scores', 'ix_scores_course_status_final',
+         db.select(Score.id).where(
+             Score.course_id.in_([1, 2, 3]),
+             Score.status == 'published',
+             Score.final_score < 5.0
+         )),
+        ('course_approved_registrations', 'course_registrations', 'ix_course_registrations_course_status',
+         db.select(CourseRegistration.id).where(
+             CourseRegistration.course_id == 1,
+             CourseRegistration.status == 'approved'
+         )),
+        ('student_current_courses', 'course_registrations', None,
+         db.select(CourseRegistration.id).where(
+             CourseRegistration.student_id == 1,
+             CourseRegistration.status == 'approved'
+         )),
+        ('unread_notification_count', 'notifications', 'ix_notifications_user_read_created',
+         db.select(func.count(Notification.id)).where(
+             Notification.user_id == 1,
+             Notification.is_read == False  # noqa: E712
+         )),
+        ('recent_notifications', 'notifications', 'ix_notifications_user_created',
+         db.select(Notification.id).where(
+             Notification.user_id == 1
+         ).order_by(Notification.created_at.desc()).limit(20)),
+        ('recent_academic_notification', 'notifications', None,
+         db.select(Notification.id).where(
+             Notification.user_id == 1,
+             Notification.category == 'academic',
+             Notification.created_at >= week_ago
+         ).limit(1)),
+        ('class_roster', 'student_class', 'ix_student_class_class_student',
+         db.select(student_class.c.student_id).where(student_class.c.class_id == 1)),
+    ]
+
+
+def _explain_sqlite(connection, sql, table):
+    """(index được dùng hoặc None, kiểu truy cập, các dòng kế hoạch) từ EXPLAIN QUERY PLAN.
+
+    Kiểu truy cập: 'SEARCH' (tìm theo khóa index) hoặc 'SCAN' (quét cả bảng / cả index).
+    """
+    rows = [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+    for detail in rows:
+        words = detail.split()
+        # "SEARCH scores USING INDEX ix_... (course_id=?)" / "SCAN notifications USING COVERING INDEX ..."
+        if len(words) < 2 or words[1] != table:
+            continue
+        if 'INDEX' in words:
+            return words[words.index('INDEX') + 1], words[0], rows
+        if 'PRIMARY KEY' in detail:
+            return 'PRIMARY', words[0], rows
+        return None, words[0], rows
+    return None, None, rows
+
+
+def _explain_mysql(connection, sql, table):
+    """(index được dùng hoặc None, kiểu truy cập - cột type, các dòng kế hoạch) từ EXPLAIN"""
+    rows = [dict(row._mapping) for row in connection.exec_driver_sql(f'EXPLAIN {sql}')]
+    for row in rows:
+        if row.get('table') == table:
+            return row.get('key'), row.get('type'), rows
+    return None, None, rows
+
+
+# Kiểu truy cập không phải tìm theo index: quét toàn bảng (SQLite SCAN, MySQL ALL)
+# hoặc quét toàn bộ 1 index (SQLite SCAN ... USING COVERING INDEX, MySQL index)
+FULL_SCAN_ACCESS = {'SCAN', 'ALL', 'index'}
+
+
+def check_indexes(connection=None):
+    """Chạy EXPLAIN cho từng truy vấn nóng.
+
+    Trả về list {'name', 'table', 'expected', 'used', 'access', 'ok', 'plan'};
+    ok = True khi bảng được tìm theo index (không quét toàn bảng / toàn index) và, nếu truy vấn
+    có index mong đợi, đúng là index đó.
+    """
+    connection = connection or db.session.connection()
+    dialect = connection.dialect
+
+    if dialect.name == 'sqlite':
+        explain = _explain_sqlite
+    elif dialect.name == 'mysql':
+        explain = _explain_mysql
+    else:
+        raise ValueError(f'Chưa hỗ trợ EXPLAIN cho dialect {dialect.name}')
+
+    results = []
+    for name, table, expected, query in hot_queries():
+        sql = str(query.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        used, access, plan = explain(connection, sql, table)
+        results.append({
+            'name': name,
+            'table': table,
+            'expected': expected,
+            'used': used,
+            'access': access,
+            'ok': (used is not None and access not in FULL_SCAN_ACCESS
+                   and (expected is None or used == expected)),
+            'plan': plan
+        })
+    return results
@@ -0,0 +1,118 @@
+"""
+Loader theo request (kiểu DataLoader) cho các lookup theo khóa chính
+
+Trong 1 request cùng 1 đối tượng thường được lấy nhiều lần (Model.query.get trong vòng lặp,
+helper của model và route cùng tra 1 id...). loader giữ 1 bản đồ {model: {id: đối tượng}}
+trong flask.g, nên:
+- loader.get(Course, 5) nhiều lần trong request -> tối đa 1 truy vấn (kể cả khi không tìm thấy)
+- loader.get_many(Score, ids) -> 1 truy vấn IN (...) cho các id chưa có, theo lô CHUNK_SIZE
+- loader.prime(*objs) ghi nhận đối tượng đã tải bằng truy vấn khác
+
+Session identity map không thay thế được: nó không gom được nhiều id vào 1 truy vấn, không nhớ
+id không tồn tại, và sau commit (expire) session.get() lại chạy SELECT cho từng id.
+
+Bản đồ sống cùng app context (như db.session): hết request là hết. Ngoài app context (script,
+shell) loader chỉ truy vấn thẳng, không nhớ gì.
+"""
+from flask import g, has_app_context
+from sqlalchemy import inspect
+
+_MISSING = object()
+
+
+class RequestLoader:
+    """Identity cache theo request, gom lookup theo khóa chính thành truy vấn IN"""
+
+    CHUNK_SIZE = 500  # số id tối đa trong 1 mệnh đề IN
+
+    def _store(self, model):
+        if not has_app_context():
+            return None
+        stores = g.setdefault('_request_loader', {})
+        return stores.setdefault(model, {})
+
+    @staticmethod
+    def _key(model, ident):
+        """Chuẩn hóa id về kiểu của khóa chính ('5' -> 5); None nếu không hợp lệ"""
+        column = inspect(model).primary_key[0]
+        try:
+            return column.type.python_type(ident)
+        except (TypeError, ValueError, NotImplementedError):
+            return None
+
+    @staticmethod
+    def _usable(obj):
+        # Đối tượng đã bị xóa / tách khỏi session trong request -> coi như chưa có
+        if obj is None:
+            return True
+        state = inspect(obj)
+        return not (state.deleted or state.was_deleted or state.detached)
+
+    def get(self, model, ident, options=()):
+        """Đối tượng theo khóa chính (None nếu không có)"""
+        key = self._key(model, ident)
+        if key is None:
+            return None
+        return self.get_many(model, [key], options).get(key)
+
+    def get_many(self, model, idents, options=()):
+        """{id: đối tượng} cho các id tồn tại; id chưa có trong request được tải bằng 1 truy vấn IN.
+
+        options: loader option của SQLAlchemy (vd db.joinedload(Score.course)), chỉ áp dụng
+        cho các đối tượng được tải ở lần gọi này.
+        """
+        store = self._store(model)
+        # dict.fromkeys: bỏ trùng giữ thứ tự, O(n)
+        keys = dict.fromkeys(self._key(model, ident) for ident in idents)
+        keys.pop(None, None)
+
+        found, missing = {}, []
+        for key in keys:
+            obj = store.get(key, _MISSING) if store is not None else _MISSING
+            if obj is not _MISSING and self._usable(obj):
+                if obj is not None:
+                    found[key] = obj
+            else:
+                missing.append(key)
+
+        if missing:
+            column = inspect(model).primary_key[0]
+            for start in range(0, len(missing), self.CHUNK_SIZE):
+                chunk = missing[start:start + self.CHUNK_SIZE]
+                query = model.query.filter(getattr(model, column.key).in_(chunk))
+                if options:
+                    query = query.options(*options)
+                for obj in query:
+                    found[getattr(obj, column.key)] = obj
+            if store is not None:
+                for key in missing:
+                    store[key] = found.get(key)
+
+        return found
+
+    def prime(self, *objs):
+        """Ghi nhận các đối tượng đã tải để các lookup sau trong request không truy vấn lại"""
+        for obj in objs:
+            identity = inspect(obj).identity
+            store = self._store(type(obj))
+            if store is not None and identity is not None:
+                store[identity[0]] = obj
+
+    def forget(self, model=None, *idents):
+        """Bỏ các đối tượng đã nhớ (tất cả / 1 model / 1 số id của model)"""
+        if not has_app_context():
+            return
+        stores = g.get('_request_loader')
+        if not stores:
+            return
+        if model is None:
+            stores.clear()
+        elif not idents:
+            stores.pop(model, None)
+        else:
+            store = stores.get(model, {})
+            for ident in idents:
+                store.pop(self._key(model, ident), None)
+
+
+loader = RequestLoader()
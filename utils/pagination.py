@@ -0,0 +1,89 @@
+"""
+Phân trang keyset (seek) cho các API danh sách
+
+Thay vì OFFSET (càng về sau càng chậm), mỗi trang bắt đầu ngay sau
+(giá trị cột sắp xếp, id) của dòng cuối trang trước -> chi phí mỗi trang không đổi
+khi bảng lớn dần. Con trỏ được mã hóa base64 để client gửi lại nguyên vẹn.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(sort_value, row_id):
+    """(giá trị sắp xếp, id) -> chuỗi con trỏ"""
+    if isinstance(sort_value, datetime):
+        payload = {'dt': sort_value.isoformat(), 'id': row_id}
+    elif isinstance(sort_value, date):
+        payload = {'d': sort_value.isoformat(), 'id': row_id}
+    else:
+        payload = {'v': sort_value, 'id': row_id}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Chuỗi con trỏ -> (giá trị sắp xếp, id). Raise ValueError nếu không hợp lệ."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if 'dt' in payload:
+            return datetime.fromisoformat(payload['dt']), int(payload['id'])
+        if 'd' in payload:
+            return date.fromisoformat(payload['d']), int(payload['id'])
+        return payload['v'], int(payload['id'])
+    except (TypeError, ValueError, KeyError, UnicodeError) as e:
+        raise ValueError('Con trỏ phân trang không hợp lệ') from e
+
+
+def page_args(args, sort_fields, default_sort):
+    """Đọc tham số phân trang chuẩn từ request.args.
+
+    ?sort=<tên>&order=asc|desc&cursor=...&limit=...
+    Trả về (tên cột sắp xếp, giảm dần?, con trỏ, limit).
+    """
+    sort = args.get('sort', default_sort)
+    if sort not in sort_fields:
+        sort = default_sort
+    descending = args.get('order', 'asc').lower() == 'desc'
+    limit = min(max(args.get('limit', DEFAULT_LIMIT, type=int) or DEFAULT_LIMIT, 1), MAX_LIMIT)
+    return sort, descending, args.get('cursor') or None, limit
+
+
+def keyset_paginate(query, sort_expr, id_column, cursor=None, limit=DEFAULT_LIMIT, descending=False):
+    """Lấy 1 trang theo keyset.
+
+    sort_expr phải NOT NULL (bọc coalesce nếu cần) để so sánh tuple đúng nghĩa.
+    Trả về {'items', 'next_cursor', 'has_more'}; items là các đối tượng của query.
+    """
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(sort_expr < last_value, and_(sort_expr == last_value, id_column < last_id)))
+        else:
+            query = query.filter(or_(sort_expr > last_value, and_(sort_expr == last_value, id_column > last_id)))
+
+    if descending:
+        query = query.order_by(sort_expr.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), id_column.asc())
+
+    # Lấy dư 1 dòng để biết còn trang sau hay không (không cần COUNT)
+    rows = query.add_columns(sort_expr.label('_sort_value')).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last_item, last_value = rows[-1][0], rows[-1][-1]
+        next_cursor = encode_cursor(last_value, getattr(last_item, id_column.key))
+
+    return {
+        'items': [row[0] for row in rows],
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
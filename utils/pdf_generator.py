@@ -1,326 +1,290 @@
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from datetime import datetime
-import os
-from flask import current_app
+from io import BytesIO
 import logging
 
+from utils.pdf_styles import pdf_styles
+from utils.pdf_render import pdf_renderer
+
 logger = logging.getLogger(__name__)
 
+# Các hàm render_* bên dưới chỉ nhận dữ liệu thuần (dict / list / str) và trả về bytes: chúng chạy
+# trong worker của pdf_renderer (utils/pdf_render.py), không được chạm tới ORM / app context.
+# PDFGenerator chuẩn bị dữ liệu đó từ đối tượng ORM trong tiến trình web.
+
+INFO_TABLE_STYLE = [
+    ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+]
+DATA_TABLE_STYLE = [
+    ('FONT', (0, 0), (-1, -1), 'Helvetica', 8),
+    ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 9),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.whitesmoke])
+]
+SUMMARY_TABLE_STYLE = [
+    ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+]
+
+
+def _build(elements):
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4).build(elements)
+    return buffer.getvalue()
+
+
+def _table(rows, style, col_widths=None):
+    table = Table(rows, colWidths=col_widths)
+    table.setStyle(TableStyle(style))
+    return table
+
+
+@pdf_renderer.renderer('transcript')
+def render_transcript(data):
+    """Bảng điểm 1 sinh viên: {'info', 'summary', 'rows', 'printed_at'}"""
+    styles = pdf_styles.styles
+    elements = [Paragraph("BẢNG ĐIỂM HỌC TẬP", styles['TranscriptTitle'])]
+
+    # Student Information
+    elements.append(_table(data['info'], INFO_TABLE_STYLE + [('GRID', (0, 0), (-1, -1), 1, colors.black)],
+                           [2*inch, 4*inch]))
+    elements.append(Spacer(1, 20))
+
+    # Academic Summary
+    elements.append(_table(data['summary'], SUMMARY_TABLE_STYLE))
+    elements.append(Spacer(1, 20))
+
+    # Scores Table
+    header = ["Mã MH", "Tên môn học", "Số TC", "Điểm QT", "Điểm thi", "Điểm TK", "Điểm chữ", "Kết quả"]
+    elements.append(_table([header] + data['rows'], DATA_TABLE_STYLE,
+                           [0.6*inch, 2.5*inch, 0.5*inch, 0.6*inch, 0.6*inch, 0.6*inch, 0.6*inch, 0.6*inch]))
+
+    # Footer
+    elements.append(Spacer(1, 30))
+    footer_style = styles['ReportFooter']
+    elements.append(Paragraph("Bảng điểm được tạo tự động từ Hệ thống Quản lý Sinh viên", footer_style))
+    elements.append(Paragraph(f"Thời điểm tạo: {data['printed_at']}", footer_style))
+    return _build(elements)
+
+
+@pdf_renderer.renderer('class_scores')
+def render_class_scores(data):
+    """Báo cáo điểm lớp: {'title', 'info', 'rows', 'stats'}"""
+    elements = [Paragraph(data['title'], pdf_styles['ReportTitle'])]
+
+    # Class Information
+    elements.append(_table(data['info'], INFO_TABLE_STYLE, [1.5*inch, 4*inch]))
+    elements.append(Spacer(1, 20))
+
+    # Scores Table
+    header = ["STT", "Mã SV", "Họ tên", "Điểm QT", "Điểm thi", "Điểm TK", "Điểm chữ", "Kết quả"]
+    elements.append(_table([header] + data['rows'], DATA_TABLE_STYLE,
+                           [0.4*inch, 0.8*inch, 2*inch, 0.7*inch, 0.7*inch, 0.7*inch, 0.7*inch, 0.7*inch]))
+
+    # Statistics
+    elements.append(Spacer(1, 20))
+    elements.append(_table(data['stats'], SUMMARY_TABLE_STYLE))
+    return _build(elements)
+
+
+@pdf_renderer.renderer('teaching_report')
+def render_teaching_report(data):
+    """Báo cáo giảng dạy: {'info', 'rows', 'summary'}"""
+    elements = [Paragraph("BÁO CÁO GIẢNG DẠY", pdf_styles['ReportTitle'])]
+
+    # Teacher Information
+    elements.append(_table(data['info'], INFO_TABLE_STYLE, [1.5*inch, 4*inch]))
+    elements.append(Spacer(1, 20))
+
+    # Courses Table
+    header = ["Mã HP", "Tên học phần", "Số TC", "Số SV", "Lịch học", "Phòng", "Trạng thái"]
+    elements.append(_table([header] + data['rows'], DATA_TABLE_STYLE,
+                           [1*inch, 2.5*inch, 0.6*inch, 0.6*inch, 1.5*inch, 0.8*inch, 1*inch]))
+
+    # Summary
+    elements.append(Spacer(1, 20))
+    elements.append(_table(data['summary'], SUMMARY_TABLE_STYLE))
+    return _build(elements)
+
+
+@pdf_renderer.renderer('table')
+def render_table(data):
+    """PDF danh sách 1 bảng (utils/export_reports.py): {'title', 'info', 'rows', 'col_widths', 'striped', 'encoding'}"""
+    doc_options = {'encoding': data['encoding']} if data.get('encoding') else {}
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30, **doc_options)
+    elements = [
+        Paragraph(data['title'], pdf_styles['ExportTitle']),
+        Paragraph(data['info'], pdf_styles['ExportInfo']),
+        Spacer(1, 20),
+    ]
+
+    table_style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]
+    if data.get('striped'):
+        table_style.append(('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]))
+    elements.append(_table(data['rows'], table_style, data['col_widths']))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def score_cells(score):
+    """Các ô điểm QT / thi / TK / chữ / kết quả của 1 dòng điểm (Score hoặc Row có cùng tên cột)"""
+    return [
+        f"{score.process_score:.1f}" if score.process_score else "",
+        f"{score.exam_score:.1f}" if score.exam_score else "",
+        f"{score.final_score:.1f}" if score.final_score else "",
+        score.grade or "",
+        "Đạt" if score.final_score and score.final_score >= 5.0 else "Trượt"
+    ]
+
+
 class PDFGenerator:
-    def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self._register_fonts()
-        
-    def _register_fonts(self):
-        """Register Vietnamese fonts if available"""
+    def __init__(self, renderer=None):
+        # Font + style nạp 1 lần cho cả tiến trình (utils/pdf_styles.py)
+        self.styles = pdf_styles.styles
+        # Render trong pool tiến trình (utils/pdf_render.py)
+        self.renderer = renderer or pdf_renderer
+
+    # ---------- dữ liệu thuần từ ORM (chạy trong tiến trình web) ----------
+
+    def transcript_data(self, student, scores):
+        return self.transcript_payload(
+            student.student_id, student.user.full_name,
+            student.class_.class_name if student.class_ else "N/A", student.course,
+            student.gpa, student.completed_credits,
+            [
+                [score.course.subject.subject_code, score.course.subject.subject_name,
+                 str(score.course.subject.credits)] + score_cells(score)
+                for score in scores
+            ]
+        )
+
+    def transcript_payload(self, student_code, full_name, class_name, intake, gpa, completed_credits,
+                           rows, printed_at=None):
+        """Dữ liệu render_transcript từ giá trị thuần (dùng chung cho 1 sinh viên và xuất cả lớp)"""
+        gpa = gpa or 0.0
+        printed_at = printed_at or datetime.now()
+        return {
+            'info': [
+                ["Mã sinh viên:", student_code],
+                ["Họ và tên:", full_name],
+                ["Lớp:", class_name or "N/A"],
+                ["Khóa:", intake],
+                ["Ngày in:", printed_at.strftime("%d/%m/%Y %H:%M")]
+            ],
+            'summary': [
+                ["Tổng số tín chỉ:", str(completed_credits or 0)],
+                ["GPA tích lũy:", f"{gpa:.2f}"],
+                ["Xếp loại:", self._get_academic_rank(gpa)]
+            ],
+            'rows': rows,
+            'printed_at': printed_at.strftime('%d/%m/%Y %H:%M:%S')
+        }
+
+    def class_scores_data(self, class_, scores):
+        final_scores = [s.final_score for s in scores if s.final_score]
+        passed_count = len([s for s in scores if s.final_score and s.final_score >= 5.0])
+        pass_rate = (passed_count / len(scores)) * 100 if scores else 0
+        return {
+            'title': f"BÁO CÁO ĐIỂM LỚP {class_.class_name}",
+            'info': [
+                ["Mã lớp:", class_.class_code],
+                ["Tên lớp:", class_.class_name],
+                ["Khóa:", class_.course],
+                ["Giáo viên chủ nhiệm:", class_.teacher.user.full_name if class_.teacher else "N/A"],
+                ["Số sinh viên:", str(class_.current_students)],
+                ["Ngày in:", datetime.now().strftime("%d/%m/%Y")]
+            ],
+            'rows': [
+                [str(i), score.student.student_id, score.student.user.full_name] + score_cells(score)
+                for i, score in enumerate(scores, 1)
+            ],
+            'stats': [
+                ["Tổng số sinh viên:", str(len(scores))],
+                ["Số sinh viên đạt:", str(passed_count)],
+                ["Tỷ lệ đạt:", f"{pass_rate:.1f}%"],
+                ["Điểm trung bình:", f"{sum(final_scores) / len(final_scores):.2f}" if final_scores else "N/A"]
+            ]
+        }
+
+    def teaching_report_data(self, teacher, courses, period):
+        total_credits = sum(course.subject.credits for course in courses)
+        total_students = sum(course.current_students for course in courses)
+        return {
+            'info': [
+                ["Mã giáo viên:", teacher.teacher_code],
+                ["Họ và tên:", teacher.user.full_name],
+                ["Bộ môn:", teacher.department],
+                ["Chức vụ:", teacher.position or "N/A"],
+                ["Thời kỳ:", period],
+                ["Ngày in:", datetime.now().strftime("%d/%m/%Y")]
+            ],
+            'rows': [
+                [course.course_code, course.subject.subject_name, str(course.subject.credits),
+                 str(course.current_students), course.schedule or "N/A", course.room or "N/A", course.status]
+                for course in courses
+            ],
+            'summary': [
+                ["Tổng số học phần:", str(len(courses))],
+                ["Tổng số tín chỉ:", str(total_credits)],
+                ["Tổng số sinh viên:", str(total_students)],
+                ["Số giờ giảng dạy:", str(total_credits * 15)]  # Assuming 15 hours per credit
+            ]
+        }
+
+    # ---------- tạo file ----------
+
+    def _write(self, kind, data, output_path):
         try:
-            # Try to register Arial Unicode MS for Vietnamese characters
-            font_path = os.path.join(current_app.root_path, 'static', 'fonts', 'Arial.ttf')
-            if os.path.exists(font_path):
-                pdfmetrics.registerFont(TTFont('Arial', font_path))
-            else:
-                # Fallback to default fonts
-                pdfmetrics.registerFont(TTFont('Helvetica', 'Helvetica'))
+            pdf = self.renderer.render(kind, data)
+            with open(output_path, 'wb') as output:
+                output.write(pdf)
+            return output_path
         except Exception as e:
-            logger.warning(f'Could not register custom fonts: {e}')
+            logger.error(f"Error generating {kind} PDF: {e}")
+            raise
 
     def generate_transcript(self, student, scores, output_path=None):
         """Generate student transcript PDF"""
         if not output_path:
             output_path = f'transcript_{student.student_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        
-        doc = SimpleDocTemplate(output_path, pagesize=A4)
-        elements = []
-        
-        # Title
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
-        elements.append(Paragraph("BẢNG ĐIỂM HỌC TẬP", title_style))
-        
-        # Student Information
-        student_info = [
-            ["Mã sinh viên:", student.student_id],
-            ["Họ và tên:", student.user.full_name],
-            ["Lớp:", student.class_.class_name if student.class_ else "N/A"],
-            ["Khóa:", student.course],
-            ["Ngày in:", datetime.now().strftime("%d/%m/%Y %H:%M")]
-        ]
-        
-        student_table = Table(student_info, colWidths=[2*inch, 4*inch])
-        student_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(student_table)
-        elements.append(Spacer(1, 20))
-        
-        # Academic Summary
-        summary_data = [
-            ["Tổng số tín chỉ:", str(student.completed_credits)],
-            ["GPA tích lũy:", f"{student.gpa:.2f}"],
-            ["Xếp loại:", self._get_academic_rank(student.gpa)]
-        ]
-        
-        summary_table = Table([summary_data])
-        summary_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(summary_table)
-        elements.append(Spacer(1, 20))
-        
-        # Scores Table
-        scores_data = [["Mã MH", "Tên môn học", "Số TC", "Điểm QT", "Điểm thi", "Điểm TK", "Điểm chữ", "Kết quả"]]
-        
-        for score in scores:
-            scores_data.append([
-                score.course.subject.subject_code,
-                score.course.subject.subject_name,
-                str(score.course.subject.credits),
-                f"{score.process_score:.1f}" if score.process_score else "",
-                f"{score.exam_score:.1f}" if score.exam_score else "",
-                f"{score.final_score:.1f}" if score.final_score else "",
-                score.grade or "",
-                "Đạt" if score.final_score and score.final_score >= 5.0 else "Trượt"
-            ])
-        
-        scores_table = Table(scores_data, colWidths=[0.6*inch, 2.5*inch, 0.5*inch, 0.6*inch, 0.6*inch, 0.6*inch, 0.6*inch, 0.6*inch])
-        scores_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 8),
-            ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 9),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.whitesmoke])
-        ]))
-        elements.append(scores_table)
-        
-        # Footer
-        elements.append(Spacer(1, 30))
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            alignment=TA_CENTER,
-            textColor=colors.grey
-        )
-        elements.append(Paragraph("Bảng điểm được tạo tự động từ Hệ thống Quản lý Sinh viên", footer_style))
-        elements.append(Paragraph(f"Thời điểm tạo: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", footer_style))
-        
-        try:
-            doc.build(elements)
-            return output_path
-        except Exception as e:
-            logger.error(f"Error generating transcript PDF: {e}")
-            raise
+        return self._write('transcript', self.transcript_data(student, scores), output_path)
 
     def generate_class_scores_report(self, class_, scores, output_path=None):
         """Generate class scores report PDF"""
         if not output_path:
             output_path = f'class_scores_{class_.class_code}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        
-        doc = SimpleDocTemplate(output_path, pagesize=A4)
-        elements = []
-        
-        # Title
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=14,
-            spaceAfter=20,
-            alignment=TA_CENTER
-        )
-        elements.append(Paragraph(f"BÁO CÁO ĐIỂM LỚP {class_.class_name}", title_style))
-        
-        # Class Information
-        class_info = [
-            ["Mã lớp:", class_.class_code],
-            ["Tên lớp:", class_.class_name],
-            ["Khóa:", class_.course],
-            ["Giáo viên chủ nhiệm:", class_.teacher.user.full_name if class_.teacher else "N/A"],
-            ["Số sinh viên:", str(class_.current_students)],
-            ["Ngày in:", datetime.now().strftime("%d/%m/%Y")]
-        ]
-        
-        class_table = Table(class_info, colWidths=[1.5*inch, 4*inch])
-        class_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        elements.append(class_table)
-        elements.append(Spacer(1, 20))
-        
-        # Scores Table
-        scores_data = [["STT", "Mã SV", "Họ tên", "Điểm QT", "Điểm thi", "Điểm TK", "Điểm chữ", "Kết quả"]]
-        
-        for i, score in enumerate(scores, 1):
-            scores_data.append([
-                str(i),
-                score.student.student_id,
-                score.student.user.full_name,
-                f"{score.process_score:.1f}" if score.process_score else "",
-                f"{score.exam_score:.1f}" if score.exam_score else "",
-                f"{score.final_score:.1f}" if score.final_score else "",
-                score.grade or "",
-                "Đạt" if score.final_score and score.final_score >= 5.0 else "Trượt"
-            ])
-        
-        scores_table = Table(scores_data, colWidths=[0.4*inch, 0.8*inch, 2*inch, 0.7*inch, 0.7*inch, 0.7*inch, 0.7*inch, 0.7*inch])
-        scores_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 8),
-            ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 9),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.whitesmoke])
-        ]))
-        elements.append(scores_table)
-        
-        # Statistics
-        elements.append(Spacer(1, 20))
-        passed_count = len([s for s in scores if s.final_score and s.final_score >= 5.0])
-        pass_rate = (passed_count / len(scores)) * 100 if scores else 0
-        
-        stats_data = [
-            ["Tổng số sinh viên:", str(len(scores))],
-            ["Số sinh viên đạt:", str(passed_count)],
-            ["Tỷ lệ đạt:", f"{pass_rate:.1f}%"],
-            ["Điểm trung bình:", f"{sum(s.final_score for s in scores if s.final_score) / len([s for s in scores if s.final_score]):.2f}" if scores else "N/A"]
-        ]
-        
-        stats_table = Table([stats_data])
-        stats_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(stats_table)
-        
-        try:
-            doc.build(elements)
-            return output_path
-        except Exception as e:
-            logger.error(f"Error generating class scores PDF: {e}")
-            raise
+        return self._write('class_scores', self.class_scores_data(class_, scores), output_path)
 
     def generate_teaching_report(self, teacher, courses, period, output_path=None):
         """Generate teaching report for teacher"""
         if not output_path:
             output_path = f'teaching_report_{teacher.teacher_code}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        
-        doc = SimpleDocTemplate(output_path, pagesize=A4)
-        elements = []
-        
-        # Title
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=14,
-            spaceAfter=20,
-            alignment=TA_CENTER
-        )
-        elements.append(Paragraph(f"BÁO CÁO GIẢNG DẠY", title_style))
-        
-        # Teacher Information
-        teacher_info = [
-            ["Mã giáo viên:", teacher.teacher_code],
-            ["Họ và tên:", teacher.user.full_name],
-            ["Bộ môn:", teacher.department],
-            ["Chức vụ:", teacher.position or "N/A"],
-            ["Thời kỳ:", period],
-            ["Ngày in:", datetime.now().strftime("%d/%m/%Y")]
-        ]
-        
-        teacher_table = Table(teacher_info, colWidths=[1.5*inch, 4*inch])
-        teacher_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        elements.append(teacher_table)
-        elements.append(Spacer(1, 20))
-        
-        # Courses Table
-        courses_data = [["Mã HP", "Tên học phần", "Số TC", "Số SV", "Lịch học", "Phòng", "Trạng thái"]]
-        
-        total_credits = 0
-        total_students = 0
-        
-        for course in courses:
-            courses_data.append([
-                course.course_code,
-                course.subject.subject_name,
-                str(course.subject.credits),
-                str(course.current_students),
-                course.schedule or "N/A",
-                course.room or "N/A",
-                course.status
-            ])
-            total_credits += course.subject.credits
-            total_students += course.current_students
-        
-        courses_table = Table(courses_data, colWidths=[1*inch, 2.5*inch, 0.6*inch, 0.6*inch, 1.5*inch, 0.8*inch, 1*inch])
-        courses_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 8),
-            ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 9),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.whitesmoke])
-        ]))
-        elements.append(courses_table)
-        
-        # Summary
-        elements.append(Spacer(1, 20))
-        summary_data = [
-            ["Tổng số học phần:", str(len(courses))],
-            ["Tổng số tín chỉ:", str(total_credits)],
-            ["Tổng số sinh viên:", str(total_students)],
-            ["Số giờ giảng dạy:", str(total_credits * 15)]  # Assuming 15 hours per credit
-        ]
-        
-        summary_table = Table([summary_data])
-        summary_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(summary_table)
-        
-        try:
-            doc.build(elements)
-            return output_path
-        except Exception as e:
-            logger.error(f"Error generating teaching report PDF: {e}")
-            raise
+        return self._write('teaching_report', self.teaching_report_data(teacher, courses, period), output_path)
 
     def _get_academic_rank(self, gpa):
         """Get academic rank based on GPA"""
@@ -339,7 +303,7 @@ class PDFGenerator:
 def generate_pdf_report(report_type, data, output_path=None):
     """Utility function to generate different types of PDF reports"""
     generator = PDFGenerator()
-    
+
     if report_type == 'transcript':
         return generator.generate_transcript(data['student'], data['scores'], output_path)
     elif report_type == 'class_scores':
@@ -347,4 +311,4 @@ def generate_pdf_report(report_type, data, output_path=None):
     elif report_type == 'teaching_report':
         return generator.generate_teaching_report(data['teacher'], data['courses'], data['period'], output_path)
     else:
-        raise ValueError(f"Unsupported report type: {report_type}")
\ No newline at end of file
+        raise ValueError(f"Unsupported report type: {report_type}")
@@ -0,0 +1,286 @@
+"""
+Dịch vụ render PDF trong pool tiến trình
+
+ReportLab là Python thuần, tốn CPU: render trong tiến trình web giữ GIL và chặn vòng lặp eventlet
+(Socket.IO, các request khác) suốt thời gian dựng file. PDFRenderService chuyển phần render sang
+ProcessPoolExecutor:
+- Đầu vào là dữ liệu thuần (dict / list / str / số) do tiến trình web chuẩn bị từ ORM -> pickle
+  được, worker không cần DB hay app context.
+- Hàm render đăng ký theo tên (register / @pdf_renderer.renderer) và được gọi theo đường dẫn
+  'module:hàm' trong worker.
+- Worker được "làm nóng" khi khởi động (initializer): đăng ký font tiếng Việt + dựng style 1 lần
+  (utils/pdf_styles.py), nạp sẵn các module render. start() gửi ping tới mọi worker để chúng
+  khởi động ngay thay vì ở request đầu tiên.
+- Tiến trình web chờ kết quả bằng socketio.sleep() (nhường vòng lặp eventlet) thay vì
+  future.result() chặn cả tiến trình.
+- render_many() cho lô lớn (vd. bảng điểm cả lớp): gom nhiều file / 1 lần gửi worker, giữ mọi
+  worker bận và trả kết quả theo thứ tự để ghi thẳng vào ZIP.
+
+PDF_RENDER_WORKERS = 0 (mặc định khi test): render ngay trong tiến trình hiện tại. Pool hỏng
+(worker bị kill) -> tạo lại pool, lần đó render tại chỗ. Đo: `flask benchmark-pdf-render`.
+"""
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, has_app_context
+
+from utils.pdf_styles import pdf_styles
+
+logger = logging.getLogger(__name__)
+
+
+# ======== PHẦN CHẠY TRONG WORKER ========
+
+def _resolve(path):
+    module_name, _, attr = path.partition(':')
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _init_worker(font_paths, modules):
+    """Initializer của mỗi worker: font + style + module render nạp 1 lần cho cả đời worker"""
+    pdf_styles.font_paths = list(font_paths)
+    pdf_styles.load()
+    for module_name in modules:
+        importlib.import_module(module_name)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _render_in_worker(path, data):
+    return _resolve(path)(data)
+
+
+def _render_batch_in_worker(path, batch):
+    render = _resolve(path)
+    return [render(data) for data in batch]
+
+
+# ======== PHẦN CHẠY TRONG TIẾN TRÌNH WEB ========
+
+class PDFRenderTimeout(Exception):
+    """Worker không render xong trong PDF_RENDER_TIMEOUT giây"""
+
+
+class PDFRenderService:
+    """Render PDF từ dữ liệu thuần trong pool tiến trình (hoặc tại chỗ nếu không bật pool)"""
+
+    def __init__(self):
+        self._renderers = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self._config = {'PDF_RENDER_WORKERS': 0, 'PDF_RENDER_TIMEOUT': 60, 'PDF_RENDER_START_METHOD': 'spawn'}
+        self._socketio = None
+
+    def init_app(self, app):
+        app.config.setdefault('PDF_RENDER_WORKERS', min(4, os.cpu_count() or 1))
+        app.config.setdefault('PDF_RENDER_TIMEOUT', 60)
+        # spawn: worker không thừa kế luồng / kết nối DB / socket của tiến trình web (fork thì có)
+        app.config.setdefault('PDF_RENDER_START_METHOD', 'spawn')
+        # Pool dùng chung cho cả tiến trình nên giữ cấu hình của app đã gắn
+        self._config = {key: app.config[key] for key in self._config}
+        app.extensions['pdf_renderer'] = self
+
+    # ---------- đăng ký ----------
+
+    def register(self, kind, fn):
+        """Đăng ký hàm render(data) -> bytes; phải là hàm cấp module để worker import được"""
+        self._renderers[kind] = f'{fn.__module__}:{fn.__qualname__}'
+        return fn
+
+    def renderer(self, kind):
+        """Decorator của register()"""
+        return lambda fn: self.register(kind, fn)
+
+    # ---------- pool ----------
+
+    @property
+    def workers(self):
+        return self._config['PDF_RENDER_WORKERS']
+
+    def start(self, wait=False):
+        """Tạo pool và khởi động mọi worker (font nạp sẵn). wait=True: chờ tới khi worker sẵn sàng"""
+        executor = self._get_executor()
+        if executor is None:
+            return []
+        pings = [executor.submit(_ping) for _ in range(self.workers)]
+        if wait:
+            return sorted({ping.result(timeout=self._config['PDF_RENDER_TIMEOUT']) for ping in pings})
+        return []
+
+    def _get_executor(self):
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    modules = sorted({path.partition(':')[0] for path in self._renderers.values()})
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self._config['PDF_RENDER_START_METHOD']),
+                        initializer=_init_worker,
+                        initargs=(pdf_styles.font_paths, modules)
+                    )
+                    logger.info(f"PDF render pool started ({self.workers} workers)")
+        return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    # ---------- render ----------
+
+    def render(self, kind, data):
+        """bytes của file PDF. Trong pool: chờ cộng tác (nhường vòng lặp eventlet)"""
+        path = self._renderers[kind]
+        executor = self._get_executor()
+        if executor is None:
+            return _resolve(path)(data)
+
+        try:
+            future = executor.submit(_render_in_worker, path, data)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Pool hỏng / đã shutdown: tạo lại cho lần sau, lần này render tại chỗ
+            logger.warning(f"PDF render pool unavailable ({e}), rendering in-process")
+            self._reset(executor)
+            return _resolve(path)(data)
+
+        try:
+            return self._wait(future)
+        except BrokenProcessPool as e:
+            logger.warning(f"PDF render worker died ({e}), rendering in-process")
+            self._reset(executor)
+            return _resolve(path)(data)
+
+    def render_many(self, kind, items, batch_size=8):
+        """Render nhiều PDF cùng loại, trả về bytes từng file theo đúng thứ tự đầu vào (generator).
+
+        Dữ liệu được gom thành lô batch_size file / 1 lần gửi worker (giảm chi phí pickle + IPC mỗi
+        file); tối đa 2 lô / worker đang chờ để các worker luôn có việc mà bộ nhớ không phình theo
+        số file. Lô nào gặp pool hỏng thì render tại chỗ, các lô sau dùng pool mới.
+        """
+        path = self._renderers[kind]
+        if self._get_executor() is None:
+            render = _resolve(path)
+            for data in items:
+                yield render(data)
+            return
+
+        pending = deque()
+        batch = []
+        for data in items:
+            batch.append(data)
+            if len(batch) >= batch_size:
+                pending.append((batch, self._submit_batch(path, batch)))
+                batch = []
+                if len(pending) >= 2 * self.workers:
+                    yield from self._collect_batch(path, *pending.popleft())
+        if batch:
+            pending.append((batch, self._submit_batch(path, batch)))
+        while pending:
+            yield from self._collect_batch(path, *pending.popleft())
+
+    def _submit_batch(self, path, batch):
+        executor = self._get_executor()
+        try:
+            return executor, executor.submit(_render_batch_in_worker, path, batch)
+        except (BrokenProcessPool, RuntimeError) as e:
+            logger.warning(f"PDF render pool unavailable ({e}), rendering batch in-process")
+            self._reset(executor)
+            return executor, None
+
+    def _collect_batch(self, path, batch, submitted):
+        executor, future = submitted
+        if future is not None:
+            try:
+                return self._wait(future)
+            except BrokenProcessPool as e:
+                logger.warning(f"PDF render worker died ({e}), rendering batch in-process")
+                self._reset(executor)
+        render = _resolve(path)
+        return [render(data) for data in batch]
+
+    def _wait(self, future):
+        timeout = self._config['PDF_RENDER_TIMEOUT']
+        sleep = self._sleep_function()
+        if sleep is None:
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                raise PDFRenderTimeout(f'PDF render quá {timeout}s')
+
+        deadline = time.monotonic() + timeout
+        delay = 0.002
+        while not future.done():
+            if time.monotonic() > deadline:
+                future.cancel()
+                raise PDFRenderTimeout(f'PDF render quá {timeout}s')
+            sleep(delay)
+            delay = min(delay * 2, 0.05)
+        return future.result()
+
+    def _sleep_function(self):
+        """socketio.sleep của app (eventlet.sleep khi chạy eventlet); None nếu không có Socket.IO"""
+        socketio = current_app.extensions.get('socketio') if has_app_context() else None
+        if socketio is None or getattr(socketio, 'server', None) is None:
+            return None
+        return socketio.sleep
+
+    def _reset(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+pdf_renderer = PDFRenderService()
+
+
+def benchmark(jobs=20, rows=200, workers=None):
+    """So sánh render tại chỗ và qua pool cho `jobs` báo cáo điểm lớp `rows` dòng.
+
+    Trả về thời gian tổng (s) và thời gian tiến trình web bị chặn (s) cho từng cách. Qua pool,
+    các request chạy song song theo số worker; phần bị chặn chỉ còn pickle + chờ cộng tác.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from utils.pdf_generator import render_class_scores
+
+    data = {
+        'title': 'BÁO CÁO ĐIỂM LỚP CNTT01',
+        'info': [['Mã lớp:', 'CNTT01'], ['Tên lớp:', 'Công nghệ thông tin 01'], ['Khóa:', 'K2024'],
+                 ['Giáo viên chủ nhiệm:', 'Nguyễn Văn A'], ['Số sinh viên:', str(rows)], ['Ngày in:', '01/01/2025']],
+        'rows': [[str(i), f'SV{i:05d}', f'Nguyễn Văn {i}', '7.0', '8.0', '7.6', 'B', 'Đạt']
+                 for i in range(1, rows + 1)],
+        'stats': [['Tổng số sinh viên:', str(rows)], ['Số sinh viên đạt:', str(rows)],
+                  ['Tỷ lệ đạt:', '100.0%'], ['Điểm trung bình:', '7.60']],
+    }
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for _ in range(jobs):
+        render_class_scores(data)
+    inline = {'wall_s': round(time.perf_counter() - started, 3),
+              'blocked_s': round(time.process_time() - cpu_started, 3)}
+
+    pooled = None
+    pdf_renderer.start(wait=True)
+    if pdf_renderer.workers > 0:
+        concurrency = workers or pdf_renderer.workers
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        with ThreadPoolExecutor(max_workers=concurrency) as requests:
+            list(requests.map(lambda _: pdf_renderer.render('class_scores', data), range(jobs)))
+        pooled = {'wall_s': round(time.perf_counter() - started, 3),
+                  'blocked_s': round(time.process_time() - cpu_started, 3)}
+    return {'jobs': jobs, 'rows': rows, 'workers': pdf_renderer.workers, 'cpus': os.cpu_count(),
+            'inline': inline, 'pool': pooled}
@@ -0,0 +1,204 @@
+"""
+Font và style dùng chung cho các file PDF xuất ra
+
+Trước đây mỗi route PDF gọi register_vietnamese_fonts() (đọc và phân tích lại file TTF) rồi
+dựng lại getSampleStyleSheet() + các ParagraphStyle tiêu đề / thông tin ở mỗi request.
+PDFStyleRegistry làm việc đó 1 lần cho cả tiến trình (lần dùng đầu tiên, có khóa cho nhiều luồng)
+và trả về các style dùng chung.
+
+Style dùng chung KHÔNG được sửa tại chỗ (ảnh hưởng mọi lần xuất sau). Cần biến thể thì tạo
+ParagraphStyle mới với parent=pdf_styles['...'].
+
+Đo chi phí mỗi lần xuất trước / sau: `flask benchmark-pdf`.
+"""
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+from types import MappingProxyType
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+logger = logging.getLogger(__name__)
+
+# Font hệ thống có hỗ trợ tiếng Việt, thử theo thứ tự (sau font trong static/fonts của app)
+SYSTEM_FONT_PATHS = [
+    '/System/Library/Fonts/Arial.ttf',
+    '/System/Library/Fonts/Helvetica.ttc',
+    '/System/Library/Fonts/SFNS.ttf',  # San Francisco - font hệ thống macOS
+]
+
+FONT_NAME = 'VietnameseFont'
+BOLD_FONT_NAME = 'VietnameseFont-Bold'
+
+
+class _LoadedStyles:
+    """Kết quả 1 lần nạp: font đã đăng ký + style (chỉ đọc)"""
+
+    def __init__(self, font_name, bold_font_name, font_path, styles):
+        self.font_name = font_name
+        self.bold_font_name = bold_font_name
+        self.font_path = font_path
+        self.styles = styles
+
+
+class PDFStyleRegistry:
+    """Nạp font tiếng Việt và các style PDF 1 lần cho cả tiến trình"""
+
+    def __init__(self, font_paths=None):
+        self.font_paths = list(font_paths or SYSTEM_FONT_PATHS)
+        self._lock = threading.Lock()
+        self._loaded = None
+
+    def init_app(self, app):
+        # Font đặt kèm app được ưu tiên hơn font hệ thống
+        app_font = os.path.join(app.root_path, 'static', 'fonts', 'Arial.ttf')
+        if app_font not in self.font_paths:
+            self.font_paths.insert(0, app_font)
+        app.extensions['pdf_styles'] = self
+
+    # ---------- nạp ----------
+
+    def load(self, force=False):
+        """Nạp font + style nếu chưa có (force=True: nạp lại, dùng cho benchmark)"""
+        loaded = self._loaded
+        if loaded is not None and not force:
+            return loaded
+        with self._lock:
+            if self._loaded is None or force:
+                self._loaded = self._build()
+            return self._loaded
+
+    def _register_fonts(self):
+        for font_path in self.font_paths:
+            if not os.path.exists(font_path):
+                continue
+            try:
+                pdfmetrics.registerFont(TTFont(FONT_NAME, font_path))
+                pdfmetrics.registerFont(TTFont(BOLD_FONT_NAME, font_path))
+                logger.info(f"Đã đăng ký font PDF: {os.path.basename(font_path)}")
+                return FONT_NAME, BOLD_FONT_NAME, font_path
+            except Exception as e:
+                logger.warning(f"Không đăng ký được font {font_path}: {e}")
+        # Không có font nào -> Helvetica có sẵn trong ReportLab
+        logger.info("Không tìm thấy font tiếng Việt, dùng Helvetica mặc định")
+        return 'Helvetica', 'Helvetica-Bold', None
+
+    def _build(self):
+        font_name, bold_font_name, font_path = self._register_fonts()
+        sheet = getSampleStyleSheet()
+
+        styles = {name: sheet[name] for name in sheet.byName}
+        # Tiêu đề + dòng thông tin của các file xuất danh sách
+        styles['ExportTitle'] = ParagraphStyle(
+            'ExportTitle',
+            parent=sheet['Heading1'],
+            fontSize=16,
+            spaceAfter=30,
+            alignment=1,
+            textColor=colors.HexColor('#2c3e50')
+        )
+        styles['ExportInfo'] = ParagraphStyle(
+            'ExportInfo',
+            parent=sheet['Normal'],
+            fontSize=10,
+            textColor=colors.gray,
+            alignment=1
+        )
+        styles['ExportInfoLeft'] = ParagraphStyle(
+            'ExportInfoLeft',
+            parent=styles['ExportInfo'],
+            alignment=0
+        )
+        # PDFGenerator (utils/pdf_generator.py)
+        styles['ReportTitle'] = ParagraphStyle(
+            'ReportTitle',
+            parent=sheet['Heading1'],
+            fontSize=14,
+            spaceAfter=20,
+            alignment=1
+        )
+        styles['TranscriptTitle'] = ParagraphStyle(
+            'TranscriptTitle',
+            parent=sheet['Heading1'],
+            fontSize=16,
+            spaceAfter=30,
+            alignment=1
+        )
+        styles['ReportFooter'] = ParagraphStyle(
+            'ReportFooter',
+            parent=sheet['Normal'],
+            fontSize=10,
+            alignment=1,
+            textColor=colors.grey
+        )
+        return _LoadedStyles(font_name, bold_font_name, font_path, MappingProxyType(styles))
+
+    # ---------- truy cập ----------
+
+    @property
+    def styles(self):
+        return self.load().styles
+
+    @property
+    def font_name(self):
+        return self.load().font_name
+
+    @property
+    def bold_font_name(self):
+        return self.load().bold_font_name
+
+    def __getitem__(self, name):
+        return self.load().styles[name]
+
+
+pdf_styles = PDFStyleRegistry()
+
+
+def benchmark(iterations=50, rows=30):
+    """So sánh chi phí mỗi lần xuất PDF: nạp lại font + style (cách cũ) và dùng registry.
+
+    Trả về dict thời gian trung bình (ms) cho phần chuẩn bị và cho cả lần xuất
+    (1 bảng mẫu `rows` dòng), kèm font đang dùng.
+    """
+    data = [['STT', 'Mã SV', 'Họ tên', 'Lớp', 'Email']]
+    data += [[str(i), f'SV{i:05d}', f'Nguyễn Văn {i}', 'CNTT01', f'sv{i}@example.com']
+             for i in range(1, rows + 1)]
+
+    def export(styles):
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30)
+        table = Table(data, colWidths=[30, 80, 120, 80, 150])
+        table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        doc.build([Paragraph('DANH SÁCH SINH VIÊN', styles['ExportTitle']),
+                   Paragraph('Ngày xuất: 01/01/2025 08:00', styles['ExportInfo']),
+                   Spacer(1, 20), table])
+
+    def measure(prepare):
+        setup = total = 0.0
+        for _ in range(iterations):
+            started = time.perf_counter()
+            styles = prepare()
+            prepared = time.perf_counter()
+            export(styles)
+            finished = time.perf_counter()
+            setup += prepared - started
+            total += finished - started
+        return {'setup_ms': round(setup * 1000 / iterations, 3),
+                'export_ms': round(total * 1000 / iterations, 3)}
+
+    registry = pdf_styles
+    before = measure(lambda: registry.load(force=True).styles)
+    registry.load()
+    after = measure(lambda: registry.styles)
+    return {'iterations': iterations, 'rows': rows, 'font': registry.font_name,
+            'font_path': registry.load().font_path, 'before': before, 'after': after}
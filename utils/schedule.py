@@ -0,0 +1,138 @@
+"""
+Biểu diễn lịch học dạng bitmask: 6 ngày (Thứ 2 - Thứ 7) x 12 tiết = 72 bit
+
+Bit thứ (ngày * 12 + tiết - 1) bật nếu khóa học có tiết đó trong tuần.
+Chuỗi lịch tự do (vd: "Thứ 2 - Tiết 1-3, Thứ 5 - Tiết 7-9") chỉ cần parse 1 lần khi ghi,
+sau đó kiểm tra trùng lịch / dựng thời khóa biểu / phòng học chỉ còn là phép toán bit.
+"""
+import re
+
+DAY_CODES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat']
+DAY_NAMES = ['Thứ 2', 'Thứ 3', 'Thứ 4', 'Thứ 5', 'Thứ 6', 'Thứ 7']
+PERIODS_PER_DAY = 12
+TOTAL_SLOTS = len(DAY_CODES) * PERIODS_PER_DAY  # 72
+
+# 72 bit = 18 chữ số hex - độ dài cột Course.schedule_mask
+MASK_HEX_LENGTH = TOTAL_SLOTS // 4
+EMPTY_MASK_HEX = '0' * MASK_HEX_LENGTH
+
+_DAY_PATTERN = re.compile(r'thứ\s*(2|3|4|5|6|7|hai|ba|tư|năm|sáu|bảy)')
+_PERIOD_PATTERN = re.compile(r'tiết\s*(\d+)(?:\s*-\s*(\d+))?')
+_DAY_INDEX = {
+    '2': 0, 'hai': 0,
+    '3': 1, 'ba': 1,
+    '4': 2, 'tư': 2,
+    '5': 3, 'năm': 3,
+    '6': 4, 'sáu': 4,
+    '7': 5, 'bảy': 5,
+}
+_DAY_MASK = (1 << PERIODS_PER_DAY) - 1
+
+
+def slot_bit(day_index, period):
+    """Bit của 1 tiết (day_index 0 = Thứ 2, period 1..12)"""
+    return 1 << (day_index * PERIODS_PER_DAY + period - 1)
+
+
+def period_range_mask(day_index, start, end):
+    """Mask các tiết start..end (gồm cả 2 đầu) của 1 ngày, bỏ phần ngoài 1..12"""
+    start, end = max(start, 1), min(end, PERIODS_PER_DAY)
+    if start > end:
+        return 0
+    run = (1 << (end - start + 1)) - 1
+    return run << (day_index * PERIODS_PER_DAY + start - 1)
+
+
+def parse_schedule(text):
+    """Chuỗi lịch học -> bitmask 72 bit.
+
+    Mỗi đoạn (phân tách bởi ',' hoặc ';') có thể chứa ngày và/hoặc tiết.
+    Các ngày chưa có tiết được gộp với khoảng tiết gặp tiếp theo:
+    "Thứ 2, Thứ 4 - Tiết 1-3" = tiết 1-3 của cả Thứ 2 và Thứ 4.
+    """
+    if not text:
+        return 0
+
+    mask = 0
+    pending_days = []
+    last_days = []
+    for part in re.split(r'[,;\n]', text.lower()):
+        days = [_DAY_INDEX[match] for match in _DAY_PATTERN.findall(part)]
+        periods = _PERIOD_PATTERN.search(part)
+
+        pending_days.extend(days)
+        if not periods:
+            continue
+
+        start = int(periods.group(1))
+        end = int(periods.group(2)) if periods.group(2) else start
+        # Đoạn chỉ có tiết (vd: "Thứ 2 - Tiết 1-2, Tiết 5-6"): dùng lại ngày của đoạn trước
+        target_days = pending_days or last_days
+        for day_index in target_days:
+            mask |= period_range_mask(day_index, start, end)
+        last_days, pending_days = target_days, []
+
+    return mask
+
+
+def mask_to_hex(mask):
+    """Bitmask -> chuỗi hex độ dài cố định để lưu DB"""
+    return format(mask or 0, f'0{MASK_HEX_LENGTH}x')
+
+
+def mask_from_hex(value):
+    """Chuỗi hex trong DB -> bitmask"""
+    return int(value, 16) if value else 0
+
+
+def schedule_to_hex(text):
+    """Parse chuỗi lịch học và trả về dạng hex để lưu DB"""
+    return mask_to_hex(parse_schedule(text))
+
+
+def day_periods(mask, day_index):
+    """Mask 12 bit các tiết của 1 ngày"""
+    return (mask >> (day_index * PERIODS_PER_DAY)) & _DAY_MASK
+
+
+def iter_slots(mask):
+    """Duyệt (day_index, period) của các tiết đang bật, theo thứ tự thời gian"""
+    for day_index in range(len(DAY_CODES)):
+        periods = day_periods(mask, day_index)
+        period = 1
+        while periods:
+            if periods & 1:
+                yield day_index, period
+            periods >>= 1
+            period += 1
+
+
+def iter_ranges(mask):
+    """Duyệt (day_index, tiết bắt đầu, tiết kết thúc) của các khoảng tiết liên tiếp"""
+    for day_index in range(len(DAY_CODES)):
+        periods = day_periods(mask, day_index)
+        period = 1
+        while periods:
+            if periods & 1:
+                start = period
+                while periods & 1:
+                    periods >>= 1
+                    period += 1
+                yield day_index, start, period - 1
+            else:
+                periods >>= 1
+                period += 1
+
+
+def days_of(mask):
+    """Danh sách mã ngày có tiết học"""
+    return [DAY_CODES[day_index] for day_index in range(len(DAY_CODES)) if day_periods(mask, day_index)]
+
+
+def format_mask(mask):
+    """Bitmask -> chuỗi lịch chuẩn hóa, vd: "Thứ 2 - Tiết 1-3, Thứ 5 - Tiết 7-9" """
+    parts = []
+    for day_index, start, end in iter_ranges(mask):
+        periods = f'Tiết {start}-{end}' if end > start else f'Tiết {start}'
+        parts.append(f'{DAY_NAMES[day_index]} - {periods}')
+    return ', '.join(parts)
@@ -0,0 +1,82 @@
+"""
+Cache bytecode Jinja + biên dịch sẵn template khi khởi động
+
+Mặc định mỗi worker biên dịch template lúc được render lần đầu -> các request đầu tiên sau khi
+deploy / restart chậm. Ở đây:
+- FileSystemBytecodeCache: mã đã biên dịch được ghi ra đĩa, worker sau (hoặc lần khởi động sau)
+  chỉ nạp lại bytecode thay vì parse + biên dịch mã nguồn. Khóa theo checksum nội dung template
+  nên sửa template không bao giờ dùng nhầm bytecode cũ.
+- warmup(): nạp mọi template vào cache trong bộ nhớ của Jinja ngay khi tạo app. Phải gọi sau khi
+  đăng ký filter / global (Jinja kiểm tra filter lúc biên dịch).
+
+Cấu hình: TEMPLATE_BYTECODE_CACHE (bật / tắt), TEMPLATE_BYTECODE_CACHE_DIR (mặc định: thư mục
+tạm riêng của user do Jinja chọn), TEMPLATE_WARMUP. Báo cáo thời gian: `flask template-report`.
+"""
+import logging
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+
+def init_app(app):
+    """Gắn bytecode cache vào môi trường Jinja của app"""
+    if not app.config.get('TEMPLATE_BYTECODE_CACHE', True):
+        return None
+    directory = app.config.get('TEMPLATE_BYTECODE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    bytecode_cache = FileSystemBytecodeCache(directory or None)
+    # Loader đọc environment.bytecode_cache mỗi lần nạp template nên gán sau khi tạo env vẫn có hiệu lực
+    app.jinja_env.bytecode_cache = bytecode_cache
+    app.extensions['template_bytecode_cache'] = bytecode_cache
+    return bytecode_cache
+
+
+def template_names(app):
+    """Tên các template HTML của app (bỏ qua file không phải template)"""
+    return sorted(name for name in app.jinja_env.list_templates() if name.endswith('.html'))
+
+
+def warmup(app, names=None):
+    """Biên dịch (hoặc nạp bytecode) mọi template vào cache của Jinja.
+
+    Trả về {'templates', 'elapsed_ms', 'slowest': [(tên, ms)], 'failed': [(tên, lỗi)]}.
+    Template lỗi chỉ được ghi log - lỗi thật sẽ hiện khi route render nó.
+    """
+    env = app.jinja_env
+    timings, failed = [], []
+    started = time.perf_counter()
+    for name in names or template_names(app):
+        template_started = time.perf_counter()
+        try:
+            env.get_template(name)
+        except Exception as e:
+            failed.append((name, str(e)))
+            logger.warning(f"Không biên dịch được template {name}: {e}")
+            continue
+        timings.append((name, round((time.perf_counter() - template_started) * 1000, 2)))
+    elapsed = round((time.perf_counter() - started) * 1000, 1)
+    timings.sort(key=lambda item: item[1], reverse=True)
+    return {'templates': len(timings), 'elapsed_ms': elapsed, 'slowest': timings[:5], 'failed': failed}
+
+
+def warmup_on_startup(app):
+    """Gọi ở cuối create_app (sau khi đăng ký filter / error handler)"""
+    if not app.config.get('TEMPLATE_WARMUP', True):
+        return None
+    report = warmup(app)
+    logger.info(f"Đã biên dịch sẵn {report['templates']} template trong {report['elapsed_ms']} ms"
+                + (f" ({len(report['failed'])} lỗi)" if report['failed'] else ''))
+    return report
+
+
+def clear(app, bytecode=False):
+    """Bỏ template đã biên dịch trong bộ nhớ (và bytecode trên đĩa nếu bytecode=True)"""
+    if app.jinja_env.cache is not None:
+        app.jinja_env.cache.clear()
+    bytecode_cache = app.jinja_env.bytecode_cache
+    if bytecode and bytecode_cache is not None:
+        bytecode_cache.clear()